@@ -4,15 +4,19 @@ Generates personalized assignments based on mastery gaps and learning patterns.
 """
 
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, not_
 import random
+import uuid
 from app.models.assignment import (
-    Assignment, AssignmentQuestion, StudentAssignment, StudentResponse,
-    AssignmentType, QuestionDifficulty, QuestionType
+    Assignment, AssignmentQuestion, StudentAssignment,
+    AssignmentType, AssignmentStatus, QuestionDifficulty, QuestionType
 )
-from app.ai.mastery_scorer import get_mastery_gaps
+from app.ai.mastery_scorer import get_mastery_gaps, rank_mastery_gaps
+from app.ai.concept_graph import get_concept_graph
+from app.ai import engagement_counters, question_bank, question_pool
+from app.services import tutor_context
 from app.config import get_settings
 
 settings = get_settings()
@@ -55,33 +59,14 @@ def generate_adaptive_assignment(
     # Get mastery gaps
     gaps = get_mastery_gaps(db, student_id, limit=10)
     
-    # If target concepts specified, filter gaps
-    if target_concepts:
-        gaps = [g for g in gaps if g['concept_id'] in target_concepts]
-    
-    # Select top concepts to practice
-    concepts_to_practice = []
-    for gap in gaps[:5]:  # Top 5 priority gaps
-        if gap['prerequisites_ready']:
-            concepts_to_practice.append(gap)
-    
     # If no gaps or all prerequisites not ready, practice recent concepts
+    concepts_to_practice = _choose_concepts(gaps, target_concepts)
     if not concepts_to_practice:
         recent_concepts = _get_recently_practiced_concepts(db, student_id, class_id, limit=3)
-        from app.models.assignment import StudentMastery
-        
-        for concept_id in recent_concepts:
-            mastery = db.query(StudentMastery).filter(
-                and_(
-                    StudentMastery.student_id == student_id,
-                    StudentMastery.concept_id == concept_id
-                )
-            ).first()
-            
-            concepts_to_practice.append({
-                'concept_id': str(concept_id),
-                'mastery_level': float(mastery.mastery_level) if mastery else 0
-            })
+        concepts_to_practice = [
+            {'concept_id': concept_id, 'mastery_level': mastery_level}
+            for concept_id, mastery_level in recent_concepts
+        ]
     
     if not concepts_to_practice:
         raise ValueError("No concepts available for practice")
@@ -99,57 +84,9 @@ def generate_adaptive_assignment(
     db.flush()  # Get assignment ID
     
     # Generate questions
-    questions = []
-    questions_per_concept = max(2, num_questions // len(concepts_to_practice))
-    
-    for concept_data in concepts_to_practice:
-        concept_id = concept_data['concept_id']
-        mastery = concept_data.get('mastery_level', 0)
-        
-        # Determine difficulty distribution based on mastery
-        if mastery < 40:
-            # Low mastery: mostly easy, some medium
-            difficulty_distribution = {
-                QuestionDifficulty.EASY: 0.7,
-                QuestionDifficulty.MEDIUM: 0.3,
-                QuestionDifficulty.HARD: 0.0
-            }
-        elif mastery < 70:
-            # Medium mastery: balanced
-            difficulty_distribution = {
-                QuestionDifficulty.EASY: 0.3,
-                QuestionDifficulty.MEDIUM: 0.5,
-                QuestionDifficulty.HARD: 0.2
-            }
-        else:
-            # High mastery: challenge with harder questions
-            difficulty_distribution = {
-                QuestionDifficulty.EASY: 0.1,
-                QuestionDifficulty.MEDIUM: 0.4,
-                QuestionDifficulty.HARD: 0.5
-            }
-        
-        # Select questions from question bank
-        concept_questions = []
-        for difficulty, ratio in difficulty_distribution.items():
-            count = round(questions_per_concept * ratio)
-            if count > 0:
-                selected = _select_questions_from_bank(
-                    db=db,
-                    concept_id=concept_id,
-                    difficulty=difficulty,
-                    count=count,
-                    student_id=student_id
-                )
-                concept_questions.extend(selected)
-        
-        questions.extend(concept_questions)
-    
-    # Shuffle questions
-    random.shuffle(questions)
-    
-    # Limit to requested number
-    questions = questions[:num_questions]
+    question_bank.ensure_seen_filters(db, [student_id])
+    questions = _build_questions(db, concepts_to_practice, num_questions, student_id)
+    _fill_from_pool(db, [(student_id, questions)])
     
     # Add questions to assignment
     for idx, question_data in enumerate(questions):
@@ -173,196 +110,318 @@ def generate_adaptive_assignment(
         is_adaptive=True
     )
     db.add(student_assignment)
+    db.flush()
+    engagement_counters.record_assignment_assigned(db, student_assignment, class_id)
     
     db.commit()
     db.refresh(assignment)
     
-    # Calculate difficulty breakdown
-    difficulty_breakdown = {
-        'easy': sum(1 for q in questions if q['difficulty'] == QuestionDifficulty.EASY),
-        'medium': sum(1 for q in questions if q['difficulty'] == QuestionDifficulty.MEDIUM),
-        'hard': sum(1 for q in questions if q['difficulty'] == QuestionDifficulty.HARD)
-    }
-    
     return {
         'assignment_id': str(assignment.id),
         'num_questions': len(questions),
         'concepts_covered': [c['concept_id'] for c in concepts_to_practice],
-        'difficulty_breakdown': difficulty_breakdown,
+        'difficulty_breakdown': _difficulty_breakdown(questions),
         'personalization_reason': 'Generated based on mastery gaps and learning patterns',
         'mastery_levels': {c['concept_id']: c.get('mastery_level', 0) for c in concepts_to_practice}
     }
 
 
-def _select_questions_from_bank(
+def generate_adaptive_assignments_for_class(
     db: Session,
-    concept_id: str,
-    difficulty: QuestionDifficulty,
-    count: int,
-    student_id: str
-) -> List[Dict[str, Any]]:
-    # Sample question bank
-    question_bank = [
-        # Algebra - Easy
-        {
-            "category": "Algebra",
-            "difficulty": QuestionDifficulty.EASY,
-            "question_text": "What is the value of x in the equation 2x + 5 = 15?",
-            "options": {"A": "5", "B": "10", "C": "15", "D": "20"},
-            "correct_answer": "A"
-        },
-        {
-            "category": "Algebra",
-            "difficulty": QuestionDifficulty.EASY,
-            "question_text": "Simplify: 3(x + 2) - 4",
-            "options": {"A": "3x + 2", "B": "3x - 2", "C": "3x + 6", "D": "3x - 6"},
-            "correct_answer": "A"
-        },
-        # Algebra - Medium
-        {
-            "category": "Algebra",
-            "difficulty": QuestionDifficulty.MEDIUM,
-            "question_text": "Solve for x: x^2 - 5x + 6 = 0",
-            "options": {"A": "x=2, 3", "B": "x=-2, -3", "C": "x=1, 6", "D": "x=-1, -6"},
-            "correct_answer": "A"
-        },
-        # Geometry - Easy
-        {
-            "category": "Geometry",
-            "difficulty": QuestionDifficulty.EASY,
-            "question_text": "What is the area of a rectangle with length 8 and width 5?",
-            "options": {"A": "40", "B": "13", "C": "26", "D": "20"},
-            "correct_answer": "A"
-        },
-        # Calculus - Hard
-        {
-            "category": "Calculus",
-            "difficulty": QuestionDifficulty.HARD,
-            "question_text": "Calculate the derivative of f(x) = x^2 * sin(x)",
-            "options": {
-                "A": "2x*sin(x) + x^2*cos(x)",
-                "B": "2x*cos(x)",
-                "C": "x^2*cos(x) - 2x*sin(x)",
-                "D": "sin(x) + cos(x)"
-            },
-            "correct_answer": "A"
-        },
-        # Science - 6th Standard
-        {
-            "category": "Science",
-            "difficulty": QuestionDifficulty.EASY,
-            "question_text": "Which of the following is NOT a characteristic of living things?",
-            "options": {"A": "Growth", "B": "Respiration", "C": "Movement", "D": "Shining"},
-            "correct_answer": "D"
-        },
-        {
-            "category": "Science",
-            "difficulty": QuestionDifficulty.EASY,
-            "question_text": "Which state of matter has a fixed volume but no fixed shape?",
-            "options": {"A": "Solid", "B": "Liquid", "C": "Gas", "D": "Plasma"},
-            "correct_answer": "B"
-        },
-        {
-            "category": "Science",
-            "difficulty": QuestionDifficulty.EASY,
-            "question_text": "Plants prepare their food using which of the following?",
-            "options": {"A": "Oxygen", "B": "Nitrogen", "C": "Carbon dioxide", "D": "Hydrogen"},
-            "correct_answer": "C"
-        },
-        {
-            "category": "Science",
-            "difficulty": QuestionDifficulty.EASY,
-            "question_text": "Which part of the plant absorbs water from the soil?",
-            "options": {"A": "Stem", "B": "Leaf", "C": "Flower", "D": "Root"},
-            "correct_answer": "D"
-        },
-        {
-            "category": "Science",
-            "difficulty": QuestionDifficulty.MEDIUM,
-            "question_text": "Which process causes cooling when sweat dries from our body?",
-            "options": {"A": "Condensation", "B": "Freezing", "C": "Evaporation", "D": "Melting"},
-            "correct_answer": "C"
-        },
-        {
-            "category": "Science",
-            "difficulty": QuestionDifficulty.EASY,
-            "question_text": "Which of the following is a decomposer?",
-            "options": {"A": "Cow", "B": "Lion", "C": "Mushroom", "D": "Grass"},
-            "correct_answer": "C"
-        },
-        {
-            "category": "Science",
-            "difficulty": QuestionDifficulty.EASY,
-            "question_text": "Why do fish die when taken out of water?",
-            "options": {"A": "No sunlight", "B": "No food", "C": "Cannot breathe air", "D": "Water is cold"},
-            "correct_answer": "C"
-        },
-        {
-            "category": "Science",
-            "difficulty": QuestionDifficulty.EASY,
-            "question_text": "Which organ helps in pumping blood in the human body?",
-            "options": {"A": "Brain", "B": "Lungs", "C": "Heart", "D": "Kidney"},
-            "correct_answer": "C"
-        },
-        {
-            "category": "Science",
-            "difficulty": QuestionDifficulty.EASY,
-            "question_text": "Which of the following is a renewable resource?",
-            "options": {"A": "Coal", "B": "Petroleum", "C": "Natural gas", "D": "Wind"},
-            "correct_answer": "D"
-        },
+    class_id: str,
+    teacher_id: str,
+    num_questions: int = 10
+) -> Dict[str, Any]:
+    """
+    Generate a personalized assignment for every student in a class.
+    
+    Same per-student strategy as generate_adaptive_assignment, but mastery
+    for the whole class is loaded in one query, gap analysis runs against
+    the shared concept graph, pooled AI questions are drawn once per
+    concept and difficulty for the whole class, and every Assignment /
+    AssignmentQuestion / StudentAssignment row is bulk-inserted in a single
+    transaction.
+    
+    Args:
+        db: Database session
+        class_id: Class UUID
+        teacher_id: Teacher UUID (for assignment creation)
+        num_questions: Number of questions per assignment
+        
+    Returns:
         {
-            "category": "Science",
-            "difficulty": QuestionDifficulty.MEDIUM,
-            "question_text": "Which type of soil holds the most water?",
-            "options": {"A": "Sandy soil", "B": "Clayey soil", "C": "Loamy soil", "D": "Rocky soil"},
-            "correct_answer": "B"
+            'class_id': str,
+            'assignments_created': int,
+            'students_skipped': List[str],  # no concepts to practice
+            'assignments': [{'student_id', 'assignment_id', 'num_questions',
+                             'concepts_covered', 'difficulty_breakdown'}]
         }
+    """
+    from app.models.assignment import StudentMastery
+    from app.models.class_model import Enrollment
+    
+    class_uuid = uuid.UUID(str(class_id))
+    teacher_uuid = uuid.UUID(str(teacher_id))
+    
+    student_ids = [
+        row.student_id for row in db.query(Enrollment.student_id).filter(
+            Enrollment.class_id == class_uuid
+        ).all()
     ]
+    
+    # One pass over mastery for the whole class, most recently practiced first
+    records_by_student = {student_id: [] for student_id in student_ids}
+    if student_ids:
+        records = db.query(
+            StudentMastery.student_id, StudentMastery.concept_id, StudentMastery.mastery_level
+        ).filter(
+            StudentMastery.student_id.in_(student_ids)
+        ).order_by(StudentMastery.last_practiced.desc()).all()
+        for student_id, concept_id, mastery_level in records:
+            records_by_student[student_id].append((str(concept_id), float(mastery_level)))
+    
+    graph = get_concept_graph(db)
+    question_bank.ensure_seen_filters(db, student_ids)
+    title = f"Adaptive Practice - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    
+    assignment_rows, question_rows, student_assignment_rows = [], [], []
+    created, skipped, built = [], [], []
+    
+    for student_id in student_ids:
+        mastery = records_by_student[student_id]
+        gaps = rank_mastery_gaps(dict(mastery), graph, limit=10)
+        
+        concepts_to_practice = _choose_concepts(gaps)
+        if not concepts_to_practice:
+            concepts_to_practice = [
+                {'concept_id': concept_id, 'mastery_level': mastery_level}
+                for concept_id, mastery_level in mastery[:3]
+            ]
+        if not concepts_to_practice:
+            skipped.append(str(student_id))
+            continue
+        
+        questions = _build_questions(db, concepts_to_practice, num_questions, str(student_id))
+        assignment_id = uuid.uuid4()
+        built.append((assignment_id, str(student_id), questions))
+        
+        assignment_rows.append({
+            'id': assignment_id,
+            'title': title,
+            'description': "Personalized assignment generated based on your learning progress",
+            'class_id': class_uuid,
+            'teacher_id': teacher_uuid,
+            'assignment_type': AssignmentType.ADAPTIVE,
+            'due_date': None
+        })
+        student_assignment_rows.append({
+            'id': uuid.uuid4(),
+            'assignment_id': assignment_id,
+            'student_id': student_id,
+            'is_adaptive': True,
+            'status': AssignmentStatus.ASSIGNED,
+            'assigned_at': datetime.utcnow()
+        })
+        created.append({
+            'student_id': str(student_id),
+            'assignment_id': str(assignment_id),
+            'num_questions': len(questions),
+            'concepts_covered': [c['concept_id'] for c in concepts_to_practice],
+            'difficulty_breakdown': _difficulty_breakdown(questions)
+        })
+    
+    _fill_from_pool(db, [(student_id, questions) for _, student_id, questions in built])
+    for assignment_id, _, questions in built:
+        for idx, question_data in enumerate(questions):
+            question_rows.append({
+                'id': uuid.uuid4(),
+                'assignment_id': assignment_id,
+                'concept_id': uuid.UUID(str(question_data['concept_id'])),
+                'question_text': question_data['question_text'],
+                'question_type': question_data['question_type'],
+                'difficulty': question_data['difficulty'],
+                'correct_answer': question_data.get('correct_answer'),
+                'options': question_data.get('options'),
+                'points': question_data.get('points', 1),
+                'order_index': idx
+            })
+    
+    if assignment_rows:
+        db.bulk_insert_mappings(Assignment, assignment_rows)
+        db.bulk_insert_mappings(AssignmentQuestion, question_rows)
+        db.bulk_insert_mappings(StudentAssignment, student_assignment_rows)
+        engagement_counters.record_assignments_assigned(
+            db, class_uuid, [row['student_id'] for row in student_assignment_rows]
+        )
+        tutor_context.mark_stale(db, [row['student_id'] for row in student_assignment_rows])
+        db.commit()
+    
+    return {
+        'class_id': str(class_uuid),
+        'assignments_created': len(created),
+        'students_skipped': skipped,
+        'assignments': created
+    }
+
 
-    # Filter by difficulty (simplified logic for demo)
-    matching_questions = [q for q in question_bank if q["difficulty"] == difficulty]
+def _choose_concepts(
+    gaps: List[Dict[str, Any]],
+    target_concepts: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """Top 5 priority gaps whose prerequisites are ready."""
+    # If target concepts specified, filter gaps
+    if target_concepts:
+        gaps = [g for g in gaps if g['concept_id'] in target_concepts]
     
-    # If no matches, fallback to generic
-    if not matching_questions:
-        matching_questions = question_bank
+    return [gap for gap in gaps[:5] if gap['prerequisites_ready']]
+
+
+def _difficulty_distribution(mastery: float) -> Dict[QuestionDifficulty, float]:
+    """Share of easy/medium/hard questions for a mastery level."""
+    if mastery < 40:
+        # Low mastery: mostly easy, some medium
+        return {
+            QuestionDifficulty.EASY: 0.7,
+            QuestionDifficulty.MEDIUM: 0.3,
+            QuestionDifficulty.HARD: 0.0
+        }
+    elif mastery < 70:
+        # Medium mastery: balanced
+        return {
+            QuestionDifficulty.EASY: 0.3,
+            QuestionDifficulty.MEDIUM: 0.5,
+            QuestionDifficulty.HARD: 0.2
+        }
+    # High mastery: challenge with harder questions
+    return {
+        QuestionDifficulty.EASY: 0.1,
+        QuestionDifficulty.MEDIUM: 0.4,
+        QuestionDifficulty.HARD: 0.5
+    }
+
 
-    selected = random.sample(matching_questions, min(count, len(matching_questions)))
+def _build_questions(
+    db: Session,
+    concepts_to_practice: List[Dict[str, Any]],
+    num_questions: int,
+    student_id: str
+) -> List[Dict[str, Any]]:
+    """Select questions per concept by difficulty mix, shuffled and capped."""
+    questions = []
+    chosen = set()  # content hashes already in this assignment
+    questions_per_concept = max(2, num_questions // len(concepts_to_practice))
     
-    # Make them concept-specific for the return
-    results = []
-    for q in selected:
-        results.append({
-            'concept_id': concept_id,
-            'question_text': q['question_text'],
-            'question_type': QuestionType.MCQ,
-            'difficulty': difficulty,
-            'correct_answer': q['correct_answer'],
-            'options': q['options'],
-            'points': 1 if difficulty == QuestionDifficulty.EASY else 2 if difficulty == QuestionDifficulty.MEDIUM else 3
-        })
+    for concept_data in concepts_to_practice:
+        concept_id = concept_data['concept_id']
+        mastery = concept_data.get('mastery_level', 0)
+        
+        # Select questions from question bank
+        for difficulty, ratio in _difficulty_distribution(mastery).items():
+            count = round(questions_per_concept * ratio)
+            if count > 0:
+                questions.extend(_select_questions_from_bank(
+                    db=db,
+                    concept_id=concept_id,
+                    difficulty=difficulty,
+                    count=count,
+                    student_id=student_id,
+                    exclude=chosen
+                ))
+    
+    # Shuffle questions
+    random.shuffle(questions)
+    
+    # Limit to requested number
+    questions = questions[:num_questions]
+    question_bank.mark_seen(student_id, [q['content_hash'] for q in questions if q.get('content_hash')])
+    return questions
+
+
+def _difficulty_breakdown(questions: List[Dict[str, Any]]) -> Dict[str, int]:
+    return {
+        'easy': sum(1 for q in questions if q['difficulty'] == QuestionDifficulty.EASY),
+        'medium': sum(1 for q in questions if q['difficulty'] == QuestionDifficulty.MEDIUM),
+        'hard': sum(1 for q in questions if q['difficulty'] == QuestionDifficulty.HARD)
+    }
+
+
+def _select_questions_from_bank(
+    db: Session,
+    concept_id: str,
+    difficulty: QuestionDifficulty,
+    count: int,
+    student_id: str,
+    exclude: Optional[set] = None
+) -> List[Dict[str, Any]]:
+    # Unseen questions from the indexed bank first, then recently seen ones
+    results = question_bank.select_questions(
+        db, concept_id, difficulty, count, student_id, exclude=exclude
+    )
     
-    # If we still need more questions than selected, add placeholders
+    # Hold the rest with placeholders; _fill_from_pool swaps in pre-generated
+    # AI questions once the whole batch is known
     while len(results) < count:
         results.append({
             'concept_id': concept_id,
-            'question_text': f"Placeholder {difficulty.value} question for concept {concept_id[:8]}",
+            'question_text': f"Placeholder {difficulty.value} question for concept {str(concept_id)[:8]}",
             'question_type': QuestionType.MCQ,
             'difficulty': difficulty,
             'correct_answer': 'A',
             'options': {"A": "Correct Answer", "B": "Option B", "C": "Option C", "D": "Option D"},
-            'points': 1
+            'points': 1,
+            'pool_slot': True
         })
 
     return results
 
 
+def _fill_from_pool(db: Session, assignments: List[Tuple[str, List[Dict[str, Any]]]]) -> None:
+    """
+    Replace placeholders with AI questions pre-generated for a topic named
+    like the concept.
+
+    The pool is drawn once per (concept, difficulty) for all the given
+    (student_id, questions) lists, for exactly the placeholders that made
+    it into an assignment; whatever the pool cannot cover stays a
+    placeholder.
+    """
+    slots: Dict[Tuple[str, QuestionDifficulty], List[Tuple[str, Dict[str, Any]]]] = {}
+    for student_id, questions in assignments:
+        for question in questions:
+            if question.pop('pool_slot', False):
+                slots.setdefault((str(question['concept_id']), question['difficulty']), []).append(
+                    (student_id, question)
+                )
+    if not slots:
+        return
+    
+    names = get_concept_graph(db).names
+    seen: Dict[str, List[str]] = {}
+    for (concept_id, difficulty), targets in slots.items():
+        concept_name = names.get(concept_id)
+        if not concept_name:
+            continue
+        pooled = question_pool.draw_questions(db, concept_name, difficulty, len(targets), partial=True)
+        for (student_id, question), q in zip(targets, pooled):
+            question.update({
+                'question_text': q['question_text'],
+                'correct_answer': q['correct_answer'],
+                'options': q['options'],
+                'points': question_bank.default_points(difficulty),
+                'content_hash': question_bank.content_hash(q['question_text'], difficulty)
+            })
+            seen.setdefault(student_id, []).append(question['content_hash'])
+    
+    for student_id, hashes in seen.items():
+        question_bank.mark_seen(student_id, hashes)
+
+
 def _get_recently_practiced_concepts(
     db: Session,
     student_id: str,
     class_id: str,
     limit: int = 3
-) -> List[str]:
+) -> List[Tuple[str, float]]:
     """
     Get recently practiced concepts for a student.
     
@@ -373,48 +432,16 @@ def _get_recently_practiced_concepts(
         limit: Number of concepts to return
         
     Returns:
-        List of concept IDs
+        List of (concept ID, mastery level)
     """
     from app.models.assignment import StudentMastery
     
     # Get recently practiced concepts
-    recent = db.query(StudentMastery.concept_id).filter(
+    recent = db.query(StudentMastery.concept_id, StudentMastery.mastery_level).filter(
         StudentMastery.student_id == student_id
     ).order_by(StudentMastery.last_practiced.desc()).limit(limit).all()
     
-    return [str(r[0]) for r in recent]
-
-
-def _get_recent_question_ids(
-    db: Session,
-    student_id: str,
-    days: int = 30
-) -> List[str]:
-    """
-    Get IDs of questions recently answered by student.
-    
-    Args:
-        db: Database session
-        student_id: Student UUID
-        days: Number of days to look back
-        
-    Returns:
-        List of question IDs
-    """
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    
-    from datetime import timedelta
-    
-    recent_responses = db.query(StudentResponse.question_id).join(
-        StudentAssignment
-    ).filter(
-        and_(
-            StudentAssignment.student_id == student_id,
-            StudentResponse.answered_at >= cutoff_date
-        )
-    ).all()
-    
-    return [str(r[0]) for r in recent_responses]
+    return [(str(r[0]), float(r[1])) for r in recent]
 
 
 def get_next_recommended_difficulty(
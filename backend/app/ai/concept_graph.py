@@ -0,0 +1,196 @@
+"""
+Concept Graph - AI/ML Component
+Process-wide, read-only index of concepts and their prerequisite graph.
+
+Gap analysis and mastery graphs need concept names, subjects and
+prerequisites for every concept a student has touched. Instead of querying
+them per concept, the whole graph is loaded once (two queries) and shared
+by all requests until its version stamp changes.
+
+The version stamp has two parts:
+- a local counter bumped when a session that wrote Concept /
+  ConceptPrerequisite rows in this process commits (immediate
+  invalidation)
+- a checksum of every concept and edge column the graph uses, re-read at
+  most every CONCEPT_GRAPH_REFRESH_SECONDS to pick up writes from other
+  processes or seed scripts, renames and swapped edges included
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, FrozenSet, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app.models.assignment import Concept, ConceptPrerequisite
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class ConceptGraph:
+    """Immutable snapshot of all concepts and prerequisite edges."""
+
+    def __init__(self, concepts, edges, version: Tuple):
+        self.version = version
+        self.names: Dict[str, str] = {}
+        self.subjects: Dict[str, Optional[str]] = {}
+        self.difficulty_levels: Dict[str, Optional[str]] = {}
+        for concept_id, name, subject, difficulty_level in concepts:
+            key = str(concept_id)
+            self.names[key] = name
+            self.subjects[key] = subject
+            self.difficulty_levels[key] = difficulty_level.value if difficulty_level else None
+
+        # concept -> direct prerequisites, and the reverse
+        self.prerequisites: Dict[str, List[str]] = {c: [] for c in self.names}
+        self.dependents: Dict[str, List[str]] = {c: [] for c in self.names}
+        for concept_id, prerequisite_id in edges:
+            concept_key, prereq_key = str(concept_id), str(prerequisite_id)
+            self.prerequisites.setdefault(concept_key, []).append(prereq_key)
+            self.dependents.setdefault(prereq_key, []).append(concept_key)
+
+        self.topological_order: List[str] = self._topological_sort()
+        self._position = {c: i for i, c in enumerate(self.topological_order)}
+        self.ancestors: Dict[str, FrozenSet[str]] = self._transitive_closure()
+
+    def __contains__(self, concept_id) -> bool:
+        return str(concept_id) in self.names
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def prerequisites_of(self, concept_id) -> List[str]:
+        """Direct prerequisites of a concept."""
+        return self.prerequisites.get(str(concept_id), [])
+
+    def all_prerequisites(self, concept_id) -> List[str]:
+        """Every transitive prerequisite, in learning (topological) order."""
+        ancestors = self.ancestors.get(str(concept_id), frozenset())
+        return sorted(ancestors, key=lambda c: self._position.get(c, len(self._position)))
+
+    def by_subject(self, subject: str) -> List[str]:
+        return [c for c in self.topological_order if self.subjects.get(c) == subject]
+
+    def _topological_sort(self) -> List[str]:
+        """Kahn's algorithm; concepts caught in a cycle are appended last."""
+        nodes = set(self.prerequisites) | set(self.dependents)
+        in_degree = {c: len(self.prerequisites.get(c, [])) for c in nodes}
+        ready = deque(sorted(c for c, d in in_degree.items() if d == 0))
+        order = []
+        while ready:
+            concept_id = ready.popleft()
+            order.append(concept_id)
+            for dependent in self.dependents.get(concept_id, []):
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    ready.append(dependent)
+
+        if len(order) < len(nodes):
+            seen = set(order)
+            order.extend(sorted(c for c in nodes if c not in seen))
+        return order
+
+    def _transitive_closure(self) -> Dict[str, FrozenSet[str]]:
+        ancestors: Dict[str, FrozenSet[str]] = {}
+        for concept_id in self.topological_order:
+            prereqs = self.prerequisites.get(concept_id, [])
+            if all(p in ancestors for p in prereqs):
+                closure = set(prereqs)
+                for p in prereqs:
+                    closure |= ancestors[p]
+                ancestors[concept_id] = frozenset(closure)
+            else:
+                # Part of a cycle: fall back to a graph walk
+                ancestors[concept_id] = frozenset(self._walk_prerequisites(concept_id))
+        return ancestors
+
+    def _walk_prerequisites(self, concept_id: str) -> set:
+        seen, stack = set(), list(self.prerequisites.get(concept_id, []))
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            stack.extend(self.prerequisites.get(current, []))
+        seen.discard(concept_id)
+        return seen
+
+
+_lock = threading.Lock()
+_graph: Optional[ConceptGraph] = None
+_local_version = 0
+_checked_at = 0.0
+
+
+def get_concept_graph(db: Session) -> ConceptGraph:
+    """
+    Return the shared concept graph, rebuilding it if its version changed.
+
+    Costs no queries on the hot path and two queries per refresh interval;
+    the graph is only rebuilt when the rows behind it changed.
+    """
+    global _graph, _checked_at
+    graph = _graph
+    now = time.monotonic()
+    if graph is not None and graph.version[0] == _local_version \
+            and now - _checked_at < settings.CONCEPT_GRAPH_REFRESH_SECONDS:
+        return graph
+
+    with _lock:
+        # Read the counter before the rows: a commit landing in between
+        # bumps it again and forces another check
+        local_version = _local_version
+        concepts = db.query(
+            Concept.id, Concept.name, Concept.subject, Concept.difficulty_level
+        ).order_by(Concept.id).all()
+        edges = db.query(
+            ConceptPrerequisite.concept_id, ConceptPrerequisite.prerequisite_id
+        ).order_by(ConceptPrerequisite.concept_id, ConceptPrerequisite.prerequisite_id).all()
+        version = (local_version, _fingerprint(concepts, edges))
+        if _graph is None or _graph.version != version:
+            _graph = ConceptGraph(concepts, edges, version)
+        _checked_at = now
+        return _graph
+
+
+def invalidate_concept_graph() -> None:
+    """Force a rebuild on next access."""
+    global _local_version
+    # No lock: this can fire from a commit while a rebuild holds _lock
+    _local_version += 1
+
+
+def _fingerprint(concepts, edges) -> int:
+    """Checksum of every column the graph is built from (stable within the process)."""
+    return hash((tuple(tuple(row) for row in concepts), tuple(tuple(row) for row in edges)))
+
+
+# Invalidate once the write is committed, so a concurrent rebuild cannot
+# store the old rows under the new version, and a rolled-back write never
+# reaches the graph
+_PENDING_KEY = "concept_graph_invalidation"
+
+
+def _on_concept_write(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is None:
+        invalidate_concept_graph()
+    else:
+        session.info[_PENDING_KEY] = True
+
+
+for _model in (Concept, ConceptPrerequisite):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _on_concept_write)
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_invalidation(session) -> None:
+    if session.info.pop(_PENDING_KEY, False):
+        invalidate_concept_graph()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidation(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
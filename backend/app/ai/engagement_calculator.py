@@ -4,11 +4,13 @@ Calculates real-time, explainable engagement scores for students.
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from app.models.engagement import EngagementEvent, AttendanceRecord, AttendanceStatus, EventType
-from app.models.assignment import StudentAssignment, AssignmentStatus
+from sqlalchemy import func, and_, case
+import uuid
+from app.models.engagement import EngagementEvent, EngagementIndex, AttendanceRecord, AttendanceStatus, EventType
+from app.models.assignment import Assignment, StudentAssignment, AssignmentStatus
+from app.models.class_model import Enrollment
 from app.config import get_settings
 
 settings = get_settings()
@@ -60,44 +62,212 @@ def calculate_engagement_index(
     if period_days is None:
         period_days = settings.ENGAGEMENT_CALCULATION_PERIOD_DAYS
     
+    student_id = _as_uuid(student_id)
+    class_id = _as_uuid(class_id)
     period_start = datetime.utcnow() - timedelta(days=period_days)
     
     # 1. Calculate Attendance Score (0-100)
     attendance_data = _calculate_attendance_score(db, student_id, class_id, period_start)
-    attendance_score = attendance_data['score']
     
     # 2. Calculate Assignment Submission Score (0-100)
     assignment_data = _calculate_assignment_submission_score(db, student_id, class_id, period_start)
-    submission_score = assignment_data['score']
     
     # 3. Calculate Quiz Participation Score (0-100)
     quiz_data = _calculate_quiz_participation_score(db, student_id, class_id, period_start)
-    quiz_score = quiz_data['score']
     
     # 4. Calculate Interaction Frequency Score (0-100)
     interaction_data = _calculate_interaction_score(db, student_id, class_id, period_start)
-    interaction_score = interaction_data['score']
     
     # 5. Calculate Timeliness Score (0-100)
     timeliness_data = _calculate_timeliness_score(db, student_id, class_id, period_start)
-    timeliness_score = timeliness_data['score']
     
     # 6. Calculate Resource Engagement Score (0-100)
     resource_data = _calculate_resource_engagement_score(db, student_id, class_id, period_start)
-    resource_score = resource_data['score']
     
+    factors = {
+        'attendance': attendance_data,
+        'assignment_submission': assignment_data,
+        'quiz_participation': quiz_data,
+        'interaction_frequency': interaction_data,
+        'timeliness': timeliness_data,
+        'resource_engagement': resource_data
+    }
+    
+    previous = _get_previous_index(db, student_id, class_id)
+    previous_score = float(previous.index_score) if previous else None
+    
+    return _build_engagement_result(factors, previous_score, period_days)
+
+
+def calculate_class_engagement(
+    db: Session,
+    class_id: str,
+    period_days: int = None,
+    student_ids: Optional[List[str]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Calculate engagement indices for every student in a class at once.
+    
+    Produces the same explainable breakdown as calculate_engagement_index,
+    but gathers each factor for the whole class with one GROUP BY query
+    instead of querying per student, so the number of round trips does
+    not grow with class size.
+    
+    Args:
+        db: Database session
+        class_id: Class UUID
+        period_days: Number of days to analyze (default from config)
+        student_ids: Optional subset of students (default: all enrolled students)
+        
+    Returns:
+        Mapping of student_id (str) -> engagement result, in the same shape
+        as calculate_engagement_index
+    """
+    if period_days is None:
+        period_days = settings.ENGAGEMENT_CALCULATION_PERIOD_DAYS
+    
+    class_id = _as_uuid(class_id)
+    period_start = datetime.utcnow() - timedelta(days=period_days)
+    
+    if student_ids is None:
+        rows = db.query(Enrollment.student_id).filter(Enrollment.class_id == class_id).all()
+        student_ids = [r[0] for r in rows]
+    else:
+        student_ids = [_as_uuid(s) for s in student_ids]
+    
+    if not student_ids:
+        return {}
+    
+    # 1. Attendance counts per student and status
+    attendance_counts: Dict[Any, Dict[Any, int]] = {}
+    attendance_rows = db.query(
+        AttendanceRecord.student_id,
+        AttendanceRecord.status,
+        func.count(AttendanceRecord.id)
+    ).filter(
+        and_(
+            AttendanceRecord.class_id == class_id,
+            AttendanceRecord.date >= period_start.date()
+        )
+    ).group_by(AttendanceRecord.student_id, AttendanceRecord.status).all()
+    
+    for sid, att_status, count in attendance_rows:
+        attendance_counts.setdefault(sid, {})[att_status] = count
+    
+    # 2 & 5. Submission and timeliness counts per student
+    submitted_case = case(
+        (StudentAssignment.status.in_([AssignmentStatus.SUBMITTED, AssignmentStatus.GRADED]), 1),
+        else_=0
+    )
+    turned_in_case = case((StudentAssignment.submitted_at.isnot(None), 1), else_=0)
+    on_time_case = case(
+        (
+            and_(
+                StudentAssignment.submitted_at.isnot(None),
+                Assignment.due_date.isnot(None),
+                StudentAssignment.submitted_at <= Assignment.due_date
+            ),
+            1
+        ),
+        else_=0
+    )
+    assignment_rows = db.query(
+        StudentAssignment.student_id,
+        func.count(StudentAssignment.id),
+        func.sum(submitted_case),
+        func.sum(turned_in_case),
+        func.sum(on_time_case)
+    ).join(
+        Assignment, StudentAssignment.assignment_id == Assignment.id
+    ).filter(
+        and_(
+            Assignment.class_id == class_id,
+            StudentAssignment.assigned_at >= period_start
+        )
+    ).group_by(StudentAssignment.student_id).all()
+    
+    assignment_counts = {
+        sid: (int(total), int(submitted or 0), int(turned_in or 0), int(on_time or 0))
+        for sid, total, submitted, turned_in, on_time in assignment_rows
+    }
+    
+    # 3, 4 & 6. Event counts per student and type
+    event_counts: Dict[Any, Dict[Any, int]] = {}
+    event_rows = db.query(
+        EngagementEvent.student_id,
+        EngagementEvent.event_type,
+        func.count(EngagementEvent.id)
+    ).filter(
+        and_(
+            EngagementEvent.class_id == class_id,
+            EngagementEvent.event_type.in_([
+                EventType.QUIZ_PARTICIPATION,
+                EventType.INTERACTION,
+                EventType.RESOURCE_ACCESS
+            ]),
+            EngagementEvent.timestamp >= period_start
+        )
+    ).group_by(EngagementEvent.student_id, EngagementEvent.event_type).all()
+    
+    for sid, event_type, count in event_rows:
+        event_counts.setdefault(sid, {})[event_type] = count
+    
+    # Class average interactions, over every student with at least one interaction
+    interaction_totals = [
+        counts[EventType.INTERACTION]
+        for counts in event_counts.values()
+        if counts.get(EventType.INTERACTION)
+    ]
+    class_avg = _average(interaction_totals)
+    
+    # Trend baseline: most recent stored index per student
+    previous_scores = _get_previous_class_scores(db, class_id)
+    
+    results = {}
+    for sid in student_ids:
+        attendance = attendance_counts.get(sid, {})
+        total_assigned, submitted, turned_in, on_time = assignment_counts.get(sid, (0, 0, 0, 0))
+        events = event_counts.get(sid, {})
+        
+        factors = {
+            'attendance': _score_attendance(
+                present=attendance.get(AttendanceStatus.PRESENT, 0),
+                late=attendance.get(AttendanceStatus.LATE, 0),
+                absent=attendance.get(AttendanceStatus.ABSENT, 0),
+                total=sum(attendance.values())
+            ),
+            'assignment_submission': _score_assignment_submission(total_assigned, submitted),
+            'quiz_participation': _score_quiz_participation(
+                events.get(EventType.QUIZ_PARTICIPATION, 0), period_start
+            ),
+            'interaction_frequency': _score_interaction(
+                events.get(EventType.INTERACTION, 0), class_avg, period_start
+            ),
+            'timeliness': _score_timeliness(turned_in, on_time),
+            'resource_engagement': _score_resource_engagement(
+                events.get(EventType.RESOURCE_ACCESS, 0), period_start
+            )
+        }
+        
+        results[str(sid)] = _build_engagement_result(factors, previous_scores.get(sid), period_days)
+    
+    return results
+
+
+def _build_engagement_result(
+    factors: Dict[str, Dict[str, Any]],
+    previous_score: Optional[float],
+    period_days: int
+) -> Dict[str, Any]:
+    """Combine per-factor scores into the weighted, explainable index."""
     # Calculate weighted index
-    index_score = (
-        attendance_score * ENGAGEMENT_WEIGHTS['attendance'] +
-        submission_score * ENGAGEMENT_WEIGHTS['assignment_submission'] +
-        quiz_score * ENGAGEMENT_WEIGHTS['quiz_participation'] +
-        interaction_score * ENGAGEMENT_WEIGHTS['interaction_frequency'] +
-        timeliness_score * ENGAGEMENT_WEIGHTS['timeliness'] +
-        resource_score * ENGAGEMENT_WEIGHTS['resource_engagement']
+    index_score = sum(
+        factors[name]['score'] * weight
+        for name, weight in ENGAGEMENT_WEIGHTS.items()
     )
     
     # Determine trend (compare with previous period)
-    trend = _determine_trend(db, student_id, class_id, index_score, period_days)
+    trend = _trend_from_scores(index_score, previous_score)
     
     # Determine risk level
     risk_level = 'low' if index_score >= 70 else 'medium' if index_score >= 50 else 'high'
@@ -105,42 +275,13 @@ def calculate_engagement_index(
     return {
         'index_score': round(index_score, 2),
         'contributing_factors': {
-            'attendance': {
-                'score': round(attendance_score, 2),
-                'weight': ENGAGEMENT_WEIGHTS['attendance'],
-                'contribution': round(attendance_score * ENGAGEMENT_WEIGHTS['attendance'], 2),
-                'details': attendance_data['details']
-            },
-            'assignment_submission': {
-                'score': round(submission_score, 2),
-                'weight': ENGAGEMENT_WEIGHTS['assignment_submission'],
-                'contribution': round(submission_score * ENGAGEMENT_WEIGHTS['assignment_submission'], 2),
-                'details': assignment_data['details']
-            },
-            'quiz_participation': {
-                'score': round(quiz_score, 2),
-                'weight': ENGAGEMENT_WEIGHTS['quiz_participation'],
-                'contribution': round(quiz_score * ENGAGEMENT_WEIGHTS['quiz_participation'], 2),
-                'details': quiz_data['details']
-            },
-            'interaction_frequency': {
-                'score': round(interaction_score, 2),
-                'weight': ENGAGEMENT_WEIGHTS['interaction_frequency'],
-                'contribution': round(interaction_score * ENGAGEMENT_WEIGHTS['interaction_frequency'], 2),
-                'details': interaction_data['details']
-            },
-            'timeliness': {
-                'score': round(timeliness_score, 2),
-                'weight': ENGAGEMENT_WEIGHTS['timeliness'],
-                'contribution': round(timeliness_score * ENGAGEMENT_WEIGHTS['timeliness'], 2),
-                'details': timeliness_data['details']
-            },
-            'resource_engagement': {
-                'score': round(resource_score, 2),
-                'weight': ENGAGEMENT_WEIGHTS['resource_engagement'],
-                'contribution': round(resource_score * ENGAGEMENT_WEIGHTS['resource_engagement'], 2),
-                'details': resource_data['details']
+            name: {
+                'score': round(factors[name]['score'], 2),
+                'weight': weight,
+                'contribution': round(factors[name]['score'] * weight, 2),
+                'details': factors[name]['details']
             }
+            for name, weight in ENGAGEMENT_WEIGHTS.items()
         },
         'trend': trend,
         'risk_level': risk_level,
@@ -165,16 +306,21 @@ def _calculate_attendance_score(
         )
     ).all()
     
-    if not records:
+    return _score_attendance(
+        present=sum(1 for r in records if r.status == AttendanceStatus.PRESENT),
+        late=sum(1 for r in records if r.status == AttendanceStatus.LATE),
+        absent=sum(1 for r in records if r.status == AttendanceStatus.ABSENT),
+        total=len(records)
+    )
+
+
+def _score_attendance(present: int, late: int, absent: int, total: int) -> Dict[str, Any]:
+    """Score attendance counts (0-100)."""
+    if not total:
         return {'score': 50.0, 'details': {'total': 0, 'present': 0, 'absent': 0, 'late': 0, 'rate': 0}}
     
-    total = len(records)
-    present = sum(1 for r in records if r.status == AttendanceStatus.PRESENT)
-    late = sum(1 for r in records if r.status == AttendanceStatus.LATE)
-    absent = sum(1 for r in records if r.status == AttendanceStatus.ABSENT)
-    
     # Calculate score: present = 100%, late = 50%, absent = 0%
-    score = ((present * 1.0 + late * 0.5) / total) * 100 if total > 0 else 50.0
+    score = ((present * 1.0 + late * 0.5) / total) * 100
     
     return {
         'score': score,
@@ -183,7 +329,7 @@ def _calculate_attendance_score(
             'present': present,
             'absent': absent,
             'late': late,
-            'rate': round((present / total) * 100, 1) if total > 0 else 0
+            'rate': round((present / total) * 100, 1)
         }
     }
 
@@ -206,13 +352,17 @@ def _calculate_assignment_submission_score(
         )
     ).all()
     
-    if not assignments:
-        return {'score': 50.0, 'details': {'total': 0, 'submitted': 0, 'rate': 0}}
-    
-    total = len(assignments)
     submitted = sum(1 for a in assignments if a.status in [AssignmentStatus.SUBMITTED, AssignmentStatus.GRADED])
     
-    score = (submitted / total) * 100 if total > 0 else 50.0
+    return _score_assignment_submission(len(assignments), submitted)
+
+
+def _score_assignment_submission(total: int, submitted: int) -> Dict[str, Any]:
+    """Score assignment submission counts (0-100)."""
+    if not total:
+        return {'score': 50.0, 'details': {'total': 0, 'submitted': 0, 'rate': 0}}
+    
+    score = (submitted / total) * 100
     
     return {
         'score': score,
@@ -220,7 +370,7 @@ def _calculate_assignment_submission_score(
             'total': total,
             'submitted': submitted,
             'pending': total - submitted,
-            'rate': round((submitted / total) * 100, 1) if total > 0 else 0
+            'rate': round((submitted / total) * 100, 1)
         }
     }
 
@@ -242,6 +392,11 @@ def _calculate_quiz_participation_score(
         )
     ).scalar()
     
+    return _score_quiz_participation(quiz_events, period_start)
+
+
+def _score_quiz_participation(quiz_events: int, period_start: datetime) -> Dict[str, Any]:
+    """Score quiz participation count (0-100)."""
     # Normalize: assume 1 quiz per week is good engagement
     weeks = (datetime.utcnow() - period_start).days / 7
     expected_quizzes = max(1, weeks)
@@ -265,25 +420,27 @@ def _calculate_interaction_score(
     period_start: datetime
 ) -> Dict[str, Any]:
     """Calculate interaction frequency score (0-100)."""
-    # Count interaction events
-    interactions = db.query(func.count(EngagementEvent.id)).filter(
+    # Count interactions for every student in the class; the student's own
+    # count and the class average both come from this one grouped query
+    rows = db.query(
+        EngagementEvent.student_id,
+        func.count(EngagementEvent.id)
+    ).filter(
         and_(
-            EngagementEvent.student_id == student_id,
             EngagementEvent.class_id == class_id,
             EngagementEvent.event_type == EventType.INTERACTION,
             EngagementEvent.timestamp >= period_start
         )
-    ).scalar()
+    ).group_by(EngagementEvent.student_id).all()
     
-    # Get class average for normalization
-    class_avg = db.query(func.avg(func.count(EngagementEvent.id))).filter(
-        and_(
-            EngagementEvent.class_id == class_id,
-            EngagementEvent.event_type == EventType.INTERACTION,
-            EngagementEvent.timestamp >= period_start
-        )
-    ).group_by(EngagementEvent.student_id).scalar()
+    counts = {sid: count for sid, count in rows}
+    class_avg = _average(list(counts.values()))
     
+    return _score_interaction(counts.get(student_id, 0), class_avg, period_start)
+
+
+def _score_interaction(interactions: int, class_avg: float, period_start: datetime) -> Dict[str, Any]:
+    """Score interaction count against the class average (0-100)."""
     if class_avg and class_avg > 0:
         score = min(100, (interactions / class_avg) * 100)
     else:
@@ -319,16 +476,20 @@ def _calculate_timeliness_score(
         )
     ).all()
     
-    if not assignments:
-        return {'score': 50.0, 'details': {'total': 0, 'on_time': 0, 'late': 0, 'rate': 0}}
-    
-    total = len(assignments)
     on_time = sum(
         1 for a in assignments
         if a.assignment.due_date and a.submitted_at <= a.assignment.due_date
     )
     
-    score = (on_time / total) * 100 if total > 0 else 50.0
+    return _score_timeliness(len(assignments), on_time)
+
+
+def _score_timeliness(total: int, on_time: int) -> Dict[str, Any]:
+    """Score on-time submission counts (0-100)."""
+    if not total:
+        return {'score': 50.0, 'details': {'total': 0, 'on_time': 0, 'late': 0, 'rate': 0}}
+    
+    score = (on_time / total) * 100
     
     return {
         'score': score,
@@ -336,7 +497,7 @@ def _calculate_timeliness_score(
             'total': total,
             'on_time': on_time,
             'late': total - on_time,
-            'rate': round((on_time / total) * 100, 1) if total > 0 else 0
+            'rate': round((on_time / total) * 100, 1)
         }
     }
 
@@ -358,6 +519,11 @@ def _calculate_resource_engagement_score(
         )
     ).scalar()
     
+    return _score_resource_engagement(accesses, period_start)
+
+
+def _score_resource_engagement(accesses: int, period_start: datetime) -> Dict[str, Any]:
+    """Score resource access count (0-100)."""
     # Normalize: 1 access per day = 100%
     days = max(1, (datetime.utcnow() - period_start).days)
     score = min(100, (accesses / days) * 100)
@@ -367,33 +533,46 @@ def _calculate_resource_engagement_score(
         'details': {
             'accesses': accesses,
             'days': days,
-            'avg_per_day': round(accesses / days, 2) if days > 0 else 0
+            'avg_per_day': round(accesses / days, 2)
         }
     }
 
 
-def _determine_trend(
-    db: Session,
-    student_id: str,
-    class_id: str,
-    current_score: float,
-    period_days: int
-) -> str:
-    """Determine engagement trend by comparing with previous period."""
-    from app.models.engagement import EngagementIndex
-    
-    # Get most recent previous index
-    previous = db.query(EngagementIndex).filter(
+def _get_previous_index(db: Session, student_id: str, class_id: str) -> Optional[EngagementIndex]:
+    """Get the most recently stored index for a student in a class."""
+    return db.query(EngagementIndex).filter(
         and_(
             EngagementIndex.student_id == student_id,
             EngagementIndex.class_id == class_id
         )
     ).order_by(EngagementIndex.calculated_at.desc()).first()
+
+
+def _get_previous_class_scores(db: Session, class_id: str) -> Dict[Any, float]:
+    """Get the most recently stored index score for every student in a class."""
+    latest = db.query(
+        EngagementIndex.student_id,
+        func.max(EngagementIndex.calculated_at).label('calculated_at')
+    ).filter(
+        EngagementIndex.class_id == class_id
+    ).group_by(EngagementIndex.student_id).subquery()
+    
+    rows = db.query(EngagementIndex.student_id, EngagementIndex.index_score).join(
+        latest,
+        and_(
+            EngagementIndex.student_id == latest.c.student_id,
+            EngagementIndex.calculated_at == latest.c.calculated_at
+        )
+    ).filter(EngagementIndex.class_id == class_id).all()
     
-    if not previous:
+    return {sid: float(score) for sid, score in rows}
+
+
+def _trend_from_scores(current_score: float, previous_score: Optional[float]) -> str:
+    """Classify the change between the previous and current index."""
+    if previous_score is None:
         return 'stable'
     
-    previous_score = float(previous.index_score)
     diff = current_score - previous_score
     
     if diff > 5:
@@ -402,3 +581,13 @@ def _determine_trend(
         return 'declining'
     else:
         return 'stable'
+
+
+def _average(values: List[int]) -> float:
+    """Mean of a list of counts (0 when empty)."""
+    return sum(values) / len(values) if values else 0
+
+
+def _as_uuid(value):
+    """Accept either a UUID or its string form."""
+    return uuid.UUID(value) if isinstance(value, str) else value
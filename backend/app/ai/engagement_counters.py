@@ -0,0 +1,512 @@
+"""
+Incremental Engagement Counters - AI/ML Component
+Maintains running per-(student, class) factor counts so the engagement
+index can be derived without re-scanning the whole calculation window.
+
+Each new attendance record, engagement event or assignment status change
+adds a small delta to a day bucket and to the running totals. Buckets that
+fall out of the window are subtracted from the totals and deleted, so the
+totals always describe the last ENGAGEMENT_CALCULATION_PERIOD_DAYS days
+(at day granularity).
+"""
+
+from datetime import datetime, timedelta, date
+from typing import Dict, Any, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, case
+from app.models.engagement import (
+    EngagementEvent, EngagementIndex, EngagementCounter, EngagementDayBucket,
+    AttendanceRecord, AttendanceStatus, EventType
+)
+from app.models.assignment import Assignment, StudentAssignment, AssignmentStatus
+from app.ai.engagement_calculator import (
+    _score_attendance, _score_assignment_submission, _score_quiz_participation,
+    _score_interaction, _score_timeliness, _score_resource_engagement,
+    _build_engagement_result, _as_uuid
+)
+from app.config import get_settings
+
+settings = get_settings()
+
+COUNTER_FIELDS = (
+    'attendance_total', 'attendance_present', 'attendance_late', 'attendance_absent',
+    'assignments_total', 'assignments_submitted', 'submissions_total', 'submissions_on_time',
+    'quiz_events', 'interaction_events', 'resource_events'
+)
+
+# Event types that feed a counter
+EVENT_COUNTER_FIELDS = {
+    EventType.QUIZ_PARTICIPATION: 'quiz_events',
+    EventType.INTERACTION: 'interaction_events',
+    EventType.RESOURCE_ACCESS: 'resource_events'
+}
+
+SUBMITTED_STATUSES = (AssignmentStatus.SUBMITTED, AssignmentStatus.GRADED)
+
+
+def record_attendance(db: Session, record: AttendanceRecord) -> None:
+    """Count a newly added attendance record."""
+    deltas = {'attendance_total': 1}
+    if record.status == AttendanceStatus.PRESENT:
+        deltas['attendance_present'] = 1
+    elif record.status == AttendanceStatus.LATE:
+        deltas['attendance_late'] = 1
+    elif record.status == AttendanceStatus.ABSENT:
+        deltas['attendance_absent'] = 1
+
+    apply_delta(db, record.student_id, record.class_id, record.date, deltas)
+
+
+def record_event(db: Session, event: EngagementEvent) -> None:
+    """Count a newly added engagement event (only factor-relevant types)."""
+    field = EVENT_COUNTER_FIELDS.get(event.event_type)
+    if not field:
+        return
+
+    day = event.timestamp.date() if event.timestamp else datetime.utcnow().date()
+    apply_delta(db, event.student_id, event.class_id, day, {field: 1})
+
+
+def record_assignment_assigned(db: Session, student_assignment: StudentAssignment, class_id) -> None:
+    """Count a newly assigned StudentAssignment."""
+    apply_delta(
+        db,
+        student_assignment.student_id,
+        class_id,
+        _assigned_day(student_assignment),
+        {'assignments_total': 1}
+    )
+
+
+def record_assignments_assigned(db: Session, class_id, student_ids: List, day: Optional[date] = None) -> None:
+    """Count one new assignment for many students of a class (bulk assign)."""
+    apply_class_delta(db, class_id, student_ids, day or datetime.utcnow().date(), {'assignments_total': 1})
+
+
+def record_assignment_status_change(
+    db: Session,
+    student_assignment: StudentAssignment,
+    previous_status: Optional[AssignmentStatus],
+    previous_submitted_at: Optional[datetime] = None
+) -> None:
+    """
+    Count a StudentAssignment status change.
+
+    Deltas are attributed to the day the assignment was assigned, matching
+    how the full calculator windows submissions by assigned_at.
+    """
+    assignment = student_assignment.assignment
+    deltas = {}
+
+    was_submitted = previous_status in SUBMITTED_STATUSES
+    is_submitted = student_assignment.status in SUBMITTED_STATUSES
+    if is_submitted != was_submitted:
+        deltas['assignments_submitted'] = 1 if is_submitted else -1
+
+    if previous_submitted_at is None and student_assignment.submitted_at is not None:
+        deltas['submissions_total'] = 1
+        if assignment and _is_on_time(student_assignment.submitted_at, assignment.due_date):
+            deltas['submissions_on_time'] = 1
+
+    if deltas:
+        apply_delta(
+            db,
+            student_assignment.student_id,
+            assignment.class_id,
+            _assigned_day(student_assignment),
+            deltas
+        )
+
+
+def apply_delta(db: Session, student_id, class_id, day: date, deltas: Dict[str, int]) -> Optional[EngagementCounter]:
+    """
+    Add factor deltas for one day to the running totals.
+
+    Must be called after the source row has been added and flushed: if the
+    student has no counter yet, it is seeded from the raw tables, which
+    already include that row, and the delta is not applied again.
+
+    The counter row stays locked (SELECT ... FOR UPDATE) until the caller
+    commits, so concurrent deltas for the same student and class, and the
+    day buckets they touch, are applied one after the other.
+
+    Does not commit; callers commit along with their own writes.
+    """
+    student_id = _as_uuid(student_id)
+    class_id = _as_uuid(class_id)
+
+    counter = _get_counter(db, student_id, class_id, lock=True)
+    if counter is None:
+        return _seed_counter(db, student_id, class_id)
+
+    cutoff = _window_cutoff()
+    _expire_buckets(db, counter, cutoff)
+
+    if day < cutoff:
+        return counter  # Already outside the window
+
+    bucket = db.query(EngagementDayBucket).filter(
+        and_(
+            EngagementDayBucket.student_id == student_id,
+            EngagementDayBucket.class_id == class_id,
+            EngagementDayBucket.day == day
+        )
+    ).first()
+    if bucket is None:
+        bucket = EngagementDayBucket(student_id=student_id, class_id=class_id, day=day)
+        _zero(bucket)
+        db.add(bucket)
+
+    for field, delta in deltas.items():
+        setattr(bucket, field, getattr(bucket, field) + delta)
+        setattr(counter, field, getattr(counter, field) + delta)
+
+    db.flush()
+    return counter
+
+
+def apply_class_delta(db: Session, class_id, student_ids: List, day: date, deltas: Dict[str, int]) -> None:
+    """
+    Apply the same deltas to many students of one class.
+
+    Same contract as apply_delta, but counters and day buckets are read
+    with one query each instead of per student. Counters are locked in
+    student_id order, so two class-wide updates cannot deadlock.
+    """
+    class_id = _as_uuid(class_id)
+    student_ids = [_as_uuid(s) for s in student_ids]
+    if not student_ids:
+        return
+
+    counters = {
+        c.student_id: c for c in db.query(EngagementCounter).filter(
+            EngagementCounter.class_id == class_id,
+            EngagementCounter.student_id.in_(student_ids)
+        ).order_by(EngagementCounter.student_id).with_for_update().populate_existing().all()
+    }
+    missing = [s for s in student_ids if s not in counters]
+    if missing:
+        # Seeding reads the raw tables, which already include the new rows
+        if not counters and db.query(EngagementCounter.id).filter(
+            EngagementCounter.class_id == class_id
+        ).first() is None:
+            rebuild_counters(db, class_id)
+        else:
+            for student_id in missing:
+                rebuild_counters(db, class_id, student_id)
+
+    cutoff = _window_cutoff()
+    for counter in counters.values():
+        _expire_buckets(db, counter, cutoff)
+    if day < cutoff or not counters:
+        return
+
+    buckets = {
+        b.student_id: b for b in db.query(EngagementDayBucket).filter(
+            EngagementDayBucket.class_id == class_id,
+            EngagementDayBucket.day == day,
+            EngagementDayBucket.student_id.in_(list(counters.keys()))
+        ).all()
+    }
+    for student_id, counter in counters.items():
+        bucket = buckets.get(student_id)
+        if bucket is None:
+            bucket = EngagementDayBucket(student_id=student_id, class_id=class_id, day=day)
+            _zero(bucket)
+            db.add(bucket)
+        for field, delta in deltas.items():
+            setattr(bucket, field, getattr(bucket, field) + delta)
+            setattr(counter, field, getattr(counter, field) + delta)
+
+    db.flush()
+
+
+def calculate_engagement_from_counters(
+    db: Session,
+    student_id: str,
+    class_id: str,
+    previous_score: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Derive the engagement index from the running counters.
+
+    Produces the same result shape as calculate_engagement_index. The only
+    reads are the student's counter and the class interaction average;
+    the trend baseline can be passed in when the caller already has it.
+    """
+    period_days = settings.ENGAGEMENT_CALCULATION_PERIOD_DAYS
+    student_id = _as_uuid(student_id)
+    class_id = _as_uuid(class_id)
+
+    counter = _get_counter(db, student_id, class_id)
+    if counter is None:
+        counter = _seed_counter(db, student_id, class_id)
+    else:
+        _expire_buckets(db, counter, _window_cutoff())
+
+    period_start = datetime.utcnow() - timedelta(days=period_days)
+
+    # Class average over students with at least one interaction
+    interaction_sum, interaction_students = db.query(
+        func.sum(EngagementCounter.interaction_events),
+        func.count(EngagementCounter.id)
+    ).filter(
+        and_(
+            EngagementCounter.class_id == class_id,
+            EngagementCounter.interaction_events > 0
+        )
+    ).one()
+    class_avg = (int(interaction_sum) / interaction_students) if interaction_students else 0
+
+    factors = {
+        'attendance': _score_attendance(
+            present=counter.attendance_present,
+            late=counter.attendance_late,
+            absent=counter.attendance_absent,
+            total=counter.attendance_total
+        ),
+        'assignment_submission': _score_assignment_submission(
+            counter.assignments_total, counter.assignments_submitted
+        ),
+        'quiz_participation': _score_quiz_participation(counter.quiz_events, period_start),
+        'interaction_frequency': _score_interaction(counter.interaction_events, class_avg, period_start),
+        'timeliness': _score_timeliness(counter.submissions_total, counter.submissions_on_time),
+        'resource_engagement': _score_resource_engagement(counter.resource_events, period_start)
+    }
+
+    if previous_score is None:
+        previous = db.query(EngagementIndex.index_score).filter(
+            and_(
+                EngagementIndex.student_id == student_id,
+                EngagementIndex.class_id == class_id
+            )
+        ).order_by(EngagementIndex.calculated_at.desc()).first()
+        previous_score = float(previous[0]) if previous else None
+
+    return _build_engagement_result(factors, previous_score, period_days)
+
+
+def rebuild_counters(db: Session, class_id: str, student_id: Optional[str] = None) -> Optional[EngagementCounter]:
+    """
+    Rebuild day buckets and running totals from the raw tables.
+
+    Rebuilds a single student when student_id is given, otherwise every
+    student with activity in the class (grouped queries, so the cost does
+    not depend on class size). Used to seed counters and to repair drift.
+    Does not commit.
+
+    Returns:
+        The student's counter when student_id is given, else None
+    """
+    class_id = _as_uuid(class_id)
+    student_id = _as_uuid(student_id) if student_id is not None else None
+    cutoff = _window_cutoff()
+    window_start = datetime.combine(cutoff, datetime.min.time())
+
+    buckets: Dict[Any, Dict[date, Dict[str, int]]] = {}
+
+    def add(sid, day, field, count):
+        day = _to_date(day)
+        if day is None or day < cutoff or not count:
+            return
+        counts = buckets.setdefault(sid, {}).setdefault(day, {})
+        counts[field] = counts.get(field, 0) + int(count)
+
+    def scoped(query, model):
+        query = query.filter(model.class_id == class_id)
+        if student_id is not None:
+            query = query.filter(model.student_id == student_id)
+        return query
+
+    # Attendance per student, day and status
+    attendance_rows = scoped(db.query(
+        AttendanceRecord.student_id,
+        AttendanceRecord.date,
+        AttendanceRecord.status,
+        func.count(AttendanceRecord.id)
+    ), AttendanceRecord).filter(
+        AttendanceRecord.date >= cutoff
+    ).group_by(AttendanceRecord.student_id, AttendanceRecord.date, AttendanceRecord.status).all()
+
+    status_fields = {
+        AttendanceStatus.PRESENT: 'attendance_present',
+        AttendanceStatus.LATE: 'attendance_late',
+        AttendanceStatus.ABSENT: 'attendance_absent'
+    }
+    for sid, day, att_status, count in attendance_rows:
+        add(sid, day, 'attendance_total', count)
+        if att_status in status_fields:
+            add(sid, day, status_fields[att_status], count)
+
+    # Assignments per student and assigned day
+    assigned_day = func.date(StudentAssignment.assigned_at)
+    assignment_query = db.query(
+        StudentAssignment.student_id,
+        assigned_day,
+        func.count(StudentAssignment.id),
+        func.sum(case((StudentAssignment.status.in_(SUBMITTED_STATUSES), 1), else_=0)),
+        func.sum(case((StudentAssignment.submitted_at.isnot(None), 1), else_=0)),
+        func.sum(case(
+            (
+                and_(
+                    StudentAssignment.submitted_at.isnot(None),
+                    Assignment.due_date.isnot(None),
+                    StudentAssignment.submitted_at <= Assignment.due_date
+                ),
+                1
+            ),
+            else_=0
+        ))
+    ).join(
+        Assignment, StudentAssignment.assignment_id == Assignment.id
+    ).filter(
+        and_(
+            Assignment.class_id == class_id,
+            StudentAssignment.assigned_at >= window_start
+        )
+    )
+    if student_id is not None:
+        assignment_query = assignment_query.filter(StudentAssignment.student_id == student_id)
+    assignment_rows = assignment_query.group_by(StudentAssignment.student_id, assigned_day).all()
+
+    for sid, day, total, submitted, turned_in, on_time in assignment_rows:
+        add(sid, day, 'assignments_total', total)
+        add(sid, day, 'assignments_submitted', submitted)
+        add(sid, day, 'submissions_total', turned_in)
+        add(sid, day, 'submissions_on_time', on_time)
+
+    # Factor-relevant events per student, day and type
+    event_day = func.date(EngagementEvent.timestamp)
+    event_rows = scoped(db.query(
+        EngagementEvent.student_id,
+        event_day,
+        EngagementEvent.event_type,
+        func.count(EngagementEvent.id)
+    ), EngagementEvent).filter(
+        and_(
+            EngagementEvent.event_type.in_(list(EVENT_COUNTER_FIELDS)),
+            EngagementEvent.timestamp >= window_start
+        )
+    ).group_by(EngagementEvent.student_id, event_day, EngagementEvent.event_type).all()
+
+    for sid, day, event_type, count in event_rows:
+        add(sid, day, EVENT_COUNTER_FIELDS[event_type], count)
+
+    # Replace existing state
+    scoped(db.query(EngagementDayBucket), EngagementDayBucket).delete(synchronize_session=False)
+    counters = {c.student_id: c for c in scoped(db.query(EngagementCounter), EngagementCounter).all()}
+
+    student_ids = set(buckets) | set(counters)
+    if student_id is not None:
+        student_ids.add(student_id)
+
+    bucket_rows = []
+    for sid in student_ids:
+        counter = counters.get(sid)
+        if counter is None:
+            counter = EngagementCounter(student_id=sid, class_id=class_id)
+            db.add(counter)
+            counters[sid] = counter
+        counter.window_start = cutoff
+        _zero(counter)
+
+        for day, counts in buckets.get(sid, {}).items():
+            row = {field: 0 for field in COUNTER_FIELDS}
+            row.update(counts)
+            bucket_rows.append(dict(row, student_id=sid, class_id=class_id, day=day))
+            for field, count in counts.items():
+                setattr(counter, field, getattr(counter, field) + count)
+
+    if bucket_rows:
+        db.bulk_insert_mappings(EngagementDayBucket, bucket_rows)
+
+    db.flush()
+    return counters.get(student_id) if student_id is not None else None
+
+
+def _seed_counter(db: Session, student_id, class_id) -> EngagementCounter:
+    """
+    Create a missing counter from the raw tables.
+
+    The first time a class is seen every student in it is seeded at once,
+    so the class interaction average covers the whole class.
+    """
+    class_seeded = db.query(EngagementCounter.id).filter(
+        EngagementCounter.class_id == class_id
+    ).first() is not None
+
+    if class_seeded:
+        return rebuild_counters(db, class_id, student_id)
+
+    rebuild_counters(db, class_id)
+    return _get_counter(db, student_id, class_id) or rebuild_counters(db, class_id, student_id)
+
+
+def _expire_buckets(db: Session, counter: EngagementCounter, cutoff: date) -> None:
+    """Subtract and delete day buckets that have fallen out of the window."""
+    if counter.window_start >= cutoff:
+        return
+
+    expired = db.query(EngagementDayBucket).filter(
+        and_(
+            EngagementDayBucket.student_id == counter.student_id,
+            EngagementDayBucket.class_id == counter.class_id,
+            EngagementDayBucket.day < cutoff
+        )
+    ).all()
+
+    for bucket in expired:
+        for field in COUNTER_FIELDS:
+            setattr(counter, field, getattr(counter, field) - getattr(bucket, field))
+        db.delete(bucket)
+
+    counter.window_start = cutoff
+    db.flush()
+
+
+def _get_counter(db: Session, student_id, class_id, lock: bool = False) -> Optional[EngagementCounter]:
+    query = db.query(EngagementCounter).filter(
+        and_(
+            EngagementCounter.student_id == student_id,
+            EngagementCounter.class_id == class_id
+        )
+    )
+    if lock:
+        # Reload under the lock; totals cached in the session may be stale
+        query = query.with_for_update().populate_existing()
+    return query.first()
+
+
+def _zero(row) -> None:
+    for field in COUNTER_FIELDS:
+        setattr(row, field, 0)
+
+
+def _window_cutoff() -> date:
+    """Oldest day included in the engagement window."""
+    return (datetime.utcnow() - timedelta(days=settings.ENGAGEMENT_CALCULATION_PERIOD_DAYS)).date()
+
+
+def _assigned_day(student_assignment: StudentAssignment) -> date:
+    assigned_at = student_assignment.assigned_at
+    return assigned_at.date() if assigned_at else datetime.utcnow().date()
+
+
+def _is_on_time(submitted_at: datetime, due_date: Optional[datetime]) -> bool:
+    if not due_date:
+        return False
+    # Compare as naive UTC; due dates may come back timezone-aware
+    if submitted_at.tzinfo is not None:
+        submitted_at = submitted_at.replace(tzinfo=None) - (submitted_at.utcoffset() or timedelta(0))
+    if due_date.tzinfo is not None:
+        due_date = due_date.replace(tzinfo=None) - (due_date.utcoffset() or timedelta(0))
+    return submitted_at <= due_date
+
+
+def _to_date(value) -> Optional[date]:
+    """func.date() returns a string on SQLite and a date on PostgreSQL."""
+    if isinstance(value, datetime):
+        return value.date()
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
@@ -0,0 +1,225 @@
+"""
+Integrity Scan - AI/ML Component
+Class-wide comparison of Thought Proof writing features.
+
+A scan takes every finalized proof of a class or assignment, computes the
+keystroke features of each recording (app.ai.keystroke_analytics) in a
+process pool, and compares each session with the rest of the group:
+
+- paste_heavy: more than INTEGRITY_PASTE_RATIO_FLAG of the text was pasted
+- unusual_<feature>: a robust z-score (median / MAD) beyond
+  INTEGRITY_Z_THRESHOLD for one of SCORED_FEATURES, once the group has
+  MIN_GROUP_SIZE recordings or more
+
+Workers load and analyse one recording at a time and send back only the
+scalar features, so memory does not grow with the length of the
+recordings. A recording that cannot be analysed is listed with its error
+and left out of the comparison. The ranked result is stored on an
+IntegrityScanReport.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+import numpy as np
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.assignment import Assignment, StudentAssignment
+from app.models.thought_proof import IntegrityScanReport, ScanStatus, ThoughtProof
+from app.models.user import User
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Compared against the group; two-sided, as unusually fast or unusually
+# revision-free writing is as telling as the opposite
+SCORED_FEATURES = (
+    'paste_ratio', 'iki_median_ms', 'iki_cv', 'revision_ratio',
+    'typing_chars_per_minute', 'burst_typing_share', 'idle_share'
+)
+REPORTED_FEATURES = SCORED_FEATURES + (
+    'total_events', 'typed_chars', 'pasted_chars', 'largest_paste_chars',
+    'duration_seconds', 'active_seconds', 'pause_count', 'lines_revised'
+)
+MIN_GROUP_SIZE = 5
+MAD_SCALE = 0.6745  # Makes the MAD-based z-score comparable to a standard one
+
+
+def run_scan(report_id: UUID, workers: Optional[int] = None) -> IntegrityScanReport:
+    """
+    Run a queued integrity scan and store its ranked results.
+
+    Args:
+        report_id: IntegrityScanReport to fill in
+        workers: Worker processes (INTEGRITY_SCAN_WORKERS by default)
+
+    Returns:
+        The completed report
+    """
+    db = SessionLocal()
+    try:
+        report = db.query(IntegrityScanReport).filter(IntegrityScanReport.id == report_id).first()
+        if not report:
+            raise ValueError("Integrity scan report not found")
+        report.status = ScanStatus.RUNNING
+        report.error = None
+        db.commit()
+
+        try:
+            sessions = _finalized_sessions(db, report)
+            outcomes = dict(scan_features([s['thought_proof_id'] for s in sessions], workers))
+            analysed = [{**s, **outcomes[s['thought_proof_id']]} for s in sessions]
+            results = rank_sessions([s for s in analysed if 'features' in s])
+            skipped = [s for s in analysed if 'error' in s]
+        except Exception as e:
+            db.rollback()
+            report.status = ScanStatus.FAILED
+            report.error = str(e)
+            db.commit()
+            raise
+
+        report.results = results
+        report.skipped = skipped
+        report.proofs_scanned = len(results)
+        report.flagged_count = sum(1 for r in results if r['flags'])
+        report.status = ScanStatus.COMPLETED
+        report.completed_at = datetime.utcnow()
+        db.commit()
+        db.refresh(report)
+        logger.info(
+            f"Integrity scan {report_id}: {report.flagged_count} of {report.proofs_scanned} sessions flagged, "
+            f"{len(skipped)} could not be analysed"
+        )
+        return report
+    finally:
+        db.close()
+
+
+def scan_features(proof_ids: Sequence[str], workers: Optional[int] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    (proof id, {"features": reported features} or {"error": message}) for
+    each proof, computed in parallel.
+
+    Falls back to this process when there is one worker, one CPU or one
+    proof, or when already running inside a daemonic process (a Celery
+    prefork worker), which may not start children.
+    """
+    workers = min(workers or settings.INTEGRITY_SCAN_WORKERS, os.cpu_count() or 1, len(proof_ids))
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        for proof_id in proof_ids:
+            yield _proof_features(proof_id)
+        return
+
+    # Spawned, not forked: the scan usually runs on a thread of a multi-threaded server
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        yield from pool.map(_proof_features, proof_ids, chunksize=max(1, len(proof_ids) // (workers * 4)))
+
+
+def rank_sessions(sessions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Flag and order sessions, highest risk first.
+
+    Each session dict carries its "features"; the result adds rank, flags,
+    z_scores and anomaly_score (largest absolute z-score).
+    """
+    if not sessions:
+        return []
+
+    matrix = np.array([[s['features'][name] for name in SCORED_FEATURES] for s in sessions], dtype=float)
+    z = robust_z_scores(matrix) if len(sessions) >= MIN_GROUP_SIZE else np.zeros_like(matrix)
+
+    results = []
+    for session, row in zip(sessions, z):
+        flags = []
+        if session['features']['paste_ratio'] > settings.INTEGRITY_PASTE_RATIO_FLAG:
+            flags.append('paste_heavy')
+        flags.extend(
+            f"unusual_{name}" for name, score in zip(SCORED_FEATURES, row)
+            if abs(score) >= settings.INTEGRITY_Z_THRESHOLD
+        )
+        results.append({
+            **session,
+            'flags': flags,
+            'z_scores': {name: round(float(score), 2) for name, score in zip(SCORED_FEATURES, row)},
+            'anomaly_score': round(float(np.abs(row).max()), 2)
+        })
+
+    results.sort(key=lambda r: (
+        'paste_heavy' in r['flags'], len(r['flags']), r['anomaly_score'], r['features']['paste_ratio']
+    ), reverse=True)
+    for rank, result in enumerate(results, start=1):
+        result['rank'] = rank
+    return results
+
+
+def robust_z_scores(matrix: np.ndarray) -> np.ndarray:
+    """
+    Column-wise modified z-scores, MAD_SCALE * (x - median) / MAD.
+
+    Where more than half the group shares a value (MAD of zero), the mean
+    absolute deviation stands in; a column with no spread scores zero.
+    """
+    median = np.median(matrix, axis=0)
+    deviation = np.abs(matrix - median)
+    mad = np.median(deviation, axis=0)
+    mean_ad = deviation.mean(axis=0) * 1.2533  # sqrt(pi / 2): standard deviation of a normal
+    scale = np.where(mad > 0, mad / MAD_SCALE, mean_ad)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (matrix - median) / scale
+    return np.where(scale > 0, z, 0.0)
+
+
+def _finalized_sessions(db: Session, report: IntegrityScanReport) -> List[Dict[str, Any]]:
+    query = db.query(
+        ThoughtProof.id, StudentAssignment.student_id, User.first_name, User.last_name,
+        Assignment.id, Assignment.title
+    ).join(
+        StudentAssignment, StudentAssignment.id == ThoughtProof.student_assignment_id
+    ).join(
+        Assignment, Assignment.id == StudentAssignment.assignment_id
+    ).join(
+        User, User.id == StudentAssignment.student_id
+    ).filter(ThoughtProof.finalized_at.isnot(None))
+
+    if report.assignment_id:
+        query = query.filter(Assignment.id == report.assignment_id)
+    if report.class_id:
+        query = query.filter(Assignment.class_id == report.class_id)
+
+    return [
+        {
+            'thought_proof_id': str(proof_id),
+            'student_id': str(student_id),
+            'student_name': f"{first_name} {last_name}",
+            'assignment_id': str(assignment_id),
+            'assignment_title': title
+        }
+        for proof_id, student_id, first_name, last_name, assignment_id, title in query.all()
+    ]
+
+
+def _proof_features(proof_id: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Reported features of one recording, or the error that stopped its
+    analysis; runs in a worker process.
+    """
+    from app.services.thought_proof_service import ThoughtProofService
+
+    db = SessionLocal()
+    try:
+        features = ThoughtProofService.get_keystroke_features(db, UUID(proof_id))
+    except Exception as e:
+        logger.warning(f"Integrity scan could not analyse thought proof {proof_id}: {e}")
+        return proof_id, {'error': f"{type(e).__name__}: {e}"}
+    finally:
+        db.close()
+
+    duration = features['duration_seconds']
+    features['idle_share'] = round(features['idle_seconds'] / duration, 4) if duration else 0.0
+    return proof_id, {'features': {name: features[name] for name in REPORTED_FEATURES}}
@@ -0,0 +1,171 @@
+"""
+Keystroke Analytics - AI/ML Component
+Vectorized writing-process features for Thought Proof recordings.
+
+Works on the event arrays of keystroke_codec.decode_arrays (one entry per
+event), so a recording is analysed in a handful of NumPy operations
+instead of Python loops over events. The same feature dict feeds the
+narration prompt, the teacher's per-proof analytics view and class-wide
+integrity scans.
+"""
+
+from typing import Any, Dict, List
+import numpy as np
+from app.utils.keystroke_codec import EVENT_TYPE_CODES
+
+INSERT = EVENT_TYPE_CODES['insert']
+DELETE = EVENT_TYPE_CODES['delete']
+PASTE = EVENT_TYPE_CODES['paste']
+CURSOR_MOVE = EVENT_TYPE_CODES['cursor_move']
+
+IDLE_MS = 5000  # A gap this long is a pause, not typing
+BURST_GAP_MS = 2000  # Typing separated by less than this belongs to one burst
+MIN_BURST_EVENTS = 5
+IKI_BINS_MS = [0, 50, 100, 200, 400, 800, 1600, 3200, IDLE_MS]
+TOP_ITEMS = 5  # Idle segments and revised lines listed
+
+ARRAY_KEYS = ('ts_ms', 'type', 'position', 'length', 'line', 'column', 'content_len')
+
+
+def compute_features(arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """
+    Writing-process features of one recording.
+
+    Args:
+        arrays: ts_ms, type, line and content_len arrays, as returned by
+            keystroke_codec.decode_arrays (concatenated over chunks)
+
+    Returns:
+        JSON-serializable dict of counts, timing, inter-key interval
+        histogram, bursts, paste ratio, revision per line and idle segments
+    """
+    ts = np.asarray(arrays['ts_ms'], dtype=np.int64)
+    types = np.asarray(arrays['type'])
+    lines = np.asarray(arrays['line'])
+    content_len = np.asarray(arrays['content_len'])
+
+    # Batches are sorted on arrival; a late batch can still be out of order
+    if len(ts) > 1 and np.any(ts[1:] < ts[:-1]):
+        order = np.argsort(ts, kind='stable')
+        ts, types, lines, content_len = ts[order], types[order], lines[order], content_len[order]
+
+    inserts = types == INSERT
+    deletes = types == DELETE
+    pastes = types == PASTE
+    typing = inserts | deletes
+
+    features = {
+        'total_events': int(len(ts)),
+        'insert_events': int(inserts.sum()),
+        'delete_events': int(deletes.sum()),
+        'paste_events': int(pastes.sum()),
+        'cursor_move_events': int((types == CURSOR_MOVE).sum()),
+        'duration_seconds': float((ts[-1] - ts[0]) / 1000) if len(ts) else 0.0
+    }
+    features['revision_ratio'] = _ratio(features['delete_events'], features['insert_events'])
+
+    features.update(_idle_features(ts))
+    features.update(_interval_features(ts[typing]))
+    features.update(_paste_features(content_len, inserts, pastes, features['active_seconds']))
+    features.update(_revision_features(lines, inserts, deletes))
+    return features
+
+
+def concatenate_arrays(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Join per-chunk event arrays into one set of arrays."""
+    if not parts:
+        return {key: np.zeros(0, dtype=np.int64) for key in ARRAY_KEYS}
+    return {key: np.concatenate([part[key] for part in parts]) for key in ARRAY_KEYS}
+
+
+def _idle_features(ts: np.ndarray) -> Dict[str, Any]:
+    gaps = np.diff(ts)
+    idle = gaps >= IDLE_MS
+    idle_gaps = gaps[idle]
+
+    # Longest pauses, as (offset from the first event, length) in seconds
+    longest = np.argsort(idle_gaps)[::-1][:TOP_ITEMS]
+    starts = ts[:-1][idle][longest] - ts[0] if len(ts) else np.zeros(0)
+    return {
+        'active_seconds': float(gaps[~idle].sum() / 1000),
+        'idle_seconds': float(idle_gaps.sum() / 1000),
+        'pause_count': int(idle.sum()),
+        'avg_pause_seconds': float(idle_gaps.mean() / 1000) if len(idle_gaps) else 0.0,
+        'longest_pause_seconds': float(idle_gaps.max() / 1000) if len(idle_gaps) else 0.0,
+        'idle_segments': [
+            {'start_seconds': float(start / 1000), 'duration_seconds': float(gap / 1000)}
+            for start, gap in zip(starts, idle_gaps[longest])
+        ]
+    }
+
+
+def _interval_features(typing_ts: np.ndarray) -> Dict[str, Any]:
+    intervals = np.diff(typing_ts)
+    within = intervals[intervals < IDLE_MS]
+    counts, _ = np.histogram(within, bins=IKI_BINS_MS)
+
+    # Bursts: runs of typing events with no gap of BURST_GAP_MS or more
+    if len(typing_ts):
+        burst_ids = np.concatenate(([0], np.cumsum(intervals >= BURST_GAP_MS)))
+        sizes = np.bincount(burst_ids)
+        bursts = sizes[sizes >= MIN_BURST_EVENTS]
+    else:
+        bursts = np.zeros(0, dtype=np.int64)
+
+    mean = float(within.mean()) if len(within) else 0.0
+    return {
+        'iki_histogram': {'bins_ms': IKI_BINS_MS, 'counts': counts.tolist()},
+        'iki_median_ms': float(np.median(within)) if len(within) else 0.0,
+        'iki_p90_ms': float(np.percentile(within, 90)) if len(within) else 0.0,
+        'iki_mean_ms': mean,
+        'iki_cv': float(within.std() / mean) if mean else 0.0,
+        'burst_count': int(len(bursts)),
+        'avg_burst_events': float(bursts.mean()) if len(bursts) else 0.0,
+        'longest_burst_events': int(bursts.max()) if len(bursts) else 0,
+        'burst_typing_share': _ratio(int(bursts.sum()), len(typing_ts))
+    }
+
+
+def _paste_features(content_len: np.ndarray, inserts: np.ndarray, pastes: np.ndarray,
+                    active_seconds: float) -> Dict[str, Any]:
+    typed = int(content_len[inserts].sum())
+    pasted = int(content_len[pastes].sum())
+    return {
+        'typed_chars': typed,
+        'pasted_chars': pasted,
+        'paste_ratio': _ratio(pasted, typed + pasted),
+        'largest_paste_chars': int(content_len[pastes].max()) if pastes.any() else 0,
+        'typing_chars_per_minute': round(typed / (active_seconds / 60), 2) if active_seconds else 0.0
+    }
+
+
+def _revision_features(lines: np.ndarray, inserts: np.ndarray, deletes: np.ndarray) -> Dict[str, Any]:
+    # Counted per distinct line number, so the arrays never grow with how large one is
+    edited = (lines >= 0) & (inserts | deletes)
+    if not edited.any():
+        return {'lines_edited': 0, 'lines_revised': 0, 'avg_line_revision_density': 0.0,
+                'max_line_revision_density': 0.0, 'most_revised_lines': []}
+
+    line_numbers, slots = np.unique(lines[edited], return_inverse=True)
+    inserted = np.bincount(slots, weights=inserts[edited], minlength=len(line_numbers)).astype(np.int64)
+    deleted = np.bincount(slots, weights=deletes[edited], minlength=len(line_numbers)).astype(np.int64)
+
+    # Deletions per insertion on each line
+    density = deleted / np.maximum(inserted, 1)
+
+    most = np.argsort(deleted, kind='stable')[::-1][:TOP_ITEMS]
+    most = most[deleted[most] > 0]
+    return {
+        'lines_edited': int(len(line_numbers)),
+        'lines_revised': int((deleted > 0).sum()),
+        'avg_line_revision_density': float(density.mean()),
+        'max_line_revision_density': float(density.max()),
+        'most_revised_lines': [
+            {'line': int(line_numbers[slot]), 'inserts': int(inserted[slot]), 'deletes': int(deleted[slot])}
+            for slot in most
+        ]
+    }
+
+
+def _ratio(part: int, whole: int) -> float:
+    return round(part / whole, 4) if whole else 0.0
@@ -0,0 +1,257 @@
+"""
+Mastery Replay - AI/ML Component
+Vectorized re-scoring of stored responses for backfills and parameter changes.
+
+update_mastery_score handles one live answer at a time. This module replays
+a whole response history with the same maths: every (student, concept)
+group is an independent chain, so step k of all chains is computed in one
+NumPy operation and the loop only runs as many times as the longest chain.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from app.models.assignment import (
+    StudentMastery, StudentResponse, StudentAssignment, AssignmentQuestion, QuestionDifficulty
+)
+from app.ai.mastery_scorer import (
+    CORRECT_DIFFICULTY_MULTIPLIER, INCORRECT_DIFFICULTY_MULTIPLIER, EXPECTED_TIME_SECONDS
+)
+from app.services import tutor_context
+from app.config import get_settings
+
+settings = get_settings()
+
+# Difficulty codes used in the arrays; the last code means "unknown"
+DIFFICULTY_CODES = [d.value for d in QuestionDifficulty]
+_UNKNOWN = len(DIFFICULTY_CODES)
+
+_CORRECT_MULT = np.array([CORRECT_DIFFICULTY_MULTIPLIER.get(d, 1.0) for d in DIFFICULTY_CODES] + [1.0])
+_INCORRECT_MULT = np.array([INCORRECT_DIFFICULTY_MULTIPLIER.get(d, 1.0) for d in DIFFICULTY_CODES] + [1.0])
+_EXPECTED_TIME = np.array([EXPECTED_TIME_SECONDS.get(d, 180) for d in DIFFICULTY_CODES] + [180], dtype=float)
+
+SECONDS_PER_DAY = 86400
+
+# Decimal places kept by StudentMastery.mastery_level
+_MASTERY_DECIMALS = StudentMastery.__table__.c.mastery_level.type.scale
+
+
+def replay_mastery(
+    student: np.ndarray,
+    concept: np.ndarray,
+    correct: np.ndarray,
+    difficulty: np.ndarray,
+    time_spent: np.ndarray,
+    timestamp: np.ndarray,
+    decay_rate: Optional[float] = None,
+    grace_period_days: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Replay responses from zero mastery and return the final state per group.
+
+    Args:
+        student: Integer student codes
+        concept: Integer concept codes
+        correct: Booleans
+        difficulty: Difficulty codes (index into DIFFICULTY_CODES, len = unknown)
+        time_spent: Seconds spent per response
+        timestamp: Epoch seconds (UTC), sorted ascending
+        decay_rate: Defaults to MASTERY_DECAY_RATE
+        grace_period_days: Defaults to MASTERY_DECAY_GRACE_PERIOD_DAYS
+
+    Returns:
+        {
+            'student': codes per group,
+            'concept': codes per group,
+            'mastery': final mastery per group,
+            'attempts': responses per group,
+            'last_practiced': epoch seconds of the last response per group
+        }
+    """
+    if decay_rate is None:
+        decay_rate = settings.MASTERY_DECAY_RATE
+    if grace_period_days is None:
+        grace_period_days = settings.MASTERY_DECAY_GRACE_PERIOD_DAYS
+
+    student = np.asarray(student, dtype=np.int64)
+    concept = np.asarray(concept, dtype=np.int64)
+    correct = np.asarray(correct, dtype=bool)
+    difficulty = np.asarray(difficulty, dtype=np.int64)
+    time_spent = np.asarray(time_spent, dtype=float)
+    timestamp = np.asarray(timestamp, dtype=float)
+
+    n = len(student)
+    if n == 0:
+        empty = np.array([], dtype=np.int64)
+        return {'student': empty, 'concept': empty, 'mastery': np.array([]),
+                'attempts': empty, 'last_practiced': np.array([])}
+
+    # Per-response terms that do not depend on the running mastery
+    performance = np.where(
+        correct,
+        0.7 + 0.3 * _CORRECT_MULT[difficulty],
+        0.3 - 0.2 * _INCORRECT_MULT[difficulty]
+    )
+    time_ratio = time_spent / _EXPECTED_TIME[difficulty]
+    time_factor = np.where((time_ratio >= 0.5) & (time_ratio <= 1.5), 1.0, 0.8)
+
+    # Group by (student, concept); a stable sort keeps time order inside groups
+    order = np.lexsort((np.arange(n), concept, student))
+    g_student, g_concept = student[order], concept[order]
+    starts = np.flatnonzero(np.r_[True, (g_student[1:] != g_student[:-1]) | (g_concept[1:] != g_concept[:-1])])
+    lengths = np.diff(np.r_[starts, n])
+
+    performance, time_factor, timestamp = performance[order], time_factor[order], timestamp[order]
+
+    mastery = np.zeros(len(starts))
+    last = np.full(len(starts), np.nan)
+
+    # Step k updates every group that has at least k + 1 responses
+    for k in range(int(lengths.max())):
+        active = np.flatnonzero(lengths > k)
+        idx = starts[active] + k
+        current = mastery[active]
+
+        learning_rate = 0.3 * (1 - current / 100)
+        change = (performance[idx] - current / 100) * learning_rate * time_factor[idx] * 100
+        updated = np.clip(current + change, 0, 100)
+
+        # Temporal decay against the previous response (timedelta.days floors)
+        previous = last[active]
+        days = np.floor((timestamp[idx] - np.nan_to_num(previous, nan=0.0)) / SECONDS_PER_DAY)
+        decay_days = np.where(~np.isnan(previous) & (days > grace_period_days), days - grace_period_days, 0)
+        updated = updated * (1 - decay_rate) ** decay_days
+        # The live path stores every step in mastery_level and reads it back
+        updated = np.round(updated, _MASTERY_DECIMALS)
+
+        mastery[active] = updated
+        last[active] = timestamp[idx]
+
+    return {
+        'student': g_student[starts],
+        'concept': g_concept[starts],
+        'mastery': mastery,
+        'attempts': lengths,
+        'last_practiced': last
+    }
+
+
+def load_response_history(db: Session, student_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Load graded responses as replay arrays in one query.
+
+    Returns:
+        Arrays for replay_mastery plus 'students' / 'concepts' lists that
+        map the integer codes back to UUIDs.
+    """
+    query = db.query(
+        StudentAssignment.student_id,
+        AssignmentQuestion.concept_id,
+        StudentResponse.is_correct,
+        AssignmentQuestion.difficulty,
+        StudentResponse.time_spent_seconds,
+        StudentResponse.answered_at
+    ).join(
+        StudentAssignment, StudentResponse.student_assignment_id == StudentAssignment.id
+    ).join(
+        AssignmentQuestion, StudentResponse.question_id == AssignmentQuestion.id
+    ).filter(
+        AssignmentQuestion.concept_id.isnot(None),
+        StudentResponse.is_correct.isnot(None)
+    )
+    if student_ids:
+        query = query.filter(StudentAssignment.student_id.in_(student_ids))
+
+    rows = query.order_by(StudentResponse.answered_at).all()
+
+    students, concepts = {}, {}
+    difficulty_codes = {code: i for i, code in enumerate(DIFFICULTY_CODES)}
+
+    return {
+        'student': np.array([students.setdefault(r[0], len(students)) for r in rows], dtype=np.int64),
+        'concept': np.array([concepts.setdefault(r[1], len(concepts)) for r in rows], dtype=np.int64),
+        'correct': np.array([bool(r[2]) for r in rows], dtype=bool),
+        'difficulty': np.array([
+            difficulty_codes.get(getattr(r[3], 'value', r[3]), _UNKNOWN) for r in rows
+        ], dtype=np.int64),
+        'time_spent': np.array([r[4] or 0 for r in rows], dtype=float),
+        'timestamp': np.array([_epoch(r[5]) for r in rows], dtype=float),
+        'students': list(students),
+        'concepts': list(concepts)
+    }
+
+
+def recompute_mastery(
+    db: Session,
+    student_ids: Optional[List[str]] = None,
+    decay_rate: Optional[float] = None,
+    grace_period_days: Optional[int] = None,
+    dry_run: bool = False
+) -> Dict[str, int]:
+    """
+    Rebuild StudentMastery rows from the full response history.
+
+    Rows are written with one bulk update and one bulk insert. Concepts a
+    student has no stored responses for are left untouched.
+
+    Returns:
+        {'responses': int, 'updated': int, 'created': int}
+    """
+    history = load_response_history(db, student_ids)
+    result = replay_mastery(
+        history['student'], history['concept'], history['correct'],
+        history['difficulty'], history['time_spent'], history['timestamp'],
+        decay_rate=decay_rate, grace_period_days=grace_period_days
+    )
+
+    summary = {'responses': len(history['student']), 'updated': 0, 'created': 0}
+    if not len(result['mastery']):
+        return summary
+
+    students = [history['students'][i] for i in result['student']]
+    concepts = [history['concepts'][i] for i in result['concept']]
+
+    existing = {
+        (m.student_id, m.concept_id): m.id
+        for m in db.query(StudentMastery.id, StudentMastery.student_id, StudentMastery.concept_id).filter(
+            StudentMastery.student_id.in_(list(set(students)))
+        ).all()
+    }
+
+    updates, inserts = [], []
+    for student_id, concept_id, mastery, attempts, last in zip(
+        students, concepts, result['mastery'], result['attempts'], result['last_practiced']
+    ):
+        values = {
+            'mastery_level': round(float(mastery), 2),
+            'attempts': int(attempts),
+            'last_practiced': datetime.utcfromtimestamp(float(last))
+        }
+        mastery_id = existing.get((student_id, concept_id))
+        if mastery_id:
+            updates.append({'id': mastery_id, **values})
+        else:
+            inserts.append({'student_id': student_id, 'concept_id': concept_id, **values})
+
+    summary['updated'], summary['created'] = len(updates), len(inserts)
+    if dry_run:
+        return summary
+
+    if updates:
+        db.bulk_update_mappings(StudentMastery, updates)
+    if inserts:
+        db.bulk_insert_mappings(StudentMastery, inserts)
+    tutor_context.mark_stale(db, set(students))
+    db.commit()
+
+    return summary
+
+
+def _epoch(value: Optional[datetime]) -> float:
+    """Epoch seconds; naive datetimes are treated as UTC."""
+    if value is None:
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
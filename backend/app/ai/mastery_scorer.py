@@ -4,14 +4,36 @@ Tracks and updates concept-level mastery using Bayesian-inspired approach.
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
-from app.models.assignment import StudentMastery, Concept, ConceptPrerequisite, QuestionDifficulty
+from app.models.assignment import StudentMastery, QuestionDifficulty
+from app.ai.concept_graph import ConceptGraph, get_concept_graph
 from app.config import get_settings
 
 settings = get_settings()
 
+# Correct answer: higher difficulty = more mastery gain
+CORRECT_DIFFICULTY_MULTIPLIER = {
+    QuestionDifficulty.EASY.value: 0.5,
+    QuestionDifficulty.MEDIUM.value: 1.0,
+    QuestionDifficulty.HARD.value: 1.5
+}
+
+# Incorrect answer: higher difficulty = less mastery loss
+INCORRECT_DIFFICULTY_MULTIPLIER = {
+    QuestionDifficulty.EASY.value: 1.5,
+    QuestionDifficulty.MEDIUM.value: 1.0,
+    QuestionDifficulty.HARD.value: 0.5
+}
+
+# Heuristic expected time per difficulty (seconds)
+EXPECTED_TIME_SECONDS = {
+    QuestionDifficulty.EASY.value: 60,      # 1 minute
+    QuestionDifficulty.MEDIUM.value: 180,   # 3 minutes
+    QuestionDifficulty.HARD.value: 300      # 5 minutes
+}
+
 
 def update_mastery_score(
     db: Session,
@@ -65,50 +87,11 @@ def update_mastery_score(
     
     current_mastery = float(mastery.mastery_level)
     
-    # Calculate performance score (0-1)
-    if is_correct:
-        # Correct answer: higher difficulty = more mastery gain
-        difficulty_multiplier = {
-            QuestionDifficulty.EASY.value: 0.5,
-            QuestionDifficulty.MEDIUM.value: 1.0,
-            QuestionDifficulty.HARD.value: 1.5
-        }.get(difficulty, 1.0)
-        performance_score = 0.7 + (0.3 * difficulty_multiplier)
-    else:
-        # Incorrect answer: higher difficulty = less mastery loss
-        difficulty_multiplier = {
-            QuestionDifficulty.EASY.value: 1.5,
-            QuestionDifficulty.MEDIUM.value: 1.0,
-            QuestionDifficulty.HARD.value: 0.5
-        }.get(difficulty, 1.0)
-        performance_score = 0.3 - (0.2 * difficulty_multiplier)
-    
-    # Get expected time for this concept/difficulty
-    expected_time = _get_expected_time(db, concept_id, difficulty)
-    
-    # Time factor (optimal time = good, too fast or too slow = concerning)
-    if expected_time > 0:
-        time_ratio = time_spent_seconds / expected_time
-        time_factor = 1.0 if 0.5 <= time_ratio <= 1.5 else 0.8
-    else:
-        time_factor = 1.0
-    
-    # Learning rate (decreases as mastery increases - harder to improve at high mastery)
-    learning_rate = 0.3 * (1 - current_mastery / 100)
-    
-    # Calculate mastery change
-    mastery_change = (performance_score - current_mastery / 100) * learning_rate * time_factor * 100
-    
-    # Update mastery (bounded 0-100)
-    new_mastery = max(0, min(100, current_mastery + mastery_change))
-    
-    # Apply temporal decay for concepts not practiced recently
-    if mastery.last_practiced:
-        days_since_practice = (datetime.utcnow() - mastery.last_practiced).days
-        if days_since_practice > settings.MASTERY_DECAY_GRACE_PERIOD_DAYS:
-            decay_days = days_since_practice - settings.MASTERY_DECAY_GRACE_PERIOD_DAYS
-            decay_factor = (1 - settings.MASTERY_DECAY_RATE) ** decay_days
-            new_mastery *= decay_factor
+    performance_score = _performance_score(is_correct, difficulty)
+    time_factor = _time_factor(db, concept_id, difficulty, time_spent_seconds)
+    new_mastery, mastery_change = _next_mastery(
+        current_mastery, performance_score, time_factor, mastery.last_practiced
+    )
     
     # Update database
     mastery.mastery_level = new_mastery
@@ -126,6 +109,80 @@ def update_mastery_score(
     }
 
 
+def update_mastery_batch(
+    db: Session,
+    student_id: str,
+    evidence: Dict[str, List[Tuple[bool, str, int]]]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Apply update_mastery_score semantics to many concepts at once.
+    
+    Each concept gets a single update step whose performance score and
+    time factor are the means over all of its responses, so a 50-question
+    submission costs one SELECT for the mastery rows regardless of size.
+    The caller owns the transaction (nothing is committed here).
+    
+    Args:
+        db: Database session
+        student_id: Student UUID
+        evidence: concept_id -> [(is_correct, difficulty, time_spent_seconds), ...]
+        
+    Returns:
+        concept_id -> same shape as update_mastery_score
+    """
+    if not evidence:
+        return {}
+    
+    records = {
+        str(m.concept_id): m
+        for m in db.query(StudentMastery).filter(
+            StudentMastery.student_id == student_id,
+            StudentMastery.concept_id.in_(list(evidence.keys()))
+        ).all()
+    }
+    
+    results = {}
+    for concept_id, responses in evidence.items():
+        if not responses:
+            continue
+        
+        mastery = records.get(str(concept_id))
+        if not mastery:
+            mastery = StudentMastery(
+                student_id=student_id,
+                concept_id=concept_id,
+                mastery_level=0.0,
+                attempts=0
+            )
+            db.add(mastery)
+        
+        current_mastery = float(mastery.mastery_level)
+        
+        performance_score = sum(
+            _performance_score(is_correct, difficulty) for is_correct, difficulty, _ in responses
+        ) / len(responses)
+        time_factor = sum(
+            _time_factor(db, concept_id, difficulty, time_spent) for _, difficulty, time_spent in responses
+        ) / len(responses)
+        new_mastery, mastery_change = _next_mastery(
+            current_mastery, performance_score, time_factor, mastery.last_practiced
+        )
+        
+        mastery.mastery_level = new_mastery
+        mastery.attempts = (mastery.attempts or 0) + len(responses)
+        mastery.last_practiced = datetime.utcnow()
+        
+        results[str(concept_id)] = {
+            'previous_mastery': round(current_mastery, 2),
+            'new_mastery': round(new_mastery, 2),
+            'change': round(mastery_change, 2),
+            'performance_score': round(performance_score, 2),
+            'attempts': mastery.attempts
+        }
+    
+    return results
+
+
 def get_mastery_gaps(
     db: Session,
     student_id: str,
@@ -145,9 +202,6 @@ def get_mastery_gaps(
     Returns:
         List of gaps with priority scores
     """
-    if threshold is None:
-        threshold = settings.MASTERY_THRESHOLD
-    
     # Get all mastery records for student
     mastery_records = db.query(StudentMastery).filter(
         StudentMastery.student_id == student_id
@@ -156,23 +210,41 @@ def get_mastery_gaps(
     # Create mastery map
     mastery_map = {str(m.concept_id): float(m.mastery_level) for m in mastery_records}
     
+    return rank_mastery_gaps(mastery_map, get_concept_graph(db), threshold, limit)
+
+
+def rank_mastery_gaps(
+    mastery_map: Dict[str, float],
+    graph: ConceptGraph,
+    threshold: float = None,
+    limit: int = 10
+) -> List[Dict[str, Any]]:
+    """
+    Gap ranking over an already-loaded mastery map (no queries).
+    
+    Args:
+        mastery_map: concept_id -> mastery level for one student
+        graph: Shared concept graph
+        threshold: Mastery threshold (default from config)
+        limit: Maximum number of gaps to return
+        
+    Returns:
+        Same shape as get_mastery_gaps
+    """
+    if threshold is None:
+        threshold = settings.MASTERY_THRESHOLD
+    
     gaps = []
     
     for concept_id, mastery_level in mastery_map.items():
         if mastery_level < threshold:
-            # Get concept details
-            concept = db.query(Concept).filter(Concept.id == concept_id).first()
-            if not concept:
+            if concept_id not in graph:
                 continue
             
             # Check prerequisites
-            prerequisites = db.query(ConceptPrerequisite).filter(
-                ConceptPrerequisite.concept_id == concept_id
-            ).all()
-            
             prereq_mastery_levels = [
-                mastery_map.get(str(p.prerequisite_id), 0)
-                for p in prerequisites
+                mastery_map.get(prerequisite_id, 0)
+                for prerequisite_id in graph.prerequisites_of(concept_id)
             ]
             
             avg_prereq_mastery = (
@@ -185,12 +257,17 @@ def get_mastery_gaps(
             
             gaps.append({
                 'concept_id': concept_id,
-                'concept_name': concept.name,
-                'subject': concept.subject,
+                'concept_name': graph.names[concept_id],
+                'subject': graph.subjects[concept_id],
                 'mastery_level': round(mastery_level, 2),
                 'priority': round(priority, 2),
                 'prerequisites_ready': avg_prereq_mastery >= threshold,
-                'avg_prerequisite_mastery': round(avg_prereq_mastery, 2)
+                'avg_prerequisite_mastery': round(avg_prereq_mastery, 2),
+                # Transitive prerequisites still below threshold, in learning order
+                'blocking_prerequisites': [
+                    p for p in graph.all_prerequisites(concept_id)
+                    if mastery_map.get(p, 0) < threshold
+                ]
             })
     
     # Sort by priority (descending)
@@ -215,24 +292,23 @@ def get_student_mastery_graph(
     Returns:
         Mastery graph with nodes and edges
     """
-    # Get all mastery records
-    query = db.query(StudentMastery, Concept).join(
-        Concept, StudentMastery.concept_id == Concept.id
-    ).filter(StudentMastery.student_id == student_id)
-    
-    if subject:
-        query = query.filter(Concept.subject == subject)
-    
-    records = query.all()
+    # Get all mastery records; concept details come from the shared graph
+    graph = get_concept_graph(db)
+    records = [
+        m for m in db.query(StudentMastery).filter(StudentMastery.student_id == student_id).all()
+        if str(m.concept_id) in graph
+        and (not subject or graph.subjects[str(m.concept_id)] == subject)
+    ]
     
     # Build nodes
     nodes = []
-    for mastery, concept in records:
+    for mastery in records:
+        concept_id = str(mastery.concept_id)
         nodes.append({
-            'id': str(concept.id),
-            'name': concept.name,
-            'subject': concept.subject,
-            'difficulty_level': concept.difficulty_level.value if concept.difficulty_level else None,
+            'id': concept_id,
+            'name': graph.names[concept_id],
+            'subject': graph.subjects[concept_id],
+            'difficulty_level': graph.difficulty_levels[concept_id],
             'mastery_level': round(float(mastery.mastery_level), 2),
             'attempts': mastery.attempts,
             'last_practiced': mastery.last_practiced.isoformat() if mastery.last_practiced else None
@@ -240,20 +316,15 @@ def get_student_mastery_graph(
     
     # Build edges (prerequisites)
     edges = []
-    concept_ids = [str(concept.id) for _, concept in records]
-    
-    prerequisites = db.query(ConceptPrerequisite).filter(
-        ConceptPrerequisite.concept_id.in_(concept_ids)
-    ).all()
-    
-    for prereq in prerequisites:
-        edges.append({
-            'from': str(prereq.prerequisite_id),
-            'to': str(prereq.concept_id)
-        })
+    for node in nodes:
+        for prerequisite_id in graph.prerequisites_of(node['id']):
+            edges.append({
+                'from': prerequisite_id,
+                'to': node['id']
+            })
     
     # Calculate overall statistics
-    mastery_levels = [float(m.mastery_level) for m, _ in records]
+    mastery_levels = [float(m.mastery_level) for m in records]
     
     return {
         'nodes': nodes,
@@ -267,6 +338,58 @@ def get_student_mastery_graph(
     }
 
 
+def _performance_score(is_correct: bool, difficulty: str) -> float:
+    """Performance score (0-1) for one answer."""
+    difficulty = getattr(difficulty, 'value', difficulty)
+    if is_correct:
+        return 0.7 + (0.3 * CORRECT_DIFFICULTY_MULTIPLIER.get(difficulty, 1.0))
+    return 0.3 - (0.2 * INCORRECT_DIFFICULTY_MULTIPLIER.get(difficulty, 1.0))
+
+
+def _time_factor(db: Session, concept_id: str, difficulty: str, time_spent_seconds: int) -> float:
+    """Optimal time = 1.0; too fast or too slow = 0.8."""
+    expected_time = _get_expected_time(db, concept_id, getattr(difficulty, 'value', difficulty))
+    if expected_time > 0:
+        time_ratio = (time_spent_seconds or 0) / expected_time
+        return 1.0 if 0.5 <= time_ratio <= 1.5 else 0.8
+    return 1.0
+
+
+def _next_mastery(
+    current_mastery: float,
+    performance_score: float,
+    time_factor: float,
+    last_practiced: Optional[datetime],
+    now: Optional[datetime] = None
+) -> Tuple[float, float]:
+    """
+    One mastery update step.
+    
+    `now` defaults to the current time; replays pass the response timestamp.
+    
+    Returns:
+        (new_mastery, mastery_change)
+    """
+    # Learning rate (decreases as mastery increases - harder to improve at high mastery)
+    learning_rate = 0.3 * (1 - current_mastery / 100)
+    
+    # Calculate mastery change
+    mastery_change = (performance_score - current_mastery / 100) * learning_rate * time_factor * 100
+    
+    # Update mastery (bounded 0-100)
+    new_mastery = max(0, min(100, current_mastery + mastery_change))
+    
+    # Apply temporal decay for concepts not practiced recently
+    if last_practiced:
+        days_since_practice = ((now or datetime.utcnow()) - last_practiced).days
+        if days_since_practice > settings.MASTERY_DECAY_GRACE_PERIOD_DAYS:
+            decay_days = days_since_practice - settings.MASTERY_DECAY_GRACE_PERIOD_DAYS
+            decay_factor = (1 - settings.MASTERY_DECAY_RATE) ** decay_days
+            new_mastery *= decay_factor
+    
+    return new_mastery, mastery_change
+
+
 def _get_expected_time(db: Session, concept_id: str, difficulty: str) -> int:
     """
     Get expected time for a concept/difficulty combination.
@@ -274,13 +397,7 @@ def _get_expected_time(db: Session, concept_id: str, difficulty: str) -> int:
     In production, this would use historical data.
     For now, use heuristic values.
     """
-    base_times = {
-        QuestionDifficulty.EASY.value: 60,      # 1 minute
-        QuestionDifficulty.MEDIUM.value: 180,   # 3 minutes
-        QuestionDifficulty.HARD.value: 300      # 5 minutes
-    }
-    
-    return base_times.get(difficulty, 180)
+    return EXPECTED_TIME_SECONDS.get(difficulty, 180)
 
 
 def calculate_mastery_decay(
@@ -0,0 +1,532 @@
+"""
+Question Bank - AI/ML Component
+Indexed question bank with per-student no-repeat sampling.
+
+Questions live in the question_bank table (indexed by concept and
+difficulty) and are served from a process-wide in-memory index, so picking
+k questions is O(k): random draws from the (concept, difficulty) bucket,
+rejecting ones the student has recently seen.
+
+"Recently seen" is a per-student Bloom filter in Redis, one generation per
+ISO week, checked across the last QUESTION_REPEAT_WINDOW_WEEKS weeks. It
+is keyed by the question's content hash, so it also covers questions that
+were copied into assignments before the bank existed. A student's filter
+is seeded from their response history once, then kept current as
+questions are handed out.
+"""
+
+import hashlib
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.assignment import (
+    BankQuestion, AssignmentQuestion, StudentAssignment, StudentResponse,
+    QuestionDifficulty, QuestionType
+)
+from app.utils.cache import redis_client
+from app.config import get_settings
+
+settings = get_settings()
+
+BLOOM_BITS = 16384  # 2 KB per student per week
+BLOOM_HASHES = 4
+IMPORT_BATCH_SIZE = 1000
+
+# Built-in questions used until a bank has been imported
+DEFAULT_QUESTIONS = [
+    # Algebra - Easy
+    {
+        "category": "Algebra",
+        "difficulty": QuestionDifficulty.EASY,
+        "question_text": "What is the value of x in the equation 2x + 5 = 15?",
+        "options": {"A": "5", "B": "10", "C": "15", "D": "20"},
+        "correct_answer": "A"
+    },
+    {
+        "category": "Algebra",
+        "difficulty": QuestionDifficulty.EASY,
+        "question_text": "Simplify: 3(x + 2) - 4",
+        "options": {"A": "3x + 2", "B": "3x - 2", "C": "3x + 6", "D": "3x - 6"},
+        "correct_answer": "A"
+    },
+    # Algebra - Medium
+    {
+        "category": "Algebra",
+        "difficulty": QuestionDifficulty.MEDIUM,
+        "question_text": "Solve for x: x^2 - 5x + 6 = 0",
+        "options": {"A": "x=2, 3", "B": "x=-2, -3", "C": "x=1, 6", "D": "x=-1, -6"},
+        "correct_answer": "A"
+    },
+    # Geometry - Easy
+    {
+        "category": "Geometry",
+        "difficulty": QuestionDifficulty.EASY,
+        "question_text": "What is the area of a rectangle with length 8 and width 5?",
+        "options": {"A": "40", "B": "13", "C": "26", "D": "20"},
+        "correct_answer": "A"
+    },
+    # Calculus - Hard
+    {
+        "category": "Calculus",
+        "difficulty": QuestionDifficulty.HARD,
+        "question_text": "Calculate the derivative of f(x) = x^2 * sin(x)",
+        "options": {
+            "A": "2x*sin(x) + x^2*cos(x)",
+            "B": "2x*cos(x)",
+            "C": "x^2*cos(x) - 2x*sin(x)",
+            "D": "sin(x) + cos(x)"
+        },
+        "correct_answer": "A"
+    },
+    # Science - 6th Standard
+    {
+        "category": "Science",
+        "difficulty": QuestionDifficulty.EASY,
+        "question_text": "Which of the following is NOT a characteristic of living things?",
+        "options": {"A": "Growth", "B": "Respiration", "C": "Movement", "D": "Shining"},
+        "correct_answer": "D"
+    },
+    {
+        "category": "Science",
+        "difficulty": QuestionDifficulty.EASY,
+        "question_text": "Which state of matter has a fixed volume but no fixed shape?",
+        "options": {"A": "Solid", "B": "Liquid", "C": "Gas", "D": "Plasma"},
+        "correct_answer": "B"
+    },
+    {
+        "category": "Science",
+        "difficulty": QuestionDifficulty.EASY,
+        "question_text": "Plants prepare their food using which of the following?",
+        "options": {"A": "Oxygen", "B": "Nitrogen", "C": "Carbon dioxide", "D": "Hydrogen"},
+        "correct_answer": "C"
+    },
+    {
+        "category": "Science",
+        "difficulty": QuestionDifficulty.EASY,
+        "question_text": "Which part of the plant absorbs water from the soil?",
+        "options": {"A": "Stem", "B": "Leaf", "C": "Flower", "D": "Root"},
+        "correct_answer": "D"
+    },
+    {
+        "category": "Science",
+        "difficulty": QuestionDifficulty.MEDIUM,
+        "question_text": "Which process causes cooling when sweat dries from our body?",
+        "options": {"A": "Condensation", "B": "Freezing", "C": "Evaporation", "D": "Melting"},
+        "correct_answer": "C"
+    },
+    {
+        "category": "Science",
+        "difficulty": QuestionDifficulty.EASY,
+        "question_text": "Which of the following is a decomposer?",
+        "options": {"A": "Cow", "B": "Lion", "C": "Mushroom", "D": "Grass"},
+        "correct_answer": "C"
+    },
+    {
+        "category": "Science",
+        "difficulty": QuestionDifficulty.EASY,
+        "question_text": "Why do fish die when taken out of water?",
+        "options": {"A": "No sunlight", "B": "No food", "C": "Cannot breathe air", "D": "Water is cold"},
+        "correct_answer": "C"
+    },
+    {
+        "category": "Science",
+        "difficulty": QuestionDifficulty.EASY,
+        "question_text": "Which organ helps in pumping blood in the human body?",
+        "options": {"A": "Brain", "B": "Lungs", "C": "Heart", "D": "Kidney"},
+        "correct_answer": "C"
+    },
+    {
+        "category": "Science",
+        "difficulty": QuestionDifficulty.EASY,
+        "question_text": "Which of the following is a renewable resource?",
+        "options": {"A": "Coal", "B": "Petroleum", "C": "Natural gas", "D": "Wind"},
+        "correct_answer": "D"
+    },
+    {
+        "category": "Science",
+        "difficulty": QuestionDifficulty.MEDIUM,
+        "question_text": "Which type of soil holds the most water?",
+        "options": {"A": "Sandy soil", "B": "Clayey soil", "C": "Loamy soil", "D": "Rocky soil"},
+        "correct_answer": "B"
+    }
+]
+
+
+def content_hash(question_text: str, difficulty) -> str:
+    """Stable identity of a question, independent of which table holds it."""
+    difficulty = getattr(difficulty, 'value', difficulty)
+    normalized = " ".join(question_text.split()).lower()
+    return hashlib.sha1(f"{difficulty}|{normalized}".encode("utf-8")).hexdigest()
+
+
+def default_points(difficulty) -> int:
+    difficulty = getattr(difficulty, 'value', difficulty)
+    return {
+        QuestionDifficulty.EASY.value: 1,
+        QuestionDifficulty.MEDIUM.value: 2,
+        QuestionDifficulty.HARD.value: 3
+    }.get(difficulty, 1)
+
+
+# In-memory index
+
+class QuestionBankIndex:
+    """Immutable snapshot of active bank questions bucketed by (concept, difficulty)."""
+
+    def __init__(self, questions: Iterable[Dict[str, Any]], version):
+        self.version = version
+        self.buckets: Dict[tuple, List[Dict[str, Any]]] = {}
+        self.size = 0
+        for q in questions:
+            self.buckets.setdefault((q['concept_id'], q['difficulty']), []).append(q)
+            self.size += 1
+
+    def bucket(self, concept_id: Optional[str], difficulty: QuestionDifficulty) -> List[Dict[str, Any]]:
+        return self.buckets.get((concept_id, getattr(difficulty, 'value', difficulty)), [])
+
+
+_lock = threading.Lock()
+_index: Optional[QuestionBankIndex] = None
+_local_version = 0
+_checked_at = 0.0
+
+
+def get_question_bank(db: Session) -> QuestionBankIndex:
+    """Return the shared bank index, reloading it when the table changes."""
+    global _index, _checked_at
+    index = _index
+    now = time.monotonic()
+    if index is not None and index.version[0] == _local_version \
+            and now - _checked_at < settings.QUESTION_BANK_REFRESH_SECONDS:
+        return index
+
+    with _lock:
+        count, latest = db.query(
+            func.count(BankQuestion.id), func.max(BankQuestion.created_at)
+        ).filter(BankQuestion.is_active == True).one()
+        version = (_local_version, count, str(latest))
+        if _index is None or _index.version != version:
+            if count:
+                rows = db.query(BankQuestion).filter(BankQuestion.is_active == True).all()
+                questions = [_row_to_question(row) for row in rows]
+            else:
+                questions = [_default_to_question(q) for q in DEFAULT_QUESTIONS]
+            _index = QuestionBankIndex(questions, version)
+        _checked_at = now
+        return _index
+
+
+def invalidate_question_bank() -> None:
+    """Force a reload on next access."""
+    global _local_version
+    _local_version += 1
+
+
+def _row_to_question(row: BankQuestion) -> Dict[str, Any]:
+    return {
+        'concept_id': str(row.concept_id) if row.concept_id else None,
+        'difficulty': row.difficulty.value,
+        'question_text': row.question_text,
+        'question_type': row.question_type or QuestionType.MCQ,
+        'correct_answer': row.correct_answer,
+        'options': row.options,
+        'points': row.points or default_points(row.difficulty),
+        'content_hash': row.content_hash
+    }
+
+
+def _default_to_question(q: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'concept_id': None,
+        'difficulty': q['difficulty'].value,
+        'question_text': q['question_text'],
+        'question_type': QuestionType.MCQ,
+        'correct_answer': q['correct_answer'],
+        'options': q['options'],
+        'points': default_points(q['difficulty']),
+        'content_hash': content_hash(q['question_text'], q['difficulty'])
+    }
+
+
+# Selection
+
+def select_questions(
+    db: Session,
+    concept_id: str,
+    difficulty: QuestionDifficulty,
+    count: int,
+    student_id: str,
+    exclude: Optional[Set[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Pick up to `count` questions the student has not seen recently.
+
+    Looks in the concept's own bucket first, then in the concept-agnostic
+    bucket for the same difficulty. Seen questions are only used once the
+    unseen ones run out. Does not mark anything as seen; call mark_seen
+    once the assignment is built.
+
+    Args:
+        db: Database session
+        concept_id: Concept UUID the questions are for
+        difficulty: Requested difficulty
+        count: Number of questions wanted
+        student_id: Student UUID
+        exclude: Content hashes already chosen for this assignment
+
+    Returns:
+        Question dicts in AssignmentQuestion shape (may be fewer than count)
+    """
+    if count <= 0:
+        return []
+
+    index = get_question_bank(db)
+    exclude = exclude if exclude is not None else set()
+
+    # O(k): draw a bounded number of random candidates per bucket
+    candidates = []
+    for bucket in (index.bucket(str(concept_id), difficulty), index.bucket(None, difficulty)):
+        if len(candidates) >= count * 3:
+            break
+        draw = min(len(bucket), count * 3 - len(candidates))
+        candidates.extend(q for q in random.sample(bucket, draw) if q['content_hash'] not in exclude)
+
+    seen = recently_seen(student_id, [q['content_hash'] for q in candidates])
+    ordered = [q for q in candidates if q['content_hash'] not in seen] + \
+              [q for q in candidates if q['content_hash'] in seen]
+
+    results = []
+    for q in ordered:
+        if len(results) >= count:
+            break
+        if q['content_hash'] in exclude:
+            continue
+        exclude.add(q['content_hash'])
+        results.append({
+            'concept_id': concept_id,
+            'question_text': q['question_text'],
+            'question_type': q['question_type'],
+            'difficulty': QuestionDifficulty(q['difficulty']),
+            'correct_answer': q['correct_answer'],
+            'options': q['options'],
+            'points': q['points'],
+            'content_hash': q['content_hash']
+        })
+    return results
+
+
+# Recently-seen Bloom filter
+
+# Used when Redis is unreachable: (student_id, week) -> bytearray
+_local_filters: Dict[tuple, bytearray] = {}
+
+
+def recently_seen(student_id: str, hashes: List[str]) -> Set[str]:
+    """Subset of `hashes` the student has (probably) seen in the repeat window."""
+    if not hashes:
+        return set()
+
+    weeks = _window_weeks()
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for h in hashes:
+            for position in _bit_positions(h):
+                for week in weeks:
+                    pipe.getbit(_filter_key(student_id, week), position)
+        bits = pipe.execute()
+    except Exception as e:
+        print(f"Question bank filter error: {e}")
+        return {h for h in hashes if _local_contains(student_id, weeks, h)}
+
+    # Seen = all BLOOM_HASHES bits set in at least one week's filter
+    seen, i, per_hash = set(), 0, BLOOM_HASHES * len(weeks)
+    for h in hashes:
+        chunk = bits[i:i + per_hash]
+        i += per_hash
+        for w in range(len(weeks)):
+            if all(chunk[p * len(weeks) + w] for p in range(BLOOM_HASHES)):
+                seen.add(h)
+                break
+    return seen
+
+
+def mark_seen(student_id: str, hashes: Iterable[str]) -> None:
+    """Record questions as seen this week."""
+    hashes = list(hashes)
+    if not hashes:
+        return
+
+    week = _window_weeks()[0]
+    key = _filter_key(student_id, week)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for h in hashes:
+            for position in _bit_positions(h):
+                pipe.setbit(key, position, 1)
+        pipe.expire(key, _filter_ttl())
+        pipe.execute()
+    except Exception as e:
+        print(f"Question bank filter error: {e}")
+        bloom = _local_filters.setdefault((str(student_id), week), bytearray(BLOOM_BITS // 8))
+        for h in hashes:
+            for position in _bit_positions(h):
+                bloom[position // 8] |= 1 << (position % 8)
+
+
+def ensure_seen_filters(db: Session, student_ids: List[str]) -> None:
+    """
+    Seed missing filters from response history, one query for all students.
+
+    Called before selection; students whose filter is already seeded cost
+    a single Redis round trip in total.
+    """
+    student_ids = [str(s) for s in student_ids]
+    if not student_ids:
+        return
+
+    try:
+        flags = redis_client.mget([_seeded_key(s) for s in student_ids])
+    except Exception as e:
+        print(f"Question bank filter error: {e}")
+        return
+    missing = [s for s, flag in zip(student_ids, flags) if not flag]
+    if not missing:
+        return
+
+    cutoff = datetime.utcnow() - timedelta(weeks=settings.QUESTION_REPEAT_WINDOW_WEEKS)
+    history = db.query(
+        StudentAssignment.student_id, AssignmentQuestion.question_text, AssignmentQuestion.difficulty
+    ).join(
+        StudentResponse, StudentResponse.student_assignment_id == StudentAssignment.id
+    ).join(
+        AssignmentQuestion, StudentResponse.question_id == AssignmentQuestion.id
+    ).filter(
+        StudentAssignment.student_id.in_([_as_uuid(s) for s in missing]),
+        StudentResponse.answered_at >= cutoff
+    ).all()
+
+    by_student: Dict[str, Set[str]] = {s: set() for s in missing}
+    for student_id, question_text, difficulty in history:
+        by_student[str(student_id)].add(content_hash(question_text, difficulty))
+
+    for student_id, hashes in by_student.items():
+        mark_seen(student_id, hashes)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for student_id in missing:
+            pipe.set(_seeded_key(student_id), 1, ex=_filter_ttl())
+        pipe.execute()
+    except Exception as e:
+        print(f"Question bank filter error: {e}")
+
+
+def _bit_positions(h: str) -> List[int]:
+    # content hashes are SHA-1 hex; slice independent 32-bit chunks
+    return [int(h[i * 8:(i + 1) * 8], 16) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+
+def _window_weeks() -> List[str]:
+    """Current ISO week first, then the previous ones in the repeat window."""
+    today = datetime.utcnow().date()
+    weeks = []
+    for i in range(settings.QUESTION_REPEAT_WINDOW_WEEKS):
+        year, week, _ = (today - timedelta(weeks=i)).isocalendar()
+        weeks.append(f"{year}{week:02d}")
+    return weeks
+
+
+def _filter_key(student_id: str, week: str) -> str:
+    return f"qbank:seen:{student_id}:{week}"
+
+
+def _seeded_key(student_id: str) -> str:
+    return f"qbank:seeded:{student_id}"
+
+
+def _filter_ttl() -> int:
+    return (settings.QUESTION_REPEAT_WINDOW_WEEKS * 7 + 1) * 86400
+
+
+def _local_contains(student_id: str, weeks: List[str], h: str) -> bool:
+    positions = _bit_positions(h)
+    for week in weeks:
+        bloom = _local_filters.get((str(student_id), week))
+        if bloom and all(bloom[p // 8] & (1 << (p % 8)) for p in positions):
+            return True
+    return False
+
+
+def _as_uuid(value):
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+# Bulk import
+
+def import_questions(db: Session, questions: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Bulk-load questions into the bank.
+
+    Each item needs question_text and difficulty; concept_id, category,
+    question_type, options, correct_answer and points are optional.
+    Questions whose content hash already exists are skipped, so the same
+    file can be imported twice. Rows are inserted in batches of
+    IMPORT_BATCH_SIZE.
+
+    Returns:
+        {'inserted': int, 'skipped': int}
+    """
+    inserted = skipped = 0
+    batch: List[Dict[str, Any]] = []
+
+    for item in questions:
+        batch.append(item)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            added, dupes = _import_batch(db, batch)
+            inserted, skipped = inserted + added, skipped + dupes
+            batch = []
+    if batch:
+        added, dupes = _import_batch(db, batch)
+        inserted, skipped = inserted + added, skipped + dupes
+
+    db.commit()
+    invalidate_question_bank()
+    return {'inserted': inserted, 'skipped': skipped}
+
+
+def _import_batch(db: Session, batch: List[Dict[str, Any]]) -> tuple:
+    rows = {}
+    for item in batch:
+        difficulty = QuestionDifficulty(getattr(item['difficulty'], 'value', item['difficulty']))
+        h = content_hash(item['question_text'], difficulty)
+        if h in rows:
+            continue
+        rows[h] = {
+            'id': uuid.uuid4(),
+            'concept_id': _as_uuid(item['concept_id']) if item.get('concept_id') else None,
+            'category': item.get('category'),
+            'question_text': item['question_text'],
+            'question_type': QuestionType(item.get('question_type') or QuestionType.MCQ.value),
+            'difficulty': difficulty,
+            'correct_answer': item.get('correct_answer'),
+            'options': item.get('options'),
+            'points': item.get('points') or default_points(difficulty),
+            'content_hash': h,
+            'is_active': True,
+            'created_at': datetime.utcnow()
+        }
+
+    existing = {
+        r[0] for r in db.query(BankQuestion.content_hash).filter(
+            BankQuestion.content_hash.in_(list(rows.keys()))
+        ).all()
+    }
+    new_rows = [row for h, row in rows.items() if h not in existing]
+    if new_rows:
+        db.bulk_insert_mappings(BankQuestion, new_rows)
+        db.flush()
+    return len(new_rows), len(batch) - len(new_rows)
@@ -0,0 +1,362 @@
+"""
+Question Pool - AI/ML Component
+Pre-generated AI questions per (topic, difficulty), ready to hand out.
+
+Generating a quiz live costs a multi-second model call. Instead, a
+background warmer scans the pending SyllabusTopic rows of every class every
+QUESTION_POOL_SCAN_SECONDS and keeps QUESTION_POOL_LOW_WATER or more
+validated questions available per topic and difficulty in the
+question_pool table, refilling QUESTION_POOL_REFILL_SIZE at a time with a
+single model call.
+
+/quiz/generate-ai and the adaptive generator draw from the pool first
+(each question is drawn once) and only call the model live on a miss. A
+draw that leaves the pool low, or misses, schedules a refill for that
+topic, so teacher-typed topics get a pool too.
+
+Pool questions remember the backend that wrote them, so questions from
+the offline stub are never served once a real model is configured. The
+pool stays off when AI_BACKEND=auto falls back to the stub for lack of a
+GEMINI_API_KEY; only an explicit AI_BACKEND=stub pools stub questions.
+"""
+
+import asyncio
+import logging
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.assignment import PoolQuestion, QuestionDifficulty
+from app.models.syllabus import SyllabusTopic, TopicStatus
+from app.ai.question_bank import content_hash
+from app.utils.cache import redis_client
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MAX_QUESTION_LENGTH = 2000
+
+_lock = threading.Lock()
+_pending: Set[Tuple[str, str]] = set()  # (topic_key, difficulty) refills queued or running
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_warmer: Optional[asyncio.Task] = None
+_refill_slots: Optional[asyncio.Semaphore] = None
+_metrics = {"hits": 0, "misses": 0, "drawn": 0, "refills": 0, "generated": 0, "rejected": 0, "failed_refills": 0}
+
+
+def topic_key(title: str) -> str:
+    """Normalized topic title used to match pools across classes."""
+    return " ".join(title.split()).lower()[:255]
+
+
+def parse_difficulty(value) -> Optional[QuestionDifficulty]:
+    """QuestionDifficulty from an enum or a string such as "Medium"; None if unknown."""
+    try:
+        return QuestionDifficulty(str(getattr(value, 'value', value)).lower())
+    except ValueError:
+        return None
+
+
+def validate_question(item: Any) -> Optional[Dict[str, Any]]:
+    """
+    Normalize one generated multiple-choice question, or None if unusable.
+
+    A usable question has text, at least two non-empty options and a
+    correct_answer that is one of the option keys.
+    """
+    if not isinstance(item, dict):
+        return None
+    text = item.get('question_text')
+    options = item.get('options')
+    answer = item.get('correct_answer')
+    if not isinstance(text, str) or not text.strip() or len(text) > MAX_QUESTION_LENGTH:
+        return None
+    if not isinstance(options, dict) or len(options) < 2:
+        return None
+    options = {str(k).strip(): str(v).strip() for k, v in options.items()}
+    if not all(options.values()):
+        return None
+    answer = str(answer).strip() if answer is not None else ""
+    if answer not in options:
+        return None
+    return {'question_text': text.strip(), 'options': options, 'correct_answer': answer}
+
+
+# Drawing
+
+def draw_questions(
+    db: Session,
+    topic: str,
+    difficulty: QuestionDifficulty,
+    count: int,
+    partial: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Take up to `count` questions for a topic out of the pool.
+
+    Drawn rows are marked in the caller's session (flushed, not committed);
+    the caller commits along with the rest of its work. Schedules a refill
+    when the pool is left below QUESTION_POOL_LOW_WATER.
+
+    Args:
+        db: Database session
+        topic: Topic title, matched case- and whitespace-insensitively
+        difficulty: Requested difficulty
+        count: Number of questions wanted
+        partial: Return fewer than `count` rather than nothing
+
+    Returns:
+        Question dicts with question_text, options and correct_answer
+        (empty on a miss)
+    """
+    if count <= 0 or not _enabled():
+        return []
+
+    key = topic_key(topic)
+    available = db.query(PoolQuestion).filter(
+        PoolQuestion.topic_key == key,
+        PoolQuestion.difficulty == difficulty,
+        PoolQuestion.source == _backend_name(),
+        PoolQuestion.drawn_at.is_(None)
+    ).order_by(PoolQuestion.created_at)
+
+    rows = available.limit(count).with_for_update(skip_locked=True).all()
+    if not rows or (len(rows) < count and not partial):
+        _count("misses")
+        request_refill(topic, difficulty)
+        return []
+
+    now = datetime.utcnow()
+    for row in rows:
+        row.drawn_at = now
+    db.flush()
+    _count("hits")
+    _count("drawn", len(rows))
+
+    if available.count() < settings.QUESTION_POOL_LOW_WATER:
+        request_refill(topic, difficulty)
+
+    return [
+        {'question_text': row.question_text, 'options': row.options, 'correct_answer': row.correct_answer}
+        for row in rows
+    ]
+
+
+def pool_levels(db: Session) -> Dict[Tuple[str, str], int]:
+    """Undrawn questions per (topic_key, difficulty) for the current backend."""
+    rows = db.query(
+        PoolQuestion.topic_key, PoolQuestion.difficulty, func.count(PoolQuestion.id)
+    ).filter(
+        PoolQuestion.source == _backend_name(),
+        PoolQuestion.drawn_at.is_(None)
+    ).group_by(PoolQuestion.topic_key, PoolQuestion.difficulty).all()
+    return {(key, difficulty.value): count for key, difficulty, count in rows}
+
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """Hit/miss and refill counters of this worker's pool."""
+    with _lock:
+        metrics = dict(_metrics)
+        metrics["pending_refills"] = len(_pending)
+    draws = metrics["hits"] + metrics["misses"]
+    metrics["hit_ratio"] = round(metrics["hits"] / draws, 4) if draws else 0.0
+    return metrics
+
+
+# Refilling
+
+def request_refill(topic: str, difficulty: QuestionDifficulty) -> bool:
+    """
+    Schedule a background refill of one pool; safe to call from any thread.
+
+    Returns False when the warmer is not running or a refill of the same
+    pool is already queued in this worker.
+    """
+    key = (topic_key(topic), difficulty.value)
+    with _lock:
+        loop = _loop
+        if loop is None or key in _pending:
+            return False
+        _pending.add(key)
+    asyncio.run_coroutine_threadsafe(_run_refill(topic, difficulty, key), loop)
+    return True
+
+
+async def refill(topic: str, difficulty: QuestionDifficulty, count: Optional[int] = None) -> int:
+    """
+    Generate `count` questions for a topic in one model call and add the
+    valid, not-yet-pooled ones. Returns the number added.
+    """
+    from app.services.ai_service import ai_service
+
+    count = count or settings.QUESTION_POOL_REFILL_SIZE
+    generated = await ai_service.generate_quiz_questions(
+        topic, count, difficulty.value.capitalize(), regenerate=True
+    )
+    if not isinstance(generated, list):
+        generated = []
+    valid = [q for q in (validate_question(item) for item in generated) if q]
+    _count("refills")
+    _count("rejected", len(generated) - len(valid))
+    added = await asyncio.to_thread(_store, topic, difficulty, valid)
+    _count("generated", added)
+    return added
+
+
+async def _run_refill(topic: str, difficulty: QuestionDifficulty, key: Tuple[str, str]) -> None:
+    try:
+        async with _refill_slots:
+            # Other workers watch the same topics; one refill per pool at a time
+            if not await asyncio.to_thread(_claim, key):
+                return
+            try:
+                added = await refill(topic, difficulty)
+            finally:
+                await asyncio.to_thread(_release, key)
+            logger.info(f"Question pool refilled {added} {difficulty.value} questions for '{topic}'")
+    except Exception as e:
+        _count("failed_refills")
+        logger.warning(f"Question pool refill failed for '{topic}' ({difficulty.value}): {e}")
+    finally:
+        with _lock:
+            _pending.discard(key)
+
+
+def _store(topic: str, difficulty: QuestionDifficulty, questions: List[Dict[str, Any]]) -> int:
+    key = topic_key(topic)
+    source = _backend_name()
+    rows = {}
+    for q in questions:
+        rows.setdefault(content_hash(q['question_text'], difficulty), q)
+    if not rows:
+        return 0
+
+    db = SessionLocal()
+    try:
+        # Skip questions this topic has already had, drawn or not
+        existing = {
+            r[0] for r in db.query(PoolQuestion.content_hash).filter(
+                PoolQuestion.topic_key == key,
+                PoolQuestion.content_hash.in_(list(rows.keys()))
+            ).all()
+        }
+        new_rows = [
+            {
+                'id': uuid.uuid4(),
+                'topic_key': key,
+                'topic_title': topic[:255],
+                'difficulty': difficulty,
+                'question_text': q['question_text'],
+                'options': q['options'],
+                'correct_answer': q['correct_answer'],
+                'content_hash': h,
+                'source': source,
+                'created_at': datetime.utcnow()
+            }
+            for h, q in rows.items() if h not in existing
+        ]
+        if new_rows:
+            db.bulk_insert_mappings(PoolQuestion, new_rows)
+            db.commit()
+        return len(new_rows)
+    finally:
+        db.close()
+
+
+def _claim_key(key: Tuple[str, str]) -> str:
+    return f"qpool:refill:{key[1]}:{key[0]}"
+
+
+def _claim(key: Tuple[str, str]) -> bool:
+    try:
+        # Expires on its own if this worker dies mid-refill
+        return bool(redis_client.set(_claim_key(key), 1, nx=True, ex=settings.QUESTION_POOL_SCAN_SECONDS))
+    except Exception:
+        # No Redis: single worker, the local pending set is enough
+        return True
+
+
+def _release(key: Tuple[str, str]) -> None:
+    try:
+        redis_client.delete(_claim_key(key))
+    except Exception:
+        pass
+
+
+# Warmer
+
+def start_question_pool_warmer() -> None:
+    """Start the background warmer on the running event loop (app startup)."""
+    global _loop, _warmer, _refill_slots
+    if not _enabled() or _warmer is not None:
+        return
+    _loop = asyncio.get_running_loop()
+    _refill_slots = asyncio.Semaphore(settings.QUESTION_POOL_MAX_REFILLS)
+    _warmer = _loop.create_task(_warm_loop())
+
+
+async def stop_question_pool_warmer() -> None:
+    """Cancel the warmer (app shutdown)."""
+    global _loop, _warmer
+    if _warmer is not None:
+        _warmer.cancel()
+        try:
+            await _warmer
+        except asyncio.CancelledError:
+            pass
+    _warmer = None
+    with _lock:
+        _loop = None
+
+
+async def _warm_loop() -> None:
+    while True:
+        try:
+            for topic, difficulty in await asyncio.to_thread(_low_pools):
+                request_refill(topic, difficulty)
+        except Exception as e:
+            logger.warning(f"Question pool scan failed: {e}")
+        await asyncio.sleep(settings.QUESTION_POOL_SCAN_SECONDS)
+
+
+def _low_pools() -> List[Tuple[str, QuestionDifficulty]]:
+    """(topic title, difficulty) of every pending syllabus topic pool below the low-water mark."""
+    db = SessionLocal()
+    try:
+        titles = db.query(SyllabusTopic.title).filter(
+            SyllabusTopic.status == TopicStatus.PENDING
+        ).distinct().all()
+        levels = pool_levels(db)
+    finally:
+        db.close()
+
+    low, seen = [], set()
+    for (title,) in titles:
+        key = topic_key(title)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        for difficulty in QuestionDifficulty:
+            if levels.get((key, difficulty.value), 0) < settings.QUESTION_POOL_LOW_WATER:
+                low.append((title, difficulty))
+    return low
+
+
+def _enabled() -> bool:
+    """Pooling is on and the backend may generate quiz questions (not the auto-selected stub)."""
+    from app.services.ai_service import ai_service
+    return settings.QUESTION_POOL_ENABLED and ai_service.generates_quizzes
+
+
+def _backend_name() -> str:
+    from app.services.llm_gateway import llm_gateway
+    return llm_gateway.backend.name
+
+
+def _count(name: str, amount: int = 1) -> None:
+    with _lock:
+        _metrics[name] += amount
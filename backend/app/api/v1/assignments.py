@@ -10,6 +10,7 @@ from app.schemas.assignment import AssignmentCreate, AssignmentResponse, GradeSu
 from app.models.assignment import Assignment, AssignmentStatus, StudentAssignment
 from app.models.class_model import Enrollment
 from app.models.notification import Notification, NotificationType
+from app.ai import engagement_counters
 from datetime import datetime
 
 # ... imports ...
@@ -20,6 +21,7 @@ from pydantic import BaseModel
 
 class AIGenerateRequest(BaseModel):
     title: str
+    regenerate: bool = False  # Skip the cache and ask the model again
 
 @router.post("/ai-generate")
 async def generate_assignment_ai(
@@ -28,7 +30,7 @@ async def generate_assignment_ai(
 ):
     """Generate assignment description using AI."""
     from app.services.ai_service import ai_service
-    return {"content": await ai_service.generate_assignment_content(request.title)}
+    return {"content": await ai_service.generate_assignment_content(request.title, regenerate=request.regenerate)}
 
 @router.post("/", response_model=AssignmentResponse)
 def create_assignment(
@@ -54,6 +56,7 @@ def create_assignment(
     
     enrollments = db.query(Enrollment).filter(Enrollment.class_id == assignment_data.class_id).all()
     
+    student_assignments = []
     for enrollment in enrollments:
         # Create StudentAssignment
         sa = StudentAssignment(
@@ -62,6 +65,7 @@ def create_assignment(
             status=AssignmentStatus.ASSIGNED
         )
         db.add(sa)
+        student_assignments.append(sa)
         
         # Create Notification
         notification = Notification(
@@ -72,6 +76,11 @@ def create_assignment(
             reference_id=new_assignment.id
         )
         db.add(notification)
+    
+    db.flush()
+    engagement_counters.record_assignments_assigned(
+        db, new_assignment.class_id, [sa.student_id for sa in student_assignments]
+    )
         
     db.commit()
     
@@ -21,8 +21,9 @@ from app.schemas.user import (
     UserResponse
 )
 # from app.services.auth_service import AuthService
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, get_current_admin
 from app.models.user import User
+from app.utils.user_cache import get_user_cache_metrics
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -194,6 +195,14 @@ def get_current_user_info(
     return current_user
 
 
+@router.get("/cache/metrics")
+def get_auth_cache_metrics(
+    current_user: User = Depends(get_current_admin)
+):
+    """Hit/miss counters of this worker's authenticated-user cache."""
+    return get_user_cache_metrics()
+
+
 from fastapi import UploadFile, File, Form
 from typing import Optional
 import shutil
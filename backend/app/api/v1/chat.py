@@ -1,11 +1,21 @@
+import asyncio
+import json
+import logging
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-from app.services.ai_service import ai_service
-from app.dependencies import get_current_user
+from uuid import UUID
+from app.services.ai_service import ai_service, TUTOR_FALLBACK_REPLY
+from app.services.conversation_service import ConversationService
+from app.services.llm_gateway import get_llm_metrics
+from app.utils.ai_cache import get_ai_cache_metrics
+from app.ai.question_pool import get_pool_metrics
+from app.dependencies import get_current_user, get_current_admin
 from app.models.user import User
 
 router = APIRouter(tags=["Chat"])
+logger = logging.getLogger(__name__)
 
 class ChatMessage(BaseModel):
     role: str
@@ -14,13 +24,73 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     history: List[ChatMessage] = []
+    # Server-side conversation (POST /chat/conversations); history is then ignored
+    conversation_id: Optional[UUID] = None
 
 from app.database import get_db
 from sqlalchemy.orm import Session
-from app.models.assignment import StudentAssignment, AssignmentStatus, StudentMastery
+from app.services.tutor_context import get_tutor_context, get_tutor_context_metrics
 
 # ... existing code ...
 
+@router.post("/chat/conversations")
+def start_conversation(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Start a tutor conversation kept on the server.
+
+    Pass the returned conversation_id with each message instead of the history.
+    """
+    conversation = ConversationService.create(db, current_user.id)
+    return {"conversation_id": conversation.id}
+
+
+@router.get("/chat/conversations/{conversation_id}/messages")
+def get_conversation_messages(
+    conversation_id: UUID,
+    after_seq: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Messages of one of the student's conversations, in order, after `after_seq`."""
+    conversation = ConversationService.get_for_student(db, conversation_id, current_user.id)
+    messages = ConversationService.messages(db, conversation, after_seq, min(max(limit, 1), 500))
+    return {
+        "conversation_id": conversation.id,
+        "messages": [
+            {"seq": m.seq, "role": m.role, "text": m.text, "created_at": m.created_at}
+            for m in messages
+        ]
+    }
+
+
+def _load_context(db: Session, current_user: User) -> Dict:
+    """Tutor context for the prompt; a context without topics if it cannot be fetched."""
+    try:
+        return get_tutor_context(db, current_user)
+    except Exception as e:
+        logger.warning(f"Chat context unavailable, continuing without it: {e}")
+        db.rollback()
+        return {"first_name": current_user.first_name, "pending_assignments": [], "recent_low_mastery_topics": []}
+
+
+def _start_turn(db: Session, current_user: User, request: ChatRequest):
+    """History, summary and conversation for a turn; records the student's message."""
+    if request.conversation_id is None:
+        history = [{"role": msg.role, "text": msg.text} for msg in request.history]
+        return history, None, None
+
+    conversation = ConversationService.get_for_student(db, request.conversation_id, current_user.id)
+    history = ConversationService.window(db, conversation)
+    summary = conversation.summary
+    ConversationService.append(db, conversation.id, "user", request.message)
+    db.commit()
+    return history, summary, conversation.id
+
+
 @router.post("/chat/tutor")
 async def chat_tutor(
     request: ChatRequest, 
@@ -31,41 +101,107 @@ async def chat_tutor(
     Chat with the AI tutor.
     """
     try:
-        # Fetch Context
-        context = {
-            "first_name": current_user.first_name,
-            "pending_assignments": [],
-            "recent_low_mastery_topics": []
-        }
-        
-        # 1. Get Pending Assignments
+        # Cache and database reads; keep them off the event loop
+        context = await asyncio.to_thread(_load_context, db, current_user)
+        history_dicts, summary, conversation_id = _start_turn(db, current_user, request)
+
+        if conversation_id is None:
+            response = await ai_service.chat_with_tutor(request.message, history_dicts, context)
+            return {"response": response}
+
         try:
-            pending = db.query(StudentAssignment).filter(
-                StudentAssignment.student_id == current_user.id,
-                StudentAssignment.status != AssignmentStatus.COMPLETED,
-                StudentAssignment.status != AssignmentStatus.GRADED
-            ).join(StudentAssignment.assignment).limit(3).all()
-            
-            context["pending_assignments"] = [sa.assignment.title for sa in pending if sa.assignment]
-            
-            # 2. Get Weak Areas (Mastery < 50)
-            weak_masteries = db.query(StudentMastery).filter(
-                StudentMastery.student_id == current_user.id,
-                StudentMastery.mastery_level < 50.0
-            ).limit(3).all()
-            
-            # Note: In real app, we'd join with Concept/Topic table to get names. 
-            # For now assuming we can get a name or ID.
-            # context["recent_low_mastery_topics"] = [m.topic_id for m in weak_masteries] 
-        except Exception as db_e:
-            print(f"Chat Context Warning: Failed to fetch context from DB: {db_e}")
-            # Continue without context 
-
-        # Convert Pydantic models to dicts for the service
-        history_dicts = [{"role": msg.role, "text": msg.text} for msg in request.history]
-        
-        response = await ai_service.chat_with_tutor(request.message, history_dicts, context)
-        return {"response": response}
+            response = await ai_service.tutor_reply(request.message, history_dicts, context, summary)
+        except Exception as e:
+            # The student's message stays in the log; the fallback does not
+            logger.error(f"AI Chat Failed: {e}")
+            return {"response": TUTOR_FALLBACK_REPLY, "conversation_id": conversation_id}
+
+        ConversationService.append(db, conversation_id, "bot", response)
+        db.commit()
+        ConversationService.summarize_if_needed(
+            conversation_id, ConversationService.unsummarized_tokens(db, conversation_id)
+        )
+        return {"response": response, "conversation_id": conversation_id}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Chat Error: {e}") # Debug log
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/chat/tutor/stream")
+async def chat_tutor_stream(
+    request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Chat with the AI tutor over Server-Sent Events.
+
+    Emits a "delta" event per chunk of the reply as the model produces it,
+    then "done" with the full text, or "error" if generation fails.
+    """
+    context = await asyncio.to_thread(_load_context, db, current_user)
+    history_dicts, summary, conversation_id = _start_turn(db, current_user, request)
+
+    async def events():
+        parts = []
+        try:
+            async for chunk in ai_service.stream_tutor_reply(request.message, history_dicts, context, summary):
+                parts.append(chunk)
+                yield _sse("delta", {"text": chunk})
+        except Exception as e:
+            logger.error(f"AI Chat Stream Failed: {e}")
+            yield _sse("error", {"detail": TUTOR_FALLBACK_REPLY})
+            return
+
+        response = "".join(parts).strip()
+        done = {"response": response}
+        if conversation_id is not None:
+            # The request's session may already be closed while streaming
+            unsummarized = await asyncio.to_thread(ConversationService.store_reply, conversation_id, response)
+            ConversationService.summarize_if_needed(conversation_id, unsummarized)
+            done["conversation_id"] = str(conversation_id)
+        yield _sse("done", done)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/ai/metrics")
+def get_ai_metrics(
+    current_user: User = Depends(get_current_admin)
+):
+    """Per-backend concurrency, latency, token and breaker figures of this worker's LLM gateway."""
+    return get_llm_metrics()
+
+
+@router.get("/ai/cache/metrics")
+def get_ai_cache_metrics_route(
+    current_user: User = Depends(get_current_admin)
+):
+    """Hit/miss counters of this worker's cache of generated quizzes and lesson plans."""
+    return get_ai_cache_metrics()
+
+
+@router.get("/ai/pool/metrics")
+def get_ai_pool_metrics(
+    current_user: User = Depends(get_current_admin)
+):
+    """Hit/miss and refill counters of this worker's pre-generated question pool."""
+    return get_pool_metrics()
+
+
+@router.get("/chat/tutor/context/metrics")
+def get_tutor_context_cache_metrics(
+    current_user: User = Depends(get_current_admin)
+):
+    """Hit/miss counters of this worker's tutor context cache."""
+    return get_tutor_context_metrics()
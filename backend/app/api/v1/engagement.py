@@ -4,9 +4,10 @@ Engagement tracking API endpoints.
 
 from fastapi import APIRouter, Depends, status, UploadFile, File
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from uuid import UUID
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.dependencies import get_current_user, require_role
 from app.models.user import User, UserRole
 from app.schemas.engagement import (
@@ -19,13 +20,13 @@ from app.services.engagement_service import EngagementService
 router = APIRouter(prefix="/engagement", tags=["Engagement Tracking"])
 
 @router.post("/events", response_model=EngagementEventResponse, status_code=status.HTTP_201_CREATED)
-def log_engagement_event(
+async def log_engagement_event(
     event_data: EngagementEventCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Log an engagement event (participation, help request, etc)."""
-    return EngagementService.log_event(db, event_data)
+    return await EngagementService.log_event_async(db, event_data)
 
 @router.get("/class/{class_id}", response_model=List[EngagementIndexResponse])
 def get_class_engagement_indices(
@@ -36,6 +37,16 @@ def get_class_engagement_indices(
     """Get engagement indices for all students in a class."""
     return EngagementService.get_class_engagement(db, class_id)
 
+@router.post("/class/{class_id}/recompute")
+def recompute_class_engagement_indices(
+    class_id: UUID,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role([UserRole.TEACHER, UserRole.ADMIN]))
+):
+    """Recalculate and store engagement indices for every student in a class."""
+    updated = EngagementService.update_class_indices(db, class_id)
+    return {"class_id": class_id, "updated": updated}
+
 @router.post("/attendance", response_model=AttendanceRecordResponse, status_code=status.HTTP_201_CREATED)
 def record_attendance(
     attendance_data: AttendanceRecordCreate,
@@ -46,15 +57,13 @@ def record_attendance(
     return EngagementService.record_attendance(db, attendance_data)
 
 @router.get("/student/{student_id}", response_model=List[EngagementIndexResponse])
-def get_student_engagement(
+async def get_student_engagement(
     student_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get student engagement index across their classes."""
-    # Logic to filter by student
-    from app.models.engagement import EngagementIndex
-    return db.query(EngagementIndex).filter(EngagementIndex.student_id == student_id).all()
+    return await EngagementService.get_student_indices_async(db, student_id)
 
 @router.get("/attendance-trend/{class_id}")
 def get_attendance_trend(
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends
+from app.dependencies import get_current_admin
+from app.models.user import User
+from app.jobs import get_queue_metrics
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+@router.get("/metrics")
+def get_job_metrics(
+    current_user: User = Depends(get_current_admin)
+):
+    """Per-queue depth, throughput and latency of background jobs."""
+    return get_queue_metrics()
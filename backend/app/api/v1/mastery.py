@@ -4,14 +4,17 @@ Mastery and Adaptive Assignment API endpoints.
 
 from fastapi import APIRouter, Depends, status, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from uuid import UUID
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.dependencies import get_current_user, require_role
 from app.models.user import User, UserRole
 from app.schemas.mastery import (
-    AssignmentResponse, SubmissionCreate, SubmissionResponse, ConceptMasteryResponse
+    AssignmentResponse, SubmissionCreate, SubmissionResponse, ConceptMasteryResponse,
+    BankQuestionImport, QuestionBankImportResult
 )
+from app.ai.question_bank import import_questions
 from app.services.mastery_service import MasteryService
 
 router = APIRouter(prefix="/mastery", tags=["Mastery & Adaptive Learning"])
@@ -37,13 +40,31 @@ def create_adaptive_assignment(
     """Generate a new adaptive practice assignment for the student."""
     return MasteryService.create_adaptive_assignment(db, current_user.id, class_id)
 
-@router.get("/assignments", response_model=List[AssignmentResponse])
-def get_my_assignments(
+@router.post("/assignments/adaptive/class/{class_id}", status_code=status.HTTP_201_CREATED)
+def create_adaptive_assignments_for_class(
+    class_id: UUID,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role([UserRole.TEACHER, UserRole.ADMIN]))
+):
+    """Generate a personalized practice assignment for every student in a class."""
+    return MasteryService.create_adaptive_assignments_for_class(db, class_id, current_user.id)
+
+@router.post("/question-bank/import", response_model=QuestionBankImportResult, status_code=status.HTTP_201_CREATED)
+def import_question_bank(
+    questions: List[BankQuestionImport],
     db: Session = Depends(get_db),
+    current_user: User = Depends(require_role([UserRole.TEACHER, UserRole.ADMIN]))
+):
+    """Bulk-add questions to the bank; duplicates of existing questions are skipped."""
+    return import_questions(db, (q.model_dump() for q in questions))
+
+@router.get("/assignments", response_model=List[AssignmentResponse])
+async def get_my_assignments(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """List all assignments for the current user."""
-    return MasteryService.get_student_assignments(db, current_user.id)
+    return await MasteryService.get_student_assignments_async(db, current_user.id)
 
 @router.post("/submissions", response_model=SubmissionResponse, status_code=status.HTTP_201_CREATED)
 def submit_assignment(
@@ -58,9 +79,9 @@ def submit_assignment(
     return submission
 
 @router.get("/profile", response_model=List[ConceptMasteryResponse])
-def get_mastery_profile(
-    db: Session = Depends(get_db),
+async def get_mastery_profile(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get the current student's concept mastery profile."""
-    return MasteryService.get_mastery_profile(db, current_user.id)
+    return await MasteryService.get_mastery_profile_async(db, current_user.id)
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from uuid import UUID
-from app.database import get_db
+from app.database import get_async_db
 from app.dependencies import get_current_user
 from app.models.user import User
 from app.models.notification import Notification
@@ -11,31 +12,37 @@ from app.schemas.notification import NotificationResponse
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
 @router.get("/", response_model=List[NotificationResponse])
-def get_my_notifications(
-    db: Session = Depends(get_db),
+async def get_my_notifications(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """List all notifications for the current user."""
-    return db.query(Notification).filter(
-        Notification.recipient_id == current_user.id
-    ).order_by(Notification.created_at.desc()).all()
+    result = await db.execute(
+        select(Notification).where(
+            Notification.recipient_id == current_user.id
+        ).order_by(Notification.created_at.desc())
+    )
+    return result.scalars().all()
 
 @router.put("/{notification_id}/read", response_model=NotificationResponse)
-def mark_notification_read(
+async def mark_notification_read(
     notification_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Mark a notification as read."""
-    notification = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.recipient_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(Notification).where(
+            Notification.id == notification_id,
+            Notification.recipient_id == current_user.id
+        )
+    )
+    notification = result.scalar_one_or_none()
     
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
         
     notification.is_read = True
-    db.commit()
-    db.refresh(notification)
+    await db.commit()
+    await db.refresh(notification)
     return notification
@@ -1,15 +1,20 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Depends
 from pydantic import BaseModel
 from typing import List, Optional
+from uuid import UUID, uuid4
+import asyncio
+import time
 from app.services.quiz_manager import quiz_manager
 from app.dependencies import get_current_user
 from app.models.user import User
+from app.utils.security import decode_token
 
 router = APIRouter(tags=["Quiz"])
 
 class CreateQuizRequest(BaseModel):
     title: str
-    questions: List[dict] # {question_text, options, correct_answer}
+    questions: List[dict] # {question_text, options, correct_answer, time_limit?}
+    class_id: Optional[UUID] = None # Needed to record participation in engagement
 
 class JoinQuizRequest(BaseModel):
     code: str
@@ -21,20 +26,18 @@ async def create_quiz(request: CreateQuizRequest, current_user: User = Depends(g
     if current_user.role != "teacher" and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only teachers can create quizzes")
         
-    quiz_id = quiz_manager.create_session(str(current_user.id), request.title)
-    
-    # Store questions in the session immediately for simplicity
-    # In a real app, you might fetch them from DB or pass them differently
-    session = quiz_manager.get_session(quiz_id)
-    if session:
-        session.questions = request.questions
+    # Questions are stored with the session so any worker can run it
+    quiz_id = await quiz_manager.create_session(
+        str(current_user.id), request.title, request.questions,
+        class_id=str(request.class_id) if request.class_id else None
+    )
 
     return {"quiz_id": quiz_id, "message": "Quiz created successfully"}
 
 @router.post("/quiz/check-code")
 async def check_code(request: JoinQuizRequest):
     """Verify if a game code is valid."""
-    session = quiz_manager.get_session(request.code)
+    session = await quiz_manager.get_session(request.code)
     if not session:
         raise HTTPException(status_code=404, detail="Invalid game code")
     if not session.is_active:
@@ -42,37 +45,63 @@ async def check_code(request: JoinQuizRequest):
     return {"valid": True, "title": session.title}
 
 @router.websocket("/ws/quiz/{quiz_id}")
-async def websocket_endpoint(websocket: WebSocket, quiz_id: str, student_name: Optional[str] = None, role: str = "student"):
+async def websocket_endpoint(
+    websocket: WebSocket, quiz_id: str, student_name: Optional[str] = None, role: str = "student",
+    token: Optional[str] = None, resume: Optional[str] = None
+):
     """
     WebSocket endpoint for real-time quiz interaction.
     Teacher connects with role='host'
-    Student connects with role='student' and student_name
+    Student connects with role='student' and student_name; an optional access
+    token links answers to the student's account for engagement tracking
+    Either reconnects with resume=<resume_token from session_joined> to get
+    their slot back
     """
-    session = quiz_manager.get_session(quiz_id)
+    session = await quiz_manager.attach(quiz_id)
     if not session:
         await websocket.close(code=4000)
         return
 
-    student_id = str(uuid4()) # Temporary ID for this session connection
+    claims = None
+    if resume:
+        claims = decode_token(resume)
+        if not claims or claims.get("type") != "quiz_resume" or claims.get("quiz_id") != quiz_id:
+            await quiz_manager.release(session)
+            await websocket.close(code=4002)
+            return
+        role = claims["role"]
+        student_name = claims.get("name")
+
+    student_id = (claims or {}).get("sid") or str(uuid4()) # Slot id for this session
+    connection = None
 
     try:
         if role == "host":
             # In a real app, verify token here to ensure it's the actual host
-            await session.connect_host(websocket)
+            if claims:
+                connection = await session.resume_host(websocket)
+            else:
+                connection = await session.connect_host(websocket)
         else:
             if not student_name:
                 await websocket.close(code=4001)
                 return
-            await session.connect_student(student_id, student_name, websocket)
+            if claims:
+                connection = await session.resume_student(student_id, student_name, websocket, claims.get("user_id"))
+            else:
+                payload = decode_token(token) if token else None
+                user_id = payload.get("sub") if payload and payload.get("type") == "access" else None
+                connection = await session.connect_student(student_id, student_name, websocket, user_id=user_id)
 
         # Listen for messages
         while True:
             data = await websocket.receive_json()
+            received_at = time.time()
             
             # Handle Host Commands
             if role == "host":
                 if data.get("action") == "start":
-                    await session.start_quiz(session.questions)
+                    await session.start_quiz()
                 elif data.get("action") == "next_question":
                     await session.next_question()
                 elif data.get("action") == "end_quiz":
@@ -82,27 +111,63 @@ async def websocket_endpoint(websocket: WebSocket, quiz_id: str, student_name: O
             elif role == "student":
                 if data.get("action") == "submit_answer":
                     answer = data.get("answer")
-                    await session.handle_answer(student_id, answer)
+                    await session.handle_answer(student_id, answer, received_at)
+                elif data.get("action") == "get_rank":
+                    await session.send_rank(student_id)
 
     except WebSocketDisconnect:
         if role == "student":
-            session.disconnect_student(student_id)
-            await session.broadcast_lobby_state()
+            await session.disconnect_student(student_id, connection)
+        else:
+            session.disconnect_host(connection)
+    finally:
+        await quiz_manager.release(session)
 from app.services.ai_service import ai_service
+from app.ai import question_pool
+from app.models.assignment import QuestionDifficulty
+from app.database import get_db
+from sqlalchemy.orm import Session
 
 class GenerateAIRequest(BaseModel):
     topic: str
     count: int = 5
     difficulty: str = "Medium"
+    regenerate: bool = False  # Skip the pool and cache and ask the model again
+
+def _draw_from_pool(db: Session, topic: str, difficulty: QuestionDifficulty, count: int) -> List[dict]:
+    """Draw pooled questions and commit the draw; empty on a miss."""
+    pooled = question_pool.draw_questions(db, topic, difficulty, count)
+    if pooled:
+        db.commit()
+    return pooled
+
 
 @router.post("/quiz/generate-ai")
-async def generate_ai_quiz(request: GenerateAIRequest, current_user: User = Depends(get_current_user)):
-    """Generate quiz questions using AI."""
+async def generate_ai_quiz(
+    request: GenerateAIRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Generate quiz questions using AI.
+
+    Served from the pre-generated question pool when it holds enough
+    questions for the topic and difficulty; otherwise generated live.
+    """
     if current_user.role != "teacher" and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only teachers can generate quizzes")
 
+    difficulty = question_pool.parse_difficulty(request.difficulty)
+    if difficulty and not request.regenerate:
+        # Row-locking draw and commit; keep them off the event loop
+        pooled = await asyncio.to_thread(_draw_from_pool, db, request.topic, difficulty, request.count)
+        if pooled:
+            return {"questions": pooled, "source": "pool"}
+
     try:
-        questions = await ai_service.generate_quiz_questions(request.topic, request.count, request.difficulty)
-        return {"questions": questions}
+        questions = await ai_service.generate_quiz_questions(
+            request.topic, request.count, request.difficulty, regenerate=request.regenerate
+        )
+        return {"questions": questions, "source": "live"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
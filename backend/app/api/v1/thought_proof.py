@@ -2,39 +2,112 @@
 Thought Proof API endpoints for keystroke recording and verification.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
-from pydantic import BaseModel
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
 from datetime import datetime
+import hashlib
 import uuid
 
 from app.database import get_db
-from app.dependencies import get_current_user
-from app.models.user import User
-from app.models.thought_proof import ThoughtProof
-from app.services.thought_proof_service import ThoughtProofService
+from app.dependencies import get_current_user, get_current_teacher
+from app.models.user import User, UserRole
+from app.models.thought_proof import ThoughtProof, IntegrityScanReport
+from app.models.assignment import Assignment, StudentAssignment
+from app.models.class_model import Class
+from app.jobs import enqueue
+from app.services.thought_proof_service import ThoughtProofService, REPLAY_WINDOW_MAX_EVENTS
 from app.config import get_settings
 
 router = APIRouter(prefix="/thought-proof", tags=["Thought Proof"])
 settings = get_settings()
 
 
+# Largest offset, length, line or column accepted in an event; far beyond any real document
+MAX_EDITOR_OFFSET = 10_000_000
+
+
 # Schemas
 class KeystrokeEventSchema(BaseModel):
     timestamp: str
     type: str  # 'insert', 'delete', 'paste', 'cursor_move'
     content: str | None = None
-    position: int | None = None
-    length: int | None = None
-    line: int | None = None
-    column: int | None = None
+    position: int | None = Field(None, ge=0, le=MAX_EDITOR_OFFSET)
+    length: int | None = Field(None, ge=0, le=MAX_EDITOR_OFFSET)
+    line: int | None = Field(None, ge=0, le=MAX_EDITOR_OFFSET)
+    column: int | None = Field(None, ge=0, le=MAX_EDITOR_OFFSET)
 
 
 class RecordBatchRequest(BaseModel):
     events: List[KeystrokeEventSchema]
 
 
+class IntegrityScanRequest(BaseModel):
+    class_id: Optional[uuid.UUID] = None
+    assignment_id: Optional[uuid.UUID] = None
+
+
+def _scan_summary(report: IntegrityScanReport, include_results: bool = False) -> Dict[str, Any]:
+    summary = {
+        "id": str(report.id),
+        "class_id": str(report.class_id) if report.class_id else None,
+        "assignment_id": str(report.assignment_id) if report.assignment_id else None,
+        "status": report.status.value,
+        "proofs_scanned": report.proofs_scanned,
+        "flagged_count": report.flagged_count,
+        "error": report.error,
+        "created_at": report.created_at,
+        "completed_at": report.completed_at
+    }
+    if include_results:
+        summary["results"] = report.results or []
+        summary["skipped"] = report.skipped or []
+    return summary
+
+
+# Finalized proofs never change, so replay responses can be cached for good
+REPLAY_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def _replay_etag(request: Request, replay_hash: str) -> str:
+    """Strong ETag for one replay URL (path and query) of a finalized proof."""
+    key = f"{replay_hash}:{request.url.path}?{request.url.query}"
+    return '"' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def _require_viewer(db: Session, thought_proof_id: uuid.UUID, current_user: User) -> None:
+    """
+    404 if the proof does not exist; 403 unless the user recorded it,
+    teaches the assignment or is an admin.
+    """
+    owners = db.query(StudentAssignment.student_id, Assignment.teacher_id).join(
+        ThoughtProof, ThoughtProof.student_assignment_id == StudentAssignment.id
+    ).join(
+        Assignment, Assignment.id == StudentAssignment.assignment_id
+    ).filter(ThoughtProof.id == thought_proof_id).first()
+    if not owners:
+        raise HTTPException(status_code=404, detail="Thought proof not found")
+    if current_user.id not in owners and current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="You can only view your own or your students' recordings")
+
+
+def _replay_precondition(request: Request, db: Session, thought_proof_id: uuid.UUID):
+    """
+    (ETag, 304 response or None) for a replay request; 404 if the proof
+    has no replay yet.
+    """
+    replay_hash = db.query(ThoughtProof.replay_hash).filter(ThoughtProof.id == thought_proof_id).scalar()
+    if not replay_hash:
+        raise HTTPException(status_code=404, detail="Replay data not available")
+    
+    etag = _replay_etag(request, replay_hash)
+    if etag in request.headers.get("if-none-match", ""):
+        return etag, Response(status_code=304, headers={"ETag": etag, "Cache-Control": REPLAY_CACHE_CONTROL})
+    return etag, None
+
+
 class ThoughtProofResponse(BaseModel):
     id: str
     student_assignment_id: str
@@ -51,6 +124,60 @@ class ThoughtProofResponse(BaseModel):
         from_attributes = True
 
 
+@router.post("/integrity-scans")
+def start_integrity_scan(
+    scan: IntegrityScanRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_teacher)
+):
+    """
+    Scan every finalized proof of a class or an assignment in the background.
+    
+    Poll GET /integrity-scans/{id} for the ranked report.
+    """
+    if (scan.class_id is None) == (scan.assignment_id is None):
+        raise HTTPException(status_code=400, detail="Give either class_id or assignment_id")
+    
+    if scan.assignment_id:
+        owner = db.query(Assignment.teacher_id).filter(Assignment.id == scan.assignment_id).scalar()
+    else:
+        owner = db.query(Class.teacher_id).filter(Class.id == scan.class_id).scalar()
+    if owner is None:
+        raise HTTPException(status_code=404, detail="Class or assignment not found")
+    if owner != current_user.id and current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not your class or assignment")
+    
+    report = IntegrityScanReport(
+        class_id=scan.class_id,
+        assignment_id=scan.assignment_id,
+        requested_by=current_user.id
+    )
+    db.add(report)
+    db.commit()
+    db.refresh(report)
+    
+    enqueue("thought_proof.integrity_scan", key=str(report.id), report_id=str(report.id))
+    db.refresh(report)
+    return _scan_summary(report)
+
+
+@router.get("/integrity-scans/{report_id}")
+def get_integrity_scan(
+    report_id: uuid.UUID,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_teacher)
+):
+    """
+    Get an integrity scan report: per-student features, flags and z-scores
+    against the group, highest risk first.
+    """
+    report = db.query(IntegrityScanReport).filter(IntegrityScanReport.id == report_id).first()
+    if not report or (report.requested_by != current_user.id and current_user.role != UserRole.ADMIN):
+        raise HTTPException(status_code=404, detail="Integrity scan not found")
+    
+    return _scan_summary(report, include_results=True)
+
+
 @router.post("/start/{student_assignment_id}", response_model=ThoughtProofResponse)
 def start_recording(
     student_assignment_id: uuid.UUID,
@@ -89,7 +216,10 @@ def record_keystroke_batch(
     Record a batch of keystroke events.
     """
     events_data = [event.model_dump() for event in batch.events]
-    count = ThoughtProofService.record_keystroke_batch(db, thought_proof_id, events_data)
+    try:
+        count = ThoughtProofService.record_keystroke_batch(db, thought_proof_id, events_data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
     return {"recorded": count, "message": f"Recorded {count} events"}
 
@@ -131,10 +261,9 @@ async def generate_narration(
     """
     Generate AI narration of the student's thought process.
     """
-    from app.ai.gemini_service import GeminiService
+    from app.services.ai_service import ai_service
     
-    gemini = GeminiService()
-    narration = await ThoughtProofService.generate_narration(db, thought_proof_id, gemini)
+    narration = await ThoughtProofService.generate_narration(db, thought_proof_id, ai_service)
     
     return {"narration": narration}
 
@@ -142,15 +271,103 @@ async def generate_narration(
 @router.get("/replay/{thought_proof_id}")
 def get_replay_data(
     thought_proof_id: uuid.UUID,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Get replay data for visualization.
+    
+    Streamed one stored chunk at a time, so long recordings are never held
+    in memory whole. Long sessions are better played through /index and
+    /events.
+    
+    Open to the assignment's teacher, the student who recorded it and admins.
+    """
+    _require_viewer(db, thought_proof_id, current_user)
+    etag, not_modified = _replay_precondition(request, db, thought_proof_id)
+    if not_modified:
+        return not_modified
+    
+    return StreamingResponse(
+        ThoughtProofService.stream_replay_json(thought_proof_id),
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": REPLAY_CACHE_CONTROL}
+    )
+
+
+@router.get("/replay/{thought_proof_id}/index")
+def get_replay_index(
+    thought_proof_id: uuid.UUID,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get the chunk index of a replay: event index and time span of each
+    stored chunk, for seeking.
+    
+    Open to the assignment's teacher, the student who recorded it and admins.
+    """
+    _require_viewer(db, thought_proof_id, current_user)
+    etag, not_modified = _replay_precondition(request, db, thought_proof_id)
+    if not_modified:
+        return not_modified
+    
+    index = ThoughtProofService.get_replay_index(db, thought_proof_id)
+    return JSONResponse(index, headers={"ETag": etag, "Cache-Control": REPLAY_CACHE_CONTROL})
+
+
+@router.get("/replay/{thought_proof_id}/events")
+def get_replay_events(
+    thought_proof_id: uuid.UUID,
+    request: Request,
+    start_index: int = 0,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    limit: int = REPLAY_WINDOW_MAX_EVENTS,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get a window of replay events.
+    
+    Time windows use start_ms/end_ms (milliseconds since the first event);
+    otherwise events are returned from start_index on. Only the chunks
+    covering the window are read. Pass next_index as start_index to
+    continue a truncated window.
+    
+    Open to the assignment's teacher, the student who recorded it and admins.
+    """
+    _require_viewer(db, thought_proof_id, current_user)
+    etag, not_modified = _replay_precondition(request, db, thought_proof_id)
+    if not_modified:
+        return not_modified
+    
+    window = ThoughtProofService.get_replay_window(
+        db, thought_proof_id, start_index=start_index, start_ms=start_ms, end_ms=end_ms, limit=limit
+    )
+    return JSONResponse(window, headers={"ETag": etag, "Cache-Control": REPLAY_CACHE_CONTROL})
+
+
+@router.get("/{thought_proof_id}/analytics")
+def get_keystroke_analytics(
+    thought_proof_id: uuid.UUID,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get writing-process features of a recording: inter-key intervals,
+    bursts, paste ratio, revision per line and idle segments.
+    
+    Open to the assignment's teacher, the student who recorded it and admins.
     """
-    replay_data = ThoughtProofService.get_replay_data(db, thought_proof_id)
+    _require_viewer(db, thought_proof_id, current_user)
     
-    return replay_data
+    try:
+        return ThoughtProofService.get_keystroke_features(db, thought_proof_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 
 @router.get("/verify/{thought_proof_id}")
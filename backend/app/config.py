@@ -17,12 +17,16 @@ class Settings(BaseSettings):
     
     # Redis Configuration
     REDIS_URL: str
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 0.5  # A slow or unreachable Redis counts as a cache miss
     
     # JWT Configuration
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    USER_CACHE_TTL_SECONDS: int = 300  # Shared (Redis) tier of the authenticated-user cache
+    USER_CACHE_LOCAL_TTL_SECONDS: int = 15  # In-process tier; bounds staleness across workers
+    USER_CACHE_MAX_ENTRIES: int = 10000
     
     # Application Configuration
     APP_NAME: str = "MASTERY.AI"
@@ -44,15 +48,65 @@ class Settings(BaseSettings):
     # Engagement Index Configuration
     ENGAGEMENT_CALCULATION_PERIOD_DAYS: int = 30
     ENGAGEMENT_CACHE_TTL_SECONDS: int = 3600
+    ENGAGEMENT_INCREMENTAL_ENABLED: bool = True  # Derive index from running counters
     
     # AI Configuration
     GEMINI_API_KEY: str = ""
+    AI_BACKEND: str = "auto"  # auto, gemini, stub
+    AI_STUB_TOKEN_DELAY_MS: int = 30  # Per-token delay of the offline stub backend
+    AI_WORKER_THREADS: int = 16  # Threads running blocking model SDK calls
+    AI_GEMINI_MAX_CONCURRENCY: int = 8  # Gemini calls in flight per worker; the rest queue
+    AI_TIMEOUT_SECONDS: float = 30.0  # Per call, or per chunk when streaming
+    AI_BREAKER_FAILURES: int = 5  # Consecutive failures that open the circuit breaker
+    AI_BREAKER_RESET_SECONDS: float = 30.0
+    AI_CACHE_TTL_SECONDS: int = 604800  # Generated quizzes, focus questions and lesson plans
+    AI_CACHE_LOCAL_TTL_SECONDS: int = 600
+    AI_CACHE_MAX_ENTRIES: int = 2000
+    AI_CACHE_MAX_BYTES: int = 33554432  # 32MB per worker
+    TUTOR_CONTEXT_TTL_SECONDS: int = 120  # Per-student tutor context; dropped on submission or mastery change
+    TUTOR_CONTEXT_LOCAL_TTL_SECONDS: int = 15
+    TUTOR_HISTORY_TOKEN_BUDGET: int = 1500  # Recent turns sent with each tutor prompt; older turns are summarized
     
     # Mastery Configuration
     MASTERY_THRESHOLD: int = 70
     MASTERY_DECAY_RATE: float = 0.02
     MASTERY_DECAY_GRACE_PERIOD_DAYS: int = 7
-    
+    CONCEPT_GRAPH_REFRESH_SECONDS: int = 60  # How often to re-check the concept graph stamp
+    QUESTION_BANK_REFRESH_SECONDS: int = 60  # How often to re-check the question bank stamp
+    QUESTION_REPEAT_WINDOW_WEEKS: int = 4  # Don't repeat questions seen in this window
+    QUESTION_POOL_ENABLED: bool = True  # Pre-generate AI questions for pending syllabus topics
+    QUESTION_POOL_LOW_WATER: int = 5  # Refill a (topic, difficulty) pool below this many questions
+    QUESTION_POOL_REFILL_SIZE: int = 20  # Questions generated per refill (one model call)
+    QUESTION_POOL_SCAN_SECONDS: int = 300
+    QUESTION_POOL_MAX_REFILLS: int = 2  # Refills running at once per worker
+
+    # Background Jobs Configuration
+    JOB_QUEUE_BACKEND: str = "auto"  # auto, celery, inprocess, sync
+    CELERY_BROKER_URL: str = ""  # Empty = in-process worker
+    JOB_MAX_RETRIES: int = 3
+    JOB_RETRY_BACKOFF_SECONDS: float = 2.0
+    JOB_DEDUP_TTL_SECONDS: int = 300
+
+    # Thought Proof Configuration
+    INTEGRITY_SCAN_WORKERS: int = 4  # Processes analysing recordings in a class-wide integrity scan
+    INTEGRITY_PASTE_RATIO_FLAG: float = 0.5  # Flag sessions with more pasted than typed text
+    INTEGRITY_Z_THRESHOLD: float = 3.5  # Robust z-score against the class that counts as anomalous
+
+    # Live Quiz Configuration
+    QUIZ_STORE_BACKEND: str = "auto"  # auto, redis, memory
+    QUIZ_SESSION_TTL_SECONDS: int = 21600
+    QUIZ_END_GRACE_SECONDS: float = 60.0  # An ended quiz stays readable this long (final frames, reconnects)
+    QUIZ_SEND_QUEUE_SIZE: int = 64  # Outbound frames buffered per WebSocket
+    QUIZ_HOST_SEND_QUEUE_SIZE: int = 4096  # The host also gets one frame per student answer
+    QUIZ_LOBBY_FLUSH_MS: int = 250  # Lobby joins/leaves are batched into one diff per interval
+    QUIZ_QUESTION_TIME_LIMIT_SECONDS: int = 30  # Default when a question has no time_limit
+    QUIZ_BASE_POINTS: int = 100
+    QUIZ_SPEED_BONUS_POINTS: int = 100  # Scaled by the share of the time limit left
+    QUIZ_LEADERBOARD_SIZE: int = 10  # Entries in the host's live leaderboard
+    QUIZ_EVENT_BATCH_SIZE: int = 500
+    QUIZ_CHECKPOINT_DIR: str = "./quiz_checkpoints"  # Memory-store snapshots; empty disables
+    QUIZ_CHECKPOINT_SECONDS: float = 5.0
+
     @property
     def allowed_origins_list(self) -> List[str]:
         """Parse ALLOWED_ORIGINS string into list."""
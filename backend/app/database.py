@@ -4,9 +4,10 @@ Provides SQLAlchemy engine, session factory, and base model.
 """
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from app.config import get_settings
 
 settings = get_settings()
@@ -46,6 +47,45 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+
+# Async engine (asyncpg on PostgreSQL, aiosqlite on SQLite) for async routes
+def _async_database_url(url: str):
+    """Map the sync URL to its async driver; returns (url, connect_args)."""
+    async_connect_args = {}
+    if url.startswith("sqlite"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1), async_connect_args
+    
+    url = url.replace("postgresql+psycopg2://", "postgresql://", 1)
+    url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    
+    # asyncpg does not understand libpq's sslmode query parameter
+    if "sslmode=" in url:
+        base, _, query = url.partition("?")
+        params = [p for p in query.split("&") if p and not p.startswith("sslmode=")]
+        if "sslmode=disable" not in query:
+            async_connect_args["ssl"] = "require"
+        url = base + ("?" + "&".join(params) if params else "")
+    return url, async_connect_args
+
+
+async_database_url, async_connect_args = _async_database_url(database_url)
+async_engine_kwargs = {
+    "pool_pre_ping": True,
+    "echo": settings.DEBUG,
+    "connect_args": async_connect_args
+}
+if not database_url.startswith("sqlite"):
+    async_engine_kwargs["pool_size"] = 20
+    async_engine_kwargs["max_overflow"] = 30
+
+async_engine = create_async_engine(async_database_url, **async_engine_kwargs)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for all models
 Base = declarative_base()
 
@@ -69,6 +109,22 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency function to get an async database session.
+    
+    Usage:
+        @app.get("/items")
+        async def get_items(db: AsyncSession = Depends(get_async_db)):
+            return (await db.execute(select(Item))).scalars().all()
+    
+    Yields:
+        AsyncSession: SQLAlchemy async database session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db() -> None:
     """
     Initialize database by creating all tables.
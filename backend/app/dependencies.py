@@ -5,12 +5,14 @@ Provides common dependencies like database sessions and current user.
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 import uuid
-from app.database import get_db
+from app.database import get_async_db
 from app.models.user import User, UserRole
 from app.utils.security import decode_token
+from app.utils.user_cache import get_cached_user, cache_user
 
 # HTTP Bearer token scheme
 security = HTTPBearer()
@@ -18,11 +20,16 @@ security = HTTPBearer()
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """
     Get current authenticated user from JWT token.
     
+    The user is served from the user cache when possible; on a miss it is
+    loaded on the async engine and cached. The returned user is detached
+    and only carries the cached profile fields; routes that modify it must
+    load the row in their own session first (e.g. `db.get(User, current_user.id)`).
+    
     Args:
         credentials: HTTP Bearer credentials
         db: Database session
@@ -61,7 +68,16 @@ async def get_current_user(
     
     user_id_uuid = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
     
-    user = db.query(User).filter(User.id == user_id_uuid).first()
+    user = await get_cached_user(user_id_uuid)
+    if user is None:
+        result = await db.execute(select(User).where(User.id == user_id_uuid))
+        user = result.scalar_one_or_none()
+        if user is not None:
+            db.expunge(user)
+            await cache_user(user)
+        # End the read transaction so the connection goes back to the pool
+        await db.rollback()
+    
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,7 @@
+"""
+Background jobs package.
+"""
+
+from app.jobs.queue import job, enqueue, get_queue_metrics, run_job
+
+__all__ = ["job", "enqueue", "get_queue_metrics", "run_job"]
@@ -0,0 +1,60 @@
+"""
+Celery application for multi-node installs.
+
+Start a worker with:
+    celery -A app.jobs.celery_app worker -Q engagement,notifications,integrations,integrity
+
+Every registered job runs through the single `execute` task, which looks
+the handler up in the job registry and applies the shared retry policy.
+"""
+
+import time
+from celery import Celery
+from app.config import get_settings
+from app.jobs import queue as job_queue
+from app.utils.cache import redis_client
+
+settings = get_settings()
+
+celery_app = Celery(
+    "mastery_ai",
+    broker=settings.CELERY_BROKER_URL or settings.REDIS_URL
+)
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    task_acks_late=True,
+    worker_prefetch_multiplier=1
+)
+
+
+@celery_app.task(name="app.jobs.celery_app.execute", bind=True)
+def execute(self, name: str, kwargs: dict, dedup_id: str = None, enqueued_at: float = None):
+    """Run a registered job, retrying with exponential backoff on failure."""
+    # A fresh worker child has not imported the job modules yet
+    job_queue._ensure_handlers_loaded()
+    _, queue = job_queue._registry.get(name, (None, "default"))
+    metrics_key = f"jobs:metrics:{queue}"
+
+    if self.request.retries == 0:
+        # Release the dedup key so edits made from now on schedule a new run
+        if dedup_id:
+            redis_client.delete(f"jobs:pending:{dedup_id}")
+        redis_client.hincrby(metrics_key, 'started', 1)
+        if enqueued_at:
+            redis_client.hincrbyfloat(metrics_key, 'wait_ms_total', (time.time() - enqueued_at) * 1000)
+
+    started = time.monotonic()
+    try:
+        result = job_queue.run_job(name, kwargs)
+    except Exception as e:
+        redis_client.hincrbyfloat(metrics_key, 'run_ms_total', (time.monotonic() - started) * 1000)
+        if self.request.retries < settings.JOB_MAX_RETRIES:
+            redis_client.hincrby(metrics_key, 'retried', 1)
+            raise self.retry(exc=e, countdown=job_queue._retry_delay(self.request.retries + 1))
+        redis_client.hincrby(metrics_key, 'failed', 1)
+        raise
+
+    redis_client.hincrbyfloat(metrics_key, 'run_ms_total', (time.monotonic() - started) * 1000)
+    redis_client.hincrby(metrics_key, 'processed', 1)
+    return result
@@ -0,0 +1,338 @@
+"""
+Background job queue.
+
+Write endpoints enqueue follow-up work (index recomputation, notification
+fan-out, Google Calendar calls) and return immediately. Jobs are
+registered by name with the @job decorator and dispatched to one of:
+
+- "celery":    the Celery workers in app.jobs.celery_app (multi-node installs)
+- "inprocess": a worker thread per queue inside the API process (single node)
+- "sync":      run immediately in the caller's thread (scripts, debugging)
+
+Every enqueue carries an optional dedup key. While a job with the same
+name and key is still waiting, further enqueues are coalesced into it, so
+ten attendance edits for one student trigger one index recompute. Failed
+jobs are retried with exponential backoff.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# name -> (handler, queue)
+_registry: Dict[str, Tuple[Callable[..., Any], str]] = {}
+_handlers_loaded = False
+
+
+def job(name: str, queue: str = "default"):
+    """
+    Register a function as a background job.
+
+    Usage:
+        @job("engagement.update_index", queue="engagement")
+        def update_index(student_id: str, class_id: str): ...
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        _registry[name] = (func, queue)
+        return func
+    return decorator
+
+
+def enqueue(name: str, key: Optional[str] = None, **kwargs) -> bool:
+    """
+    Schedule a registered job.
+
+    Args:
+        name: Registered job name
+        key: Dedup key; a pending job with the same name and key absorbs this one
+        **kwargs: JSON-serializable job arguments
+
+    Returns:
+        True if a new job was queued, False if it was coalesced
+    """
+    _ensure_handlers_loaded()
+    if name not in _registry:
+        raise ValueError(f"Unknown job: {name}")
+
+    return get_backend().submit(name, _registry[name][1], key, kwargs)
+
+
+def get_queue_metrics() -> Dict[str, Dict[str, Any]]:
+    """Per-queue depth, throughput and latency figures."""
+    return get_backend().metrics()
+
+
+def run_job(name: str, kwargs: Dict[str, Any]) -> Any:
+    """Execute a registered job in the current thread."""
+    _ensure_handlers_loaded()
+    handler, _ = _registry[name]
+    return handler(**kwargs)
+
+
+def _ensure_handlers_loaded() -> None:
+    """Import the job definitions once (they import services lazily)."""
+    global _handlers_loaded
+    if not _handlers_loaded:
+        _handlers_loaded = True
+        import app.jobs.tasks  # noqa: F401
+
+
+def _dedup_id(name: str, key: Optional[str]) -> Optional[str]:
+    return f"{name}:{key}" if key is not None else None
+
+
+def _retry_delay(attempt: int) -> float:
+    return settings.JOB_RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1))
+
+
+class QueueStats:
+    """Counters and recent latency samples for one queue."""
+
+    SAMPLE_SIZE = 500
+
+    def __init__(self):
+        self.depth = 0
+        self.enqueued = 0
+        self.coalesced = 0
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.wait_ms = deque(maxlen=self.SAMPLE_SIZE)
+        self.run_ms = deque(maxlen=self.SAMPLE_SIZE)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'depth': self.depth,
+            'enqueued': self.enqueued,
+            'coalesced': self.coalesced,
+            'processed': self.processed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'wait_ms': _summarize(self.wait_ms),
+            'run_ms': _summarize(self.run_ms)
+        }
+
+
+def _summarize(samples) -> Dict[str, float]:
+    if not samples:
+        return {'avg': 0, 'p95': 0, 'max': 0}
+    ordered = sorted(samples)
+    return {
+        'avg': round(sum(ordered) / len(ordered), 2),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        'max': round(ordered[-1], 2)
+    }
+
+
+class SyncBackend:
+    """Runs jobs immediately in the caller's thread."""
+
+    def __init__(self):
+        self._stats: Dict[str, QueueStats] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, queue: str, key: Optional[str], kwargs: Dict[str, Any]) -> bool:
+        with self._lock:
+            stats = self._stats.setdefault(queue, QueueStats())
+            stats.enqueued += 1
+
+        started = time.monotonic()
+        try:
+            run_job(name, kwargs)
+            ok = True
+        except Exception as e:
+            logger.error(f"Job {name} failed: {e}")
+            ok = False
+
+        with self._lock:
+            stats.wait_ms.append(0.0)
+            stats.run_ms.append((time.monotonic() - started) * 1000)
+            if ok:
+                stats.processed += 1
+            else:
+                stats.failed += 1
+        return True
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {queue: stats.snapshot() for queue, stats in self._stats.items()}
+
+
+class InProcessBackend:
+    """
+    Thread-per-queue worker for single-node installs.
+
+    Pending jobs are held in a time-ordered heap per queue so retries can
+    be scheduled for later without blocking other work.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heaps: Dict[str, list] = {}
+        self._pending: Dict[str, dict] = {}  # dedup id -> queued entry
+        self._stats: Dict[str, QueueStats] = {}
+        self._workers: Dict[str, threading.Thread] = {}
+        self._seq = 0
+
+    def submit(self, name: str, queue: str, key: Optional[str], kwargs: Dict[str, Any]) -> bool:
+        dedup_id = _dedup_id(name, key)
+        with self._cond:
+            stats = self._stats.setdefault(queue, QueueStats())
+            if dedup_id is not None and dedup_id in self._pending:
+                stats.coalesced += 1
+                return False
+
+            entry = {
+                'name': name,
+                'queue': queue,
+                'dedup_id': dedup_id,
+                'kwargs': kwargs,
+                'attempt': 1,
+                'enqueued_at': time.monotonic()
+            }
+            if dedup_id is not None:
+                self._pending[dedup_id] = entry
+            stats.enqueued += 1
+            stats.depth += 1
+            self._push(entry, run_at=time.monotonic())
+            self._ensure_worker(queue)
+            self._cond.notify_all()
+        return True
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        with self._cond:
+            return {queue: stats.snapshot() for queue, stats in self._stats.items()}
+
+    def _push(self, entry: dict, run_at: float) -> None:
+        self._seq += 1
+        heapq.heappush(self._heaps.setdefault(entry['queue'], []), (run_at, self._seq, entry))
+
+    def _ensure_worker(self, queue: str) -> None:
+        if queue not in self._workers:
+            worker = threading.Thread(target=self._work, args=(queue,), name=f"jobs-{queue}", daemon=True)
+            self._workers[queue] = worker
+            worker.start()
+
+    def _work(self, queue: str) -> None:
+        while True:
+            with self._cond:
+                heap = self._heaps[queue]
+                while not heap or heap[0][0] > time.monotonic():
+                    timeout = heap[0][0] - time.monotonic() if heap else None
+                    self._cond.wait(timeout)
+                _, _, entry = heapq.heappop(heap)
+                # From here on, new enqueues with this key start a fresh job
+                if entry['dedup_id'] is not None:
+                    self._pending.pop(entry['dedup_id'], None)
+                stats = self._stats[queue]
+                stats.depth -= 1
+                stats.wait_ms.append((time.monotonic() - entry['enqueued_at']) * 1000)
+
+            started = time.monotonic()
+            try:
+                run_job(entry['name'], entry['kwargs'])
+                error = None
+            except Exception as e:
+                error = e
+
+            with self._cond:
+                stats.run_ms.append((time.monotonic() - started) * 1000)
+                if error is None:
+                    stats.processed += 1
+                elif entry['attempt'] <= settings.JOB_MAX_RETRIES:
+                    delay = _retry_delay(entry['attempt'])
+                    logger.warning(f"Job {entry['name']} failed ({error}); retry {entry['attempt']} in {delay}s")
+                    entry['attempt'] += 1
+                    stats.retried += 1
+                    stats.depth += 1
+                    self._push(entry, run_at=time.monotonic() + delay)
+                    self._cond.notify_all()
+                else:
+                    stats.failed += 1
+                    logger.error(f"Job {entry['name']} failed after {entry['attempt']} attempts: {error}")
+
+
+class CeleryBackend:
+    """
+    Dispatches jobs to Celery workers.
+
+    Dedup keys are held in Redis (SET NX) until a worker picks the job up;
+    counters live in a Redis hash per queue so every API process and worker
+    reports the same figures.
+    """
+
+    def __init__(self):
+        from app.jobs.celery_app import celery_app
+        from app.utils.cache import redis_client
+        self.celery_app = celery_app
+        self.redis = redis_client
+
+    def submit(self, name: str, queue: str, key: Optional[str], kwargs: Dict[str, Any]) -> bool:
+        dedup_id = _dedup_id(name, key)
+        if dedup_id is not None:
+            claimed = self.redis.set(f"jobs:pending:{dedup_id}", 1, nx=True, ex=settings.JOB_DEDUP_TTL_SECONDS)
+            if not claimed:
+                self.redis.hincrby(f"jobs:metrics:{queue}", 'coalesced', 1)
+                return False
+
+        self.celery_app.send_task(
+            'app.jobs.celery_app.execute',
+            args=[name, kwargs, dedup_id, time.time()],
+            queue=queue
+        )
+        self.redis.hincrby(f"jobs:metrics:{queue}", 'enqueued', 1)
+        return True
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        _ensure_handlers_loaded()
+        queues = {queue for _, queue in _registry.values()}
+        result = {}
+        for queue in sorted(queues):
+            counters = self.redis.hgetall(f"jobs:metrics:{queue}")
+            started = int(counters.get('started', 0))
+            finished = int(counters.get('processed', 0)) + int(counters.get('failed', 0))
+            result[queue] = {
+                'depth': self.redis.llen(queue),  # Redis broker keeps one list per queue
+                'enqueued': int(counters.get('enqueued', 0)),
+                'coalesced': int(counters.get('coalesced', 0)),
+                'processed': int(counters.get('processed', 0)),
+                'failed': int(counters.get('failed', 0)),
+                'retried': int(counters.get('retried', 0)),
+                'wait_ms': {'avg': round(float(counters.get('wait_ms_total', 0)) / started, 2) if started else 0},
+                'run_ms': {'avg': round(float(counters.get('run_ms_total', 0)) / finished, 2) if finished else 0}
+            }
+        return result
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Select the queue backend once, from JOB_QUEUE_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend(settings.JOB_QUEUE_BACKEND)
+    return _backend
+
+
+def _create_backend(kind: str):
+    if kind == "sync":
+        return SyncBackend()
+    if kind == "celery" or (kind == "auto" and settings.CELERY_BROKER_URL):
+        try:
+            return CeleryBackend()
+        except Exception as e:
+            if kind == "celery":
+                raise
+            logger.warning(f"Celery unavailable ({e}); using in-process job worker")
+    return InProcessBackend()
@@ -0,0 +1,120 @@
+"""
+Background job definitions.
+
+Each job opens its own session, so it can run on a worker thread or a
+Celery worker long after the request that scheduled it has returned.
+Arguments are plain strings so they survive JSON serialization.
+"""
+
+import logging
+import os
+from datetime import datetime
+from uuid import UUID
+from app.database import SessionLocal
+from app.jobs.queue import job
+
+logger = logging.getLogger(__name__)
+
+
+@job("engagement.update_index", queue="engagement")
+def update_engagement_index(student_id: str, class_id: str) -> None:
+    """Recompute one student's engagement index for a class."""
+    from app.services.engagement_service import EngagementService
+
+    db = SessionLocal()
+    try:
+        EngagementService.update_student_index(db, UUID(student_id), UUID(class_id))
+    finally:
+        db.close()
+
+
+@job("engagement.update_class", queue="engagement")
+def update_class_engagement(class_id: str) -> None:
+    """Recompute every engagement index in a class."""
+    from app.services.engagement_service import EngagementService
+
+    db = SessionLocal()
+    try:
+        EngagementService.update_class_indices(db, UUID(class_id))
+    finally:
+        db.close()
+
+
+@job("notifications.project_assigned", queue="notifications")
+def notify_project_assigned(project_id: str) -> None:
+    """Notify every student assigned to a project, in one bulk insert."""
+    from app.models.project import Project, ProjectAssignment
+    from app.models.notification import Notification, NotificationType
+
+    db = SessionLocal()
+    try:
+        project = db.query(Project).filter(Project.id == UUID(project_id)).first()
+        if not project:
+            return
+
+        # Skip students already notified, so a retried job does not double up
+        already_notified = {
+            row.recipient_id for row in db.query(Notification.recipient_id).filter(
+                Notification.reference_id == project.id,
+                Notification.type == NotificationType.ASSIGNMENT
+            ).all()
+        }
+        student_ids = [
+            row.student_id for row in db.query(ProjectAssignment.student_id).filter(
+                ProjectAssignment.project_id == project.id
+            ).all()
+            if row.student_id not in already_notified
+        ]
+        if not student_ids:
+            return
+
+        db.bulk_insert_mappings(Notification, [
+            {
+                'recipient_id': student_id,
+                'title': "New Project Assigned",
+                'message': f"You have been assigned a new project: {project.title}",
+                'type': NotificationType.ASSIGNMENT,
+                'reference_id': project.id,
+                'is_read': False,
+                'created_at': datetime.utcnow()
+            }
+            for student_id in student_ids
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+@job("integrations.project_calendar_event", queue="integrations")
+def create_project_calendar_event(project_id: str) -> None:
+    """Create the Google Calendar event for a project deadline."""
+    from app.models.project import Project
+    from app.services.google_service import google_service
+
+    if not os.path.exists(google_service.credentials_path):
+        # Not configured: nothing to retry
+        return
+
+    db = SessionLocal()
+    try:
+        project = db.query(Project).filter(Project.id == UUID(project_id)).first()
+        if not project or not (project.start_date and project.end_date):
+            return
+
+        logger.info(f"[CALENDAR] Creating event for project: {project.title}")
+        google_service.create_calendar_event(
+            summary=f"Project Due: {project.title}",
+            description=project.description or "Project Deadline",
+            start_time=project.start_date,
+            end_time=project.end_date
+        )
+    finally:
+        db.close()
+
+
+@job("thought_proof.integrity_scan", queue="integrity")
+def run_integrity_scan(report_id: str) -> None:
+    """Scan a class's or assignment's finalized thought proofs and store the ranked report."""
+    from app.ai.integrity_scan import run_scan
+
+    run_scan(UUID(report_id))
@@ -8,7 +8,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
 from app.database import engine, Base
 import app.models # Register all models in Base.metadata
-from app.api.v1 import auth, analytics, projects, engagement, mastery, quiz, assignments, resources, syllabus, notifications, classes, attendance, chat, thought_proof
+from app.api.v1 import auth, analytics, projects, engagement, mastery, quiz, assignments, resources, syllabus, notifications, classes, attendance, chat, thought_proof, jobs
 from app.routers import daily_challenge, focus
 
 settings = get_settings()
@@ -89,6 +89,7 @@ app.include_router(classes.router, prefix="/api/v1")
 app.include_router(attendance.router, prefix="/api/v1")
 app.include_router(chat.router, prefix="/api/v1")
 app.include_router(thought_proof.router, prefix="/api/v1")
+app.include_router(jobs.router, prefix="/api/v1")
 app.include_router(daily_challenge.router, prefix="/api/v1")
 app.include_router(focus.router, prefix="/api/v1")
 
@@ -104,6 +105,15 @@ async def startup_event():
         print("!!! WARNING: GEMINI_API_KEY IS MISSING !!!")
     print("--------------------------------------------------")
 
+    from app.ai.question_pool import start_question_pool_warmer
+    start_question_pool_warmer()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from app.ai.question_pool import stop_question_pool_warmer
+    await stop_question_pool_warmer()
+
 from fastapi.staticfiles import StaticFiles
 import os
 
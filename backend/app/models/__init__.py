@@ -13,11 +13,12 @@ from app.models.project import (
 )
 from app.models.engagement import (
     EngagementEvent, EngagementIndex, AttendanceRecord,
+    EngagementCounter, EngagementDayBucket,
     EventType, AttendanceStatus
 )
 from app.models.assignment import (
     Concept, ConceptPrerequisite, StudentMastery, Assignment, AssignmentQuestion,
-    StudentAssignment, StudentResponse, AdaptiveRecommendation,
+    StudentAssignment, StudentResponse, AdaptiveRecommendation, BankQuestion, PoolQuestion,
     DifficultyLevel, AssignmentType, QuestionType, QuestionDifficulty,
     AssignmentStatus, RecommendationType
 )
@@ -26,9 +27,10 @@ from app.models.resource import (
 )
 from app.models.notification import Notification, NotificationType
 from app.models.syllabus import SyllabusTopic, TopicStatus
-from app.models.thought_proof import ThoughtProof, KeystrokeEvent
+from app.models.thought_proof import ThoughtProof, KeystrokeEvent, KeystrokeChunk, IntegrityScanReport, ScanStatus
 from app.models.daily_challenge import DailyChallenge
 from app.models.focus_session import FocusSession, SessionStatus
+from app.models.tutor_conversation import TutorConversation, TutorMessage
 
 __all__ = [
     # Base
@@ -47,11 +49,12 @@ __all__ = [
     
     # Engagement models
     "EngagementEvent", "EngagementIndex", "AttendanceRecord",
+    "EngagementCounter", "EngagementDayBucket",
     "EventType", "AttendanceStatus",
     
     # Assignment models
     "Concept", "ConceptPrerequisite", "StudentMastery", "Assignment", "AssignmentQuestion",
-    "StudentAssignment", "StudentResponse", "AdaptiveRecommendation",
+    "StudentAssignment", "StudentResponse", "AdaptiveRecommendation", "BankQuestion", "PoolQuestion",
     "DifficultyLevel", "AssignmentType", "QuestionType", "QuestionDifficulty",
     "AssignmentStatus", "RecommendationType",
     
@@ -65,11 +68,14 @@ __all__ = [
     "SyllabusTopic", "TopicStatus",
     
     # Thought Proof models
-    "ThoughtProof", "KeystrokeEvent",
+    "ThoughtProof", "KeystrokeEvent", "KeystrokeChunk", "IntegrityScanReport", "ScanStatus",
     
     # Daily Challenge models
     "DailyChallenge",
     
     # Focus Session models
-    "FocusSession", "SessionStatus"
+    "FocusSession", "SessionStatus",
+    
+    # Tutor Conversation models
+    "TutorConversation", "TutorMessage"
 ]
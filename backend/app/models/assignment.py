@@ -3,7 +3,7 @@ Adaptive learning and mastery tracking database models.
 Includes Concept, StudentMastery, Assignment, and AdaptiveRecommendation models.
 """
 
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, Numeric, Boolean, Enum as SQLEnum, UniqueConstraint, JSON, Uuid
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, Numeric, Boolean, Enum as SQLEnum, UniqueConstraint, Index, JSON, Uuid
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
@@ -147,6 +147,50 @@ class AssignmentQuestion(Base):
     responses = relationship("StudentResponse", back_populates="question")
 
 
+class BankQuestion(Base):
+    """Reusable question in the question bank, copied into assignments."""
+    __tablename__ = "question_bank"
+    __table_args__ = (
+        Index('ix_question_bank_concept_difficulty', 'concept_id', 'difficulty'),
+    )
+    
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    concept_id = Column(Uuid, ForeignKey("concepts.id"), nullable=True)  # NULL = usable for any concept
+    category = Column(String(100), nullable=True)
+    question_text = Column(Text, nullable=False)
+    question_type = Column(SQLEnum(QuestionType), nullable=False, default=QuestionType.MCQ)
+    difficulty = Column(SQLEnum(QuestionDifficulty), nullable=False)
+    correct_answer = Column(Text, nullable=True)
+    options = Column(JSON, nullable=True)
+    points = Column(Integer, default=1)
+    content_hash = Column(String(40), nullable=False, unique=True)  # Dedup key for imports
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    concept = relationship("Concept")
+
+
+class PoolQuestion(Base):
+    """AI-generated question kept ready for a topic; each one is drawn once."""
+    __tablename__ = "question_pool"
+    __table_args__ = (
+        Index('ix_question_pool_topic_difficulty', 'topic_key', 'difficulty', 'drawn_at'),
+    )
+    
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    topic_key = Column(String(255), nullable=False)  # Normalized topic title
+    topic_title = Column(String(255), nullable=False)
+    difficulty = Column(SQLEnum(QuestionDifficulty), nullable=False)
+    question_text = Column(Text, nullable=False)
+    options = Column(JSON, nullable=False)
+    correct_answer = Column(Text, nullable=False)
+    content_hash = Column(String(40), nullable=False)
+    source = Column(String(20), nullable=False)  # LLM backend that generated it
+    drawn_at = Column(DateTime(timezone=True), nullable=True)  # NULL = still available
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class AssignmentStatus(str, enum.Enum):
     """Assignment status enumeration."""
     ASSIGNED = "assigned"
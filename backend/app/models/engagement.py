@@ -2,7 +2,7 @@
 Engagement tracking related database models.
 """
 
-from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Date, Enum as SQLEnum, UniqueConstraint, Index, JSON, Uuid
+from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Date, Integer, Enum as SQLEnum, UniqueConstraint, Index, JSON, Uuid
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
@@ -89,3 +89,45 @@ class AttendanceRecord(Base):
     # Relationships
     student = relationship("User", back_populates="attendance_records", foreign_keys=[student_id])
     class_obj = relationship("Class", back_populates="attendance_records")
+
+
+class EngagementFactorCounts:
+    """Raw factor counts shared by running totals and their day buckets."""
+    attendance_total = Column(Integer, nullable=False, default=0)
+    attendance_present = Column(Integer, nullable=False, default=0)
+    attendance_late = Column(Integer, nullable=False, default=0)
+    attendance_absent = Column(Integer, nullable=False, default=0)
+    assignments_total = Column(Integer, nullable=False, default=0)
+    assignments_submitted = Column(Integer, nullable=False, default=0)
+    submissions_total = Column(Integer, nullable=False, default=0)
+    submissions_on_time = Column(Integer, nullable=False, default=0)
+    quiz_events = Column(Integer, nullable=False, default=0)
+    interaction_events = Column(Integer, nullable=False, default=0)
+    resource_events = Column(Integer, nullable=False, default=0)
+
+
+class EngagementCounter(EngagementFactorCounts, Base):
+    """Running factor totals over the engagement window for a student in a class."""
+    __tablename__ = "engagement_counters"
+    __table_args__ = (
+        UniqueConstraint('student_id', 'class_id', name='uq_engagement_counter'),
+    )
+    
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    student_id = Column(Uuid, ForeignKey("users.id"), nullable=False, index=True)
+    class_id = Column(Uuid, ForeignKey("classes.id"), nullable=False, index=True)
+    window_start = Column(Date, nullable=False)  # Oldest day still included in the totals
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class EngagementDayBucket(EngagementFactorCounts, Base):
+    """Factor counts for a single day, subtracted from the totals once the day leaves the window."""
+    __tablename__ = "engagement_day_buckets"
+    __table_args__ = (
+        UniqueConstraint('student_id', 'class_id', 'day', name='uq_engagement_day_bucket'),
+    )
+    
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    student_id = Column(Uuid, ForeignKey("users.id"), nullable=False)
+    class_id = Column(Uuid, ForeignKey("classes.id"), nullable=False)
+    day = Column(Date, nullable=False)
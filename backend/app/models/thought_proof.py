@@ -3,13 +3,21 @@ Proof of Thought models for anti-plagiarism verification.
 Tracks keystroke events and generates cryptographically signed proof of work.
 """
 
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, Boolean, Uuid
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, BigInteger, Boolean, LargeBinary, Index, JSON, Uuid, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
+import enum
 from app.database import Base
 
 
+class ScanStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class ThoughtProof(Base):
     """Main proof of thought record linked to assignment submission."""
     __tablename__ = "thought_proofs"
@@ -22,7 +30,7 @@ class ThoughtProof(Base):
     finalized_at = Column(DateTime(timezone=True), nullable=True)
     total_duration_seconds = Column(Integer, default=0)  # Active typing time
     
-    # Replay data (compressed JSON)
+    # Replay data (compressed JSON, proofs recorded before keystroke_chunks)
     events_json = Column(Text, nullable=True)  # Compressed keystroke events
     events_count = Column(Integer, default=0)
     
@@ -42,10 +50,11 @@ class ThoughtProof(Base):
     # Relationships
     student_assignment = relationship("StudentAssignment", back_populates="thought_proof")
     keystroke_events = relationship("KeystrokeEvent", back_populates="thought_proof", cascade="all, delete-orphan", order_by="KeystrokeEvent.timestamp")
+    keystroke_chunks = relationship("KeystrokeChunk", back_populates="thought_proof", cascade="all, delete-orphan", order_by="KeystrokeChunk.first_event_index")
 
 
 class KeystrokeEvent(Base):
-    """Individual keystroke/edit event during assignment work."""
+    """Individual keystroke/edit event (proofs recorded before keystroke_chunks)."""
     __tablename__ = "keystroke_events"
     
     id = Column(Uuid, primary_key=True, default=uuid.uuid4)
@@ -66,3 +75,52 @@ class KeystrokeEvent(Base):
     
     # Relationships
     thought_proof = relationship("ThoughtProof", back_populates="keystroke_events")
+
+
+class KeystrokeChunk(Base):
+    """One recorded batch of keystroke events, encoded by app.utils.keystroke_codec."""
+    __tablename__ = "keystroke_chunks"
+    __table_args__ = (
+        Index('ix_keystroke_chunks_proof_event', 'thought_proof_id', 'first_event_index', unique=True),
+    )
+    
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    thought_proof_id = Column(Uuid, ForeignKey("thought_proofs.id", ondelete="CASCADE"), nullable=False)
+    
+    # Position of the batch in the recording
+    first_event_index = Column(Integer, nullable=False)  # Events recorded before this batch
+    event_count = Column(Integer, nullable=False)
+    first_ts_ms = Column(BigInteger, nullable=False)  # Milliseconds since the epoch
+    last_ts_ms = Column(BigInteger, nullable=False)
+    
+    # Columnar, compressed event data
+    data = Column(LargeBinary, nullable=False)
+    
+    # Running state of the recording up to and including this batch
+    chain_hash = Column(String(64), nullable=False)  # SHA-256 over the previous chain_hash and this batch
+    totals = Column(JSON, nullable=False)  # Event counts by type, first/last timestamps
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    thought_proof = relationship("ThoughtProof", back_populates="keystroke_chunks")
+
+
+class IntegrityScanReport(Base):
+    """Ranked integrity report over the finalized proofs of a class or assignment."""
+    __tablename__ = "integrity_scan_reports"
+    
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    class_id = Column(Uuid, ForeignKey("classes.id", ondelete="CASCADE"), nullable=True, index=True)
+    assignment_id = Column(Uuid, ForeignKey("assignments.id", ondelete="CASCADE"), nullable=True, index=True)
+    requested_by = Column(Uuid, ForeignKey("users.id"), nullable=False)
+    
+    status = Column(SQLEnum(ScanStatus), default=ScanStatus.PENDING, nullable=False)
+    proofs_scanned = Column(Integer, default=0)
+    flagged_count = Column(Integer, default=0)
+    results = Column(JSON, nullable=True)  # Per-proof features and flags, highest risk first
+    skipped = Column(JSON, nullable=True)  # Proofs that could not be analysed, with their errors
+    error = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,42 @@
+"""
+AI tutor conversation models.
+"""
+
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, Index, Uuid
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+import uuid
+from app.database import Base
+
+class TutorConversation(Base):
+    """A student's conversation with the AI tutor."""
+    __tablename__ = "tutor_conversations"
+
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    student_id = Column(Uuid, ForeignKey("users.id"), nullable=False, index=True)
+    message_count = Column(Integer, nullable=False, default=0)  # Also the last message's seq
+    summary = Column(Text, nullable=True)  # Running summary of the turns up to summarized_through
+    summarized_through = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Relationships
+    messages = relationship("TutorMessage", back_populates="conversation", cascade="all, delete-orphan")
+
+class TutorMessage(Base):
+    """One turn of a tutor conversation; the log is append-only."""
+    __tablename__ = "tutor_messages"
+    __table_args__ = (
+        Index('ix_tutor_messages_conversation_seq', 'conversation_id', 'seq', unique=True),
+    )
+
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    conversation_id = Column(Uuid, ForeignKey("tutor_conversations.id"), nullable=False)
+    seq = Column(Integer, nullable=False)  # 1-based position in the conversation
+    role = Column(String(20), nullable=False)  # user, bot
+    text = Column(Text, nullable=False)
+    tokens = Column(Integer, nullable=False)  # Estimated once, reused for windowing
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    conversation = relationship("TutorConversation", back_populates="messages")
@@ -23,6 +23,7 @@ class FocusSessionStart(BaseModel):
 
 class FocusQuestionsRequest(BaseModel):
     topic: str
+    regenerate: bool = False  # Skip the cache and ask the model again
 
 class FocusSessionEnd(BaseModel):
     session_id: str
@@ -106,6 +107,7 @@ def end_session(
     session.status = SessionStatus.COMPLETED
     
     # Update User Balance
+    current_user = db.get(User, current_user.id)
     current_user.dark_energy = (current_user.dark_energy or 0) + earned_energy
     current_user.cognitive_score = (current_user.cognitive_score or 0) + cognitive_points
     
@@ -124,5 +126,5 @@ async def generate_focus_questions(
     current_user: User = Depends(get_current_user)
 ):
     """Generates 3 AI questions based on the focus topic."""
-    result = await ai_service.generate_focus_assignment(input.topic)
+    result = await ai_service.generate_focus_assignment(input.topic, regenerate=input.regenerate)
     return result
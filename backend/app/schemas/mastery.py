@@ -41,6 +41,20 @@ class QuestionResponse(QuestionBase):
     class Config:
         from_attributes = True
 
+class BankQuestionImport(BaseModel):
+    question_text: str
+    difficulty: QuestionDifficulty
+    question_type: str = "mcq"
+    options: Optional[Dict[str, str]] = None
+    correct_answer: Optional[str] = None
+    points: Optional[int] = None
+    concept_id: Optional[UUID] = None
+    category: Optional[str] = None
+
+class QuestionBankImportResult(BaseModel):
+    inserted: int
+    skipped: int
+
 class AssignmentBase(BaseModel):
     title: str
     assignment_type: AssignmentType
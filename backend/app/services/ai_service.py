@@ -1,28 +1,94 @@
-import google.generativeai as genai
 from app.config import get_settings
 import json
 import logging
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+from app.services.llm_gateway import llm_gateway, estimate_tokens
+from app.utils.ai_cache import get_cached_generation, cache_generation
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
-# Configure Gemini
-if settings.GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-    except Exception as e:
-        logger.error(f"Failed to configure Gemini: {e}")
+TUTOR_FALLBACK_REPLY = "I'm having trouble connecting to my brain right now. Can you try asking again?"
+
+TUTOR_INSTRUCTION = """You are a helpful, patient, and encouraging AI tutor for K-12 students. 
+        Your goal is to help students learn by explaining concepts, providing examples, and guiding them through problems using the Socratic method (ask questions to guide them).
+        
+        IMPORTANT GUIDELINES:
+        1. The student might make spelling mistakes (e.g., "studnet", "speeling"). You MUST understand their intent despite these errors and DO NOT point out the typos unless it's critical for the concept.
+        2. Be concise but partial. Don't give long lectures. Use bullet points if explaining steps.
+        3. If the student asks for the answer, try to guide them first. "What do you think is the first step?"
+        4. Use emojis occasionally to be friendly (e.g., 📚, ✨, 🤔).
+        """
+
+
+@lru_cache(maxsize=4096)
+def _tutor_system_prefix(first_name: Optional[str], topics: Tuple[str, ...], assignments: Tuple[str, ...]) -> str:
+    """System instruction plus student context; the same for every turn until the context changes."""
+    prefix = TUTOR_INSTRUCTION
+    if first_name or topics or assignments:
+        prefix += "\n\nSTUDENT CONTEXT (Use this to personalize your help):"
+        if first_name:
+            prefix += f"\n- Student Name: {first_name}"
+        if topics:
+            prefix += f"\n- Topics user is struggling with: {', '.join(topics)}. (Try to relate questions to these if relevant)."
+        if assignments:
+            prefix += f"\n- Pending Assignments: {', '.join(assignments)}. (Remind them if they seem off-track)."
+    return prefix
+
+
+def _speaker(msg: Dict[str, Any]) -> str:
+    return "Student" if msg.get('role') == 'user' else "Tutor"
+
+
+def window_history(history: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+    """
+    The most recent messages whose combined size fits in `budget` tokens,
+    oldest first. Uses a message's stored "tokens" when it has one.
+    """
+    window, used = [], 0
+    for msg in reversed(history or []):
+        tokens = msg.get('tokens')
+        if tokens is None:
+            tokens = estimate_tokens(msg.get('text', ''))
+        if used + tokens > budget:
+            break
+        used += tokens
+        window.append(msg)
+    window.reverse()
+    return window
 
 class AIService:
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        # All model calls go through the gateway (concurrency caps, timeouts,
+        # circuit breaker, coalescing of identical prompts)
+        self.gateway = llm_gateway
 
-    async def generate_quiz_questions(self, topic: str, count: int = 5, difficulty: str = "Medium") -> List[Dict[str, Any]]:
+    @property
+    def offline(self) -> bool:
+        """True when running on the stub backend (no real model)."""
+        return self.gateway.backend.name == "stub"
+
+    @property
+    def generates_quizzes(self) -> bool:
+        """
+        True with a real model, or with the stub only when AI_BACKEND=stub
+        is set explicitly; its synthetic questions must never pass for real ones.
+        """
+        return not self.offline or settings.AI_BACKEND == "stub"
+
+    async def generate_text(self, prompt: str) -> str:
+        """Return the model's completion for a free-form prompt."""
+        return (await self.gateway.generate(prompt)).strip()
+
+    async def generate_quiz_questions(self, topic: str, count: int = 5, difficulty: str = "Medium",
+                                      regenerate: bool = False) -> List[Dict[str, Any]]:
         """
         Generates quiz questions using Gemini API.
+
+        Results are cached by prompt; regenerate=True asks the model again.
         """
-        if not settings.GEMINI_API_KEY:
+        if not self.generates_quizzes:
             raise Exception("GEMINI_API_KEY is not configured. Check .env file.")
 
         prompt = f"""
@@ -46,9 +112,12 @@ class AIService:
         Do not include markdown formatting (like ```json), just the raw JSON string.
         """
 
+        cached = await self._cached("quiz", prompt, regenerate)
+        if cached is not None:
+            return cached
+
         try:
-            response = self.model.generate_content(prompt)
-            content = response.text.strip()
+            content = (await self.gateway.generate(prompt)).strip()
             
             # fast cleanup if model adds markdown blocks
             if content.startswith("```json"):
@@ -59,84 +128,81 @@ class AIService:
                 content = content[:-3]
                 
             questions = json.loads(content)
+            await self._remember("quiz", prompt, questions)
             return questions
         except Exception as e:
             logger.error(f"AI Generation Failed: {str(e)}")
             raise Exception(f"AI Generation Error: {str(e)}")
 
-    async def chat_with_tutor(self, message: str, history: List[Dict[str, str]] = [], context: Dict[str, Any] = None) -> str:
+    async def chat_with_tutor(self, message: str, history: List[Dict[str, str]] = [], context: Dict[str, Any] = None,
+                              summary: Optional[str] = None) -> str:
         """
         Chat with the AI tutor.
         """
-        if not settings.GEMINI_API_KEY:
-            # DEMO/MOCK MODE
-            import random
-            time_delay = 1 # Simulate thinking
-            import asyncio
-            await asyncio.sleep(time_delay)
-            
-            lower_msg = message.lower()
-            if "polynomial" in lower_msg:
-                return "A polynomial equation is an equation involving a sum of powers in one or more variables multiplied by coefficients. For example, 2x² + 3x - 5 = 0. Would you like to try solving a simple one?"
-            elif "quadratic" in lower_msg or "quadractic" in lower_msg:
-                return "A quadratic equation is a polynomial equation of degree 2, usually in the form ax² + bx + c = 0. The solutions are found using the quadratic formula: x = (-b ± √(b² - 4ac)) / 2a. Want to see an example?"
-            elif "hello" in lower_msg or "hi" in lower_msg:
-                return "Hello there! I'm your AI Tutor. I'm running in Demo Mode right now, but I can still help you understand how this platform works! 🚀"
-            elif "help" in lower_msg:
-                return "I can help you with your homework, explain difficult concepts, or quiz you on topics you've learned. What are you working on today?"
-            else:
-                return f"That's an interesting question about '{message}'. In a full deployment, I would use my advanced Gemini brain to explain this concept in detail, using the Socratic method to guide you! For now, try asking me about 'polynomials'."
-
         try:
-            # Construct a prompt with history
-            system_instruction = """You are a helpful, patient, and encouraging AI tutor for K-12 students. 
-            Your goal is to help students learn by explaining concepts, providing examples, and guiding them through problems using the Socratic method (ask questions to guide them).
-            
-            IMPORTANT GUIDELINES:
-            1. The student might make spelling mistakes (e.g., "studnet", "speeling"). You MUST understand their intent despite these errors and DO NOT point out the typos unless it's critical for the concept.
-            2. Be concise but partial. Don't give long lectures. Use bullet points if explaining steps.
-            3. If the student asks for the answer, try to guide them first. "What do you think is the first step?"
-            4. Use emojis occasionally to be friendly (e.g., 📚, ✨, 🤔).
-            """
-            
-            # Inject Context if available
-            if context:
-                system_instruction += "\n\nSTUDENT CONTEXT (Use this to personalize your help):"
-                
-                if context.get('first_name'):
-                    system_instruction += f"\n- Student Name: {context['first_name']}"
-                
-                if context.get('recent_low_mastery_topics'):
-                    topics = ", ".join(context['recent_low_mastery_topics'])
-                    system_instruction += f"\n- Topics user is struggling with: {topics}. (Try to relate questions to these if relevant)."
-                
-                if context.get('pending_assignments'):
-                    assignments = ", ".join(context['pending_assignments'])
-                    system_instruction += f"\n- Pending Assignments: {assignments}. (Remind them if they seem off-track)."
-
-            # Simple stateless approach: append history to prompt
-            # In production, use model.start_chat with history, but this works for simple turns
-            full_prompt = system_instruction + "\n\nConversation History:\n"
-            
-            # Limit history to last 5 turns to save context window
-            recent_history = history[-5:] if history else []
-            
-            for msg in recent_history:
-                role = "Student" if msg.get('role') == 'user' else "Tutor"
-                content = msg.get('text', '')
-                full_prompt += f"{role}: {content}\n"
-            
-            full_prompt += f"Student: {message}\nTutor:"
-
-            response = self.model.generate_content(full_prompt)
-            return response.text.strip()
+            return await self.tutor_reply(message, history, context, summary)
         except Exception as e:
             logger.error(f"AI Chat Failed: {str(e)}")
-            return "I'm having trouble connecting to my brain right now. Can you try asking again?"
+            return TUTOR_FALLBACK_REPLY
+
+    async def tutor_reply(self, message: str, history: List[Dict[str, str]] = [], context: Dict[str, Any] = None,
+                          summary: Optional[str] = None) -> str:
+        """Like chat_with_tutor, but raises instead of returning the fallback reply."""
+        prompt = self._build_tutor_prompt(message, history, context, summary)
+        response = await self.gateway.generate(prompt)
+        return response.strip()
+
+    async def stream_tutor_reply(self, message: str, history: List[Dict[str, str]] = [], context: Dict[str, Any] = None,
+                                 summary: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Chat with the AI tutor, yielding the reply as the model produces it.
+        """
+        prompt = self._build_tutor_prompt(message, history, context, summary)
+        async for chunk in self.gateway.stream(prompt):
+            yield chunk
+
+    async def summarize_conversation(self, summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+        """Fold older tutor turns into the running summary of a conversation."""
+        turns = "\n".join(f"{_speaker(msg)}: {msg.get('text', '')}" for msg in messages)
+        prompt = f"""
+        You are keeping notes on a tutoring session so the tutor can continue it later.
+        Update the summary below with the new turns. Keep what the student is working on,
+        what they understood, where they struggled and anything the tutor promised to revisit.
+        Answer with the updated summary only, in under 150 words.
 
-    async def generate_focus_assignment(self, topic: str):
-        """Generates 3 subjective conceptual questions for deep work."""
-        if not settings.GEMINI_API_KEY:
+        Current summary:
+        {summary or "(none yet)"}
+
+        New turns:
+        {turns}
+        """
+        return (await self.gateway.generate(prompt)).strip()
+
+    @staticmethod
+    def _build_tutor_prompt(message: str, history: List[Dict[str, str]] = [], context: Dict[str, Any] = None,
+                            summary: Optional[str] = None) -> str:
+        """Build the tutor prompt from the system instruction, context, summary and history."""
+        context = context or {}
+        parts = [_tutor_system_prefix(
+            context.get('first_name'),
+            tuple(context.get('recent_low_mastery_topics') or ()),
+            tuple(context.get('pending_assignments') or ())
+        )]
+
+        if summary:
+            parts.append(f"\n\nSummary of the earlier conversation:\n{summary}")
+
+        # Most recent turns that fit the token budget, instead of a fixed turn count
+        parts.append("\n\nConversation History:\n")
+        for msg in window_history(history, settings.TUTOR_HISTORY_TOKEN_BUDGET):
+            parts.append(f"{_speaker(msg)}: {msg.get('text', '')}\n")
+
+        parts.append(f"Student: {message}\nTutor:")
+        return "".join(parts)
+
+    async def generate_focus_assignment(self, topic: str, regenerate: bool = False):
+        """Generates 3 subjective conceptual questions for deep work (cached by prompt)."""
+        if self.offline:
             return {
                 "questions": [
                     "What are the core principles of this topic?",
@@ -152,11 +218,15 @@ class AIService:
         Format as JSON: {{ "questions": ["Q1", "Q2", "Q3"] }}
         """
 
+        cached = await self._cached("focus", prompt, regenerate)
+        if cached is not None:
+            return cached
+
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.replace('```json', '').replace('```', '').strip()
-            import json
+            text = await self.gateway.generate(prompt)
+            text = text.replace('```json', '').replace('```', '').strip()
             data = json.loads(text)
+            await self._remember("focus", prompt, data)
             return data
         except Exception as e:
             logger.error(f"Gemini Focus Error: {e}")
@@ -168,9 +238,9 @@ class AIService:
                 ]
             }
 
-    async def generate_assignment_content(self, title: str) -> str:
-        """Generates assignment instruction content based on a title."""
-        if not settings.GEMINI_API_KEY:
+    async def generate_assignment_content(self, title: str, regenerate: bool = False) -> str:
+        """Generates assignment instruction content based on a title (cached by prompt)."""
+        if self.offline:
             return f"[AI GENERATED LESSON PLAN FOR: {title}]\n1. Objective: Understand key concepts of {title}.\n2. Activity: Read relevant chapters and solve problems.\n3. Assessment: Submit your work by the due date.\n(Note: This is a placeholder. Configure GEMINI_API_KEY for real AI generation.)"
 
         prompt = f"""
@@ -184,11 +254,24 @@ class AIService:
         Format as plain text (no markdown symbols like ** or #), using numbered lists and clear sections. Keep it under 200 words.
         """
 
+        cached = await self._cached("lesson_plan", prompt, regenerate)
+        if cached is not None:
+            return cached
+
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            content = (await self.gateway.generate(prompt)).strip()
+            await self._remember("lesson_plan", prompt, content)
+            return content
         except Exception as e:
             logger.error(f"Assignment Gen Error: {e}")
             return f"Failed to generate content for {title}. Please try again."
 
+    async def _cached(self, kind: str, prompt: str, regenerate: bool) -> Any:
+        if regenerate:
+            return None
+        return await get_cached_generation(kind, self.gateway.backend.name, prompt)
+
+    async def _remember(self, kind: str, prompt: str, value: Any) -> None:
+        await cache_generation(kind, self.gateway.backend.name, prompt, value)
+
 ai_service = AIService()
@@ -81,6 +81,8 @@ class AuthService:
         """
         update_data = user_data.model_dump(exclude_unset=True)
         
+        # The authenticated user is a detached, cached copy; update the row
+        user = db.get(User, user.id)
         for key, value in update_data.items():
             setattr(user, key, value)
             
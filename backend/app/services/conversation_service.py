@@ -0,0 +1,220 @@
+"""
+AI tutor conversations kept on the server.
+
+Each turn is appended to the tutor_messages log with its token estimate,
+so the client only sends the new message. The prompt carries the most
+recent turns that fit TUTOR_HISTORY_TOKEN_BUDGET (selected in SQL with a
+running sum) plus a running summary of everything before them.
+
+Once the unsummarized turns outgrow the budget, a background task folds
+the oldest of them into the summary, keeping the newest half-budget
+verbatim. The summary is advanced with a compare-and-set on
+summarized_through, so concurrent summarizers cannot move it backwards.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+from uuid import UUID
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.tutor_conversation import TutorConversation, TutorMessage
+from app.services.llm_gateway import estimate_tokens
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_summarizing: Set[UUID] = set()  # Conversations with a summary task running in this worker
+_tasks: Set[asyncio.Task] = set()
+
+
+class ConversationService:
+    """Service class for server-side tutor conversations."""
+
+    @staticmethod
+    def create(db: Session, student_id: UUID) -> TutorConversation:
+        """Start an empty conversation for a student."""
+        conversation = TutorConversation(student_id=student_id)
+        db.add(conversation)
+        db.commit()
+        db.refresh(conversation)
+        return conversation
+
+    @staticmethod
+    def get_for_student(db: Session, conversation_id: UUID, student_id: UUID) -> TutorConversation:
+        """The student's conversation, or 404 if it does not exist or is someone else's."""
+        conversation = db.query(TutorConversation).filter(
+            TutorConversation.id == conversation_id,
+            TutorConversation.student_id == student_id
+        ).first()
+        if not conversation:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found"
+            )
+        return conversation
+
+    @staticmethod
+    def append(db: Session, conversation_id: UUID, role: str, text: str) -> TutorMessage:
+        """
+        Add a message to the end of the log (flushed, not committed).
+
+        The sequence number comes from an atomic increment of the
+        conversation's message_count, so concurrent turns never collide.
+        """
+        seq = db.execute(
+            update(TutorConversation)
+            .where(TutorConversation.id == conversation_id)
+            .values(message_count=TutorConversation.message_count + 1, updated_at=func.now())
+            .returning(TutorConversation.message_count),
+            execution_options={"synchronize_session": False}
+        ).scalar_one()
+        message = TutorMessage(
+            conversation_id=conversation_id,
+            seq=seq,
+            role=role,
+            text=text,
+            tokens=estimate_tokens(text)
+        )
+        db.add(message)
+        db.flush()
+        return message
+
+    @staticmethod
+    def window(db: Session, conversation: TutorConversation,
+               budget: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        The newest unsummarized messages whose tokens add up to at most
+        `budget` (TUTOR_HISTORY_TOKEN_BUDGET by default), oldest first.
+        """
+        budget = budget or settings.TUTOR_HISTORY_TOKEN_BUDGET
+        tail = select(
+            TutorMessage.seq,
+            TutorMessage.role,
+            TutorMessage.text,
+            TutorMessage.tokens,
+            func.sum(TutorMessage.tokens).over(order_by=TutorMessage.seq.desc()).label("running")
+        ).where(
+            TutorMessage.conversation_id == conversation.id,
+            TutorMessage.seq > conversation.summarized_through
+        ).subquery()
+
+        rows = db.execute(
+            select(tail.c.role, tail.c.text, tail.c.tokens)
+            .where(tail.c.running <= budget)
+            .order_by(tail.c.seq)
+        ).all()
+        return [{"role": role, "text": text, "tokens": tokens} for role, text, tokens in rows]
+
+    @staticmethod
+    def messages(db: Session, conversation: TutorConversation,
+                 after_seq: int = 0, limit: int = 100) -> List[TutorMessage]:
+        """A page of the full log, for a client reloading the conversation."""
+        return db.query(TutorMessage).filter(
+            TutorMessage.conversation_id == conversation.id,
+            TutorMessage.seq > after_seq
+        ).order_by(TutorMessage.seq).limit(limit).all()
+
+    @staticmethod
+    def unsummarized_tokens(db: Session, conversation_id: UUID) -> int:
+        """Tokens in the messages not yet covered by the summary."""
+        return db.query(func.coalesce(func.sum(TutorMessage.tokens), 0)).join(
+            TutorConversation, TutorConversation.id == TutorMessage.conversation_id
+        ).filter(
+            TutorMessage.conversation_id == conversation_id,
+            TutorMessage.seq > TutorConversation.summarized_through
+        ).scalar()
+
+    @staticmethod
+    def store_reply(conversation_id: UUID, text: str) -> int:
+        """
+        Append the tutor's reply in a session of its own (for streamed
+        replies, which finish after the request's session is gone).
+
+        Returns the conversation's unsummarized token count.
+        """
+        db = SessionLocal()
+        try:
+            ConversationService.append(db, conversation_id, "bot", text)
+            db.commit()
+            return ConversationService.unsummarized_tokens(db, conversation_id)
+        finally:
+            db.close()
+
+    @staticmethod
+    def summarize_if_needed(conversation_id: UUID, unsummarized_tokens: int) -> bool:
+        """
+        Schedule a background summary once the unsummarized turns no longer
+        fit the history budget. Must be called from the event loop.
+        """
+        if unsummarized_tokens <= settings.TUTOR_HISTORY_TOKEN_BUDGET or conversation_id in _summarizing:
+            return False
+        _summarizing.add(conversation_id)
+        task = asyncio.get_running_loop().create_task(_summarize(conversation_id))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+        return True
+
+
+async def _summarize(conversation_id: UUID) -> None:
+    from app.services.ai_service import ai_service
+
+    try:
+        job = await asyncio.to_thread(_summary_job, conversation_id)
+        if job is None:
+            return
+        summary, through, older, new_through = job
+        text = await ai_service.summarize_conversation(summary, older)
+        if text:
+            await asyncio.to_thread(_store_summary, conversation_id, through, new_through, text)
+    except Exception as e:
+        logger.warning(f"Tutor conversation summary failed for {conversation_id}: {e}")
+    finally:
+        _summarizing.discard(conversation_id)
+
+
+def _summary_job(conversation_id: UUID):
+    """(summary, summarized_through, messages to fold in, new summarized_through), or None."""
+    db = SessionLocal()
+    try:
+        conversation = db.get(TutorConversation, conversation_id)
+        if conversation is None:
+            return None
+        rows = db.query(TutorMessage.seq, TutorMessage.role, TutorMessage.text, TutorMessage.tokens).filter(
+            TutorMessage.conversation_id == conversation_id,
+            TutorMessage.seq > conversation.summarized_through
+        ).order_by(TutorMessage.seq.desc()).all()
+        summary, through = conversation.summary, conversation.summarized_through
+    finally:
+        db.close()
+
+    # Keep the newest half-budget verbatim so the next summary is a while off
+    kept = 0
+    for index, (_, _, _, tokens) in enumerate(rows):
+        if kept + tokens > settings.TUTOR_HISTORY_TOKEN_BUDGET // 2:
+            break
+        kept += tokens
+    else:
+        return None
+    older = [{"role": role, "text": text} for _, role, text, _ in reversed(rows[index:])]
+    return summary, through, older, rows[index][0]
+
+
+def _store_summary(conversation_id: UUID, through: int, new_through: int, text: str) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(TutorConversation)
+            .where(
+                TutorConversation.id == conversation_id,
+                TutorConversation.summarized_through == through
+            )
+            .values(summary=text, summarized_through=new_through),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+    finally:
+        db.close()
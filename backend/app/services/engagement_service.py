@@ -2,13 +2,20 @@
 Engagement service for tracking and calculating student engagement.
 """
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.models.engagement import EngagementEvent, EngagementIndex, AttendanceRecord
+from app.models.engagement import EngagementEvent, EngagementIndex, AttendanceRecord, EventType
 from app.schemas.engagement import EngagementEventCreate, AttendanceRecordCreate
-from app.ai.engagement_calculator import calculate_engagement_index
+from app.ai.engagement_calculator import calculate_engagement_index, calculate_class_engagement
+from app.ai import engagement_counters
+from app.config import get_settings
 from uuid import UUID
+from typing import Any, Dict, List
 from datetime import datetime, timedelta
 
+settings = get_settings()
+
 class EngagementService:
     @staticmethod
     def log_event(db: Session, event_data: EngagementEventCreate) -> EngagementEvent:
@@ -17,53 +24,203 @@ class EngagementService:
             class_id=event_data.class_id,
             event_type=event_data.event_type,
             engagement_value=event_data.engagement_value,
-            description=event_data.description,
-            metadata_json=event_data.metadata
+            event_data=event_data.metadata
         )
         db.add(db_event)
+        db.flush()
+        db.refresh(db_event)
+        
+        # Event and counters commit together, so the counters never miss a row
+        engagement_counters.record_event(db, db_event)
         db.commit()
         db.refresh(db_event)
         
-        # Trigger re-calculation of index (could be async in production)
-        EngagementService.update_student_index(db, event_data.student_id, event_data.class_id)
+        # Index re-calculation runs in the background; bursts of events coalesce
+        EngagementService.schedule_index_update(event_data.student_id, event_data.class_id)
         
         return db_event
 
     @staticmethod
-    def update_student_index(db: Session, student_id: UUID, class_id: UUID) -> EngagementIndex:
-        # Calculate new index using AI component
-        result = calculate_engagement_index(db, str(student_id), str(class_id))
+    async def log_event_async(db: AsyncSession, event_data: EngagementEventCreate) -> EngagementEvent:
+        """Async variant of log_event; event and counters commit together."""
+        db_event = EngagementEvent(
+            student_id=event_data.student_id,
+            class_id=event_data.class_id,
+            event_type=event_data.event_type,
+            engagement_value=event_data.engagement_value,
+            event_data=event_data.metadata
+        )
+        db.add(db_event)
+        await db.flush()
+        await db.refresh(db_event)
+        
+        await db.run_sync(lambda session: engagement_counters.record_event(session, db_event))
+        await db.commit()
+        
+        EngagementService.schedule_index_update(event_data.student_id, event_data.class_id)
+        
+        return db_event
+
+    @staticmethod
+    async def get_student_indices_async(db: AsyncSession, student_id: UUID) -> List[EngagementIndex]:
+        result = await db.execute(select(EngagementIndex).where(EngagementIndex.student_id == student_id))
+        return result.scalars().all()
+
+    @staticmethod
+    def record_quiz_participation(db: Session, class_id: UUID, participations: List[Dict[str, Any]]) -> int:
+        """
+        Store one QUIZ_PARTICIPATION event per student of a finished live quiz.
+        
+        Args:
+            db: Database session
+            class_id: Class the quiz was run for
+            participations: [{'student_id', 'engagement_value', 'event_data'}]
+            
+        Returns:
+            Number of events written
+        """
+        if not participations:
+            return 0
         
+        class_id = UUID(str(class_id))
+        now = datetime.utcnow()
+        rows = [
+            {
+                'student_id': UUID(str(p['student_id'])),
+                'class_id': class_id,
+                'event_type': EventType.QUIZ_PARTICIPATION,
+                'event_subtype': 'live_quiz',
+                'engagement_value': p.get('engagement_value'),
+                'event_data': p.get('event_data'),
+                'timestamp': now
+            }
+            for p in participations
+        ]
+        for start in range(0, len(rows), settings.QUIZ_EVENT_BATCH_SIZE):
+            db.bulk_insert_mappings(EngagementEvent, rows[start:start + settings.QUIZ_EVENT_BATCH_SIZE])
+        
+        engagement_counters.apply_class_delta(
+            db, class_id, [r['student_id'] for r in rows], now.date(), {'quiz_events': 1}
+        )
+        db.commit()
+        
+        EngagementService.schedule_class_update(class_id)
+        return len(rows)
+
+    @staticmethod
+    def update_student_index(db: Session, student_id: UUID, class_id: UUID) -> EngagementIndex:
         # Check if index record exists
         db_index = db.query(EngagementIndex).filter(
             EngagementIndex.student_id == student_id,
             EngagementIndex.class_id == class_id
         ).first()
         
+        # Calculate new index using AI component
+        if settings.ENGAGEMENT_INCREMENTAL_ENABLED:
+            # O(1): derived from running counters instead of re-scanning the window
+            result = engagement_counters.calculate_engagement_from_counters(
+                db, str(student_id), str(class_id),
+                previous_score=float(db_index.index_score) if db_index else None
+            )
+        else:
+            result = calculate_engagement_index(db, str(student_id), str(class_id))
+        
+        db_index = EngagementService._apply_index_result(db, db_index, student_id, class_id, result)
+        
+        db.commit()
+        db.refresh(db_index)
+        return db_index
+
+    @staticmethod
+    def schedule_index_update(student_id: UUID, class_id: UUID) -> bool:
+        """
+        Queue a background recompute of one student's index.
+        Pending recomputes for the same student and class are coalesced.
+        """
+        from app.jobs import enqueue
+        return enqueue(
+            "engagement.update_index",
+            key=f"{student_id}:{class_id}",
+            student_id=str(student_id),
+            class_id=str(class_id)
+        )
+
+    @staticmethod
+    def schedule_class_update(class_id: UUID) -> bool:
+        """Queue a background recompute of every index in a class."""
+        from app.jobs import enqueue
+        return enqueue("engagement.update_class", key=str(class_id), class_id=str(class_id))
+
+    @staticmethod
+    def update_class_indices(db: Session, class_id: UUID) -> int:
+        """
+        Recalculate and store engagement indices for every enrolled student.
+        Uses the class-level calculator, so the query count is constant
+        regardless of class size (suitable for nightly recomputes).
+        """
+        results = calculate_class_engagement(db, str(class_id))
+        if not results:
+            return 0
+        
+        existing = {
+            str(idx.student_id): idx
+            for idx in db.query(EngagementIndex).filter(EngagementIndex.class_id == class_id).all()
+        }
+        
+        for student_id, result in results.items():
+            EngagementService._apply_index_result(
+                db, existing.get(student_id), UUID(student_id), class_id, result
+            )
+        
+        db.commit()
+        return len(results)
+
+    @staticmethod
+    def _apply_index_result(db: Session, db_index, student_id: UUID, class_id: UUID, result: dict) -> EngagementIndex:
+        """Copy a calculator result onto an existing or new EngagementIndex row."""
+        period_end = datetime.utcnow().date()
+        period_start = period_end - timedelta(days=result['period_days'])
+        
         if db_index:
             db_index.index_score = result['index_score']
             db_index.contributing_factors = result['contributing_factors']
             db_index.trend = result['trend']
             db_index.risk_level = result['risk_level']
             db_index.last_updated = datetime.utcnow()
+            db_index.period_start = period_start
+            db_index.period_end = period_end
         else:
             db_index = EngagementIndex(
                 student_id=student_id,
                 class_id=class_id,
                 index_score=result['index_score'],
                 contributing_factors=result['contributing_factors'],
-                trend=result['trend'],
-                risk_level=result['risk_level']
+                period_start=period_start,
+                period_end=period_end
             )
+            db_index.trend = result['trend']
+            db_index.risk_level = result['risk_level']
+            db_index.last_updated = datetime.utcnow()
             db.add(db_index)
         
-        db.commit()
-        db.refresh(db_index)
         return db_index
 
     @staticmethod
     def get_class_engagement(db: Session, class_id: UUID):
-        return db.query(EngagementIndex).filter(EngagementIndex.class_id == class_id).all()
+        """Live engagement indices for all enrolled students, computed in one pass."""
+        results = calculate_class_engagement(db, str(class_id))
+        return [
+            {
+                'student_id': student_id,
+                'class_id': class_id,
+                'index_score': result['index_score'],
+                'contributing_factors': result['contributing_factors'],
+                'trend': result['trend'],
+                'risk_level': result['risk_level'],
+                'last_updated': result['calculated_at']
+            }
+            for student_id, result in results.items()
+        ]
 
     @staticmethod
     def record_attendance(db: Session, attendance_data: AttendanceRecordCreate) -> AttendanceRecord:
@@ -71,15 +228,18 @@ class EngagementService:
             student_id=attendance_data.student_id,
             class_id=attendance_data.class_id,
             date=attendance_data.date.date(),
-            status=attendance_data.status,
-            note=attendance_data.note
+            status=attendance_data.status
         )
         db.add(db_attendance)
+        db.flush()
+        
+        # Record and counters commit together, so the counters never miss a row
+        engagement_counters.record_attendance(db, db_attendance)
         db.commit()
         db.refresh(db_attendance)
         
         # Update index since attendance is a factor
-        EngagementService.update_student_index(db, attendance_data.student_id, attendance_data.class_id)
+        EngagementService.schedule_index_update(attendance_data.student_id, attendance_data.class_id)
         
         return db_attendance
     
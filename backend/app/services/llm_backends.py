@@ -0,0 +1,170 @@
+"""
+Text-generation backends for the AI services.
+
+Backends (AI_BACKEND):
+- gemini: google.generativeai. The SDK is blocking, so calls run on a
+  bounded pool of AI_WORKER_THREADS threads and streamed chunks are
+  handed back to the event loop.
+- stub: canned tutor replies streamed word by word with an artificial
+  per-token delay, and synthetic multiple-choice questions for quiz
+  prompts, for offline development and load tests.
+- auto: gemini when GEMINI_API_KEY is set, otherwise stub. Quiz
+  generation then fails as unconfigured; synthetic questions are only
+  served when AI_BACKEND=stub is set explicitly.
+
+Callers go through app.services.llm_gateway rather than using a backend
+directly.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_END = object()
+_executor = ThreadPoolExecutor(max_workers=settings.AI_WORKER_THREADS, thread_name_prefix="llm")
+
+
+class LLMBackend:
+    """Interface implemented by every text-generation backend."""
+
+    name = "base"
+    max_concurrency = 8  # Calls the gateway lets through at once
+
+    async def generate(self, prompt: str) -> str:
+        """Return the whole completion for prompt."""
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the completion for prompt as it is produced."""
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, model_name: str = "gemini-1.5-flash"):
+        import google.generativeai as genai
+        if settings.GEMINI_API_KEY:
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+        self.model = genai.GenerativeModel(model_name)
+        self.max_concurrency = settings.AI_GEMINI_MAX_CONCURRENCY
+
+    async def generate(self, prompt: str) -> str:
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(_executor, self.model.generate_content, prompt)
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True):
+                    if cancelled.is_set():
+                        break
+                    if chunk.text:
+                        loop.call_soon_threadsafe(chunks.put_nowait, chunk.text)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, _END)
+
+        loop.run_in_executor(_executor, produce)
+        try:
+            while True:
+                item = await chunks.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # The client may have gone away mid-stream; stop pulling chunks
+            cancelled.set()
+
+
+class StubBackend(LLMBackend):
+    """Streams canned tutor replies; never leaves the process."""
+
+    name = "stub"
+    max_concurrency = 256
+
+    def __init__(self, token_delay_ms: int = 30):
+        self.token_delay = token_delay_ms / 1000
+
+    async def generate(self, prompt: str) -> str:
+        return "".join([token async for token in self.stream(prompt)])
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        words = self.reply_for(prompt).split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+    @staticmethod
+    def reply_for(prompt: str) -> str:
+        """Pick a canned reply from the last student turn in the prompt."""
+        quiz = _QUIZ_PROMPT.search(prompt)
+        if quiz:
+            return StubBackend.quiz_for(int(quiz.group(1)), quiz.group(2), quiz.group(3))
+
+        message = prompt
+        if "Student:" in prompt:
+            message = prompt.rsplit("Student:", 1)[1].split("\nTutor:", 1)[0].strip()
+
+        lower_msg = message.lower()
+        if "polynomial" in lower_msg:
+            return "A polynomial equation is an equation involving a sum of powers in one or more variables multiplied by coefficients. For example, 2x² + 3x - 5 = 0. Would you like to try solving a simple one?"
+        elif "quadratic" in lower_msg or "quadractic" in lower_msg:
+            return "A quadratic equation is a polynomial equation of degree 2, usually in the form ax² + bx + c = 0. The solutions are found using the quadratic formula: x = (-b ± √(b² - 4ac)) / 2a. Want to see an example?"
+        elif "hello" in lower_msg or "hi" in lower_msg:
+            return "Hello there! I'm your AI Tutor. I'm running in Demo Mode right now, but I can still help you understand how this platform works! 🚀"
+        elif "help" in lower_msg:
+            return "I can help you with your homework, explain difficult concepts, or quiz you on topics you've learned. What are you working on today?"
+        else:
+            return f"That's an interesting question about '{message}'. In a full deployment, I would use my advanced Gemini brain to explain this concept in detail, using the Socratic method to guide you! For now, try asking me about 'polynomials'."
+
+
+    @staticmethod
+    def quiz_for(count: int, topic: str, difficulty: str) -> str:
+        """JSON array of distinct, well-formed placeholder questions."""
+        questions = []
+        for _ in range(count):
+            tag = uuid.uuid4().hex[:8]
+            correct = random.choice("ABCD")
+            questions.append({
+                "question_text": f"[{difficulty}] Practice question {tag} on {topic}: which option is correct?",
+                "options": {k: ("Correct answer" if k == correct else f"Distractor {k}") for k in "ABCD"},
+                "correct_answer": correct
+            })
+        return json.dumps(questions)
+
+
+_QUIZ_PROMPT = re.compile(r'Generate (\d+) multiple-choice quiz questions about "(.*?)" at a (\w+) difficulty')
+_backend: Optional[LLMBackend] = None
+
+
+def get_llm_backend() -> LLMBackend:
+    """Select the backend once, from AI_BACKEND."""
+    global _backend
+    if _backend is None:
+        _backend = _create_backend(settings.AI_BACKEND)
+    return _backend
+
+
+def _create_backend(kind: str) -> LLMBackend:
+    if kind == "stub" or (kind == "auto" and not settings.GEMINI_API_KEY):
+        return StubBackend(settings.AI_STUB_TOKEN_DELAY_MS)
+    return GeminiBackend()
@@ -0,0 +1,306 @@
+"""
+LLM gateway.
+
+Every call to a text-generation backend goes through here, so the
+application gets in one place:
+- a concurrency cap per backend (extra callers wait in a queue)
+- a per-call timeout (per chunk when streaming)
+- a circuit breaker that fails fast after repeated backend errors
+- single-flight coalescing: identical prompts already in flight share
+  one backend call instead of each sending their own
+- latency, queue-depth and token-count metrics per backend
+
+Blocking SDK calls run on the bounded worker pool of app.services.llm_backends.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from app.config import get_settings
+from app.services.llm_backends import LLMBackend, get_llm_backend
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(Exception):
+    """The backend timed out, failed, or its circuit breaker is open."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+class BackendStats:
+    SAMPLE_SIZE = 500
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.wait_ms = deque(maxlen=self.SAMPLE_SIZE)
+        self.run_ms = deque(maxlen=self.SAMPLE_SIZE)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'max_queued': self.max_queued,
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'failed': self.failed,
+            'timed_out': self.timed_out,
+            'rejected': self.rejected,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'wait_ms': _summarize(self.wait_ms),
+            'run_ms': _summarize(self.run_ms)
+        }
+
+
+def _summarize(samples) -> Dict[str, float]:
+    if not samples:
+        return {'avg': 0, 'p95': 0, 'max': 0}
+    ordered = sorted(samples)
+    return {
+        'avg': round(sum(ordered) / len(ordered), 2),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        'max': round(ordered[-1], 2)
+    }
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures. While open, calls are
+    rejected until `reset_seconds` have passed; then one trial call is let
+    through, and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        # A trial abandoned without an outcome (e.g. cancelled) expires too
+        now = time.monotonic()
+        if state == "half_open" and (self._trial_started is None or now - self._trial_started >= self.reset_seconds):
+            self._trial_started = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_started is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._trial_started = None
+
+
+class LLMGateway:
+    """Admission control, coalescing and metrics around an LLMBackend."""
+
+    def __init__(self, backend: Optional[LLMBackend] = None):
+        self._backend = backend
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, BackendStats] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> LLMBackend:
+        if self._backend is None:
+            self._backend = get_llm_backend()
+        return self._backend
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """
+        Return the completion for prompt.
+
+        Concurrent calls with the same prompt share one backend call.
+
+        Raises:
+            LLMUnavailableError: On timeout, backend error or open breaker
+        """
+        backend = self.backend
+        key = f"{backend.name}:{hashlib.sha256(prompt.encode()).hexdigest()}"
+        stats = self._stats_for(backend)
+
+        shared = self._in_flight.get(key)
+        if shared is not None:
+            stats.coalesced += 1
+            return await asyncio.shield(shared)
+
+        task = asyncio.ensure_future(self._call(backend, prompt, timeout))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # A caller that gives up must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def stream(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Yield the completion for prompt as it is produced.
+
+        The timeout applies to each chunk, not to the whole reply.
+
+        Raises:
+            LLMUnavailableError: On timeout, backend error or open breaker
+        """
+        backend = self.backend
+        timeout = timeout or settings.AI_TIMEOUT_SECONDS
+        stats = self._stats_for(backend)
+        breaker = self._breaker_for(backend)
+
+        async with self._admit(backend, stats, breaker):
+            started = time.monotonic()
+            completion_chars = 0
+            chunks = backend.stream(prompt).__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    completion_chars += len(chunk)
+                    yield chunk
+            except asyncio.TimeoutError:
+                self._record_failure(backend, stats, breaker, timed_out=True)
+                raise LLMUnavailableError(f"{backend.name} stream stalled for {timeout}s")
+            except Exception as e:
+                self._record_failure(backend, stats, breaker)
+                raise LLMUnavailableError(f"{backend.name} stream failed: {e}") from e
+            finally:
+                await chunks.aclose()
+
+            breaker.record_success()
+            stats.run_ms.append((time.monotonic() - started) * 1000)
+            stats.prompt_tokens += estimate_tokens(prompt)
+            stats.completion_tokens += (completion_chars + 3) // 4
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-backend concurrency, latency, token and breaker figures."""
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                result[name] = stats.snapshot()
+                result[name]['breaker'] = self._breakers[name].state
+            return result
+
+    async def _call(self, backend: LLMBackend, prompt: str, timeout: Optional[float]) -> str:
+        timeout = timeout or settings.AI_TIMEOUT_SECONDS
+        stats = self._stats_for(backend)
+        breaker = self._breaker_for(backend)
+
+        async with self._admit(backend, stats, breaker):
+            started = time.monotonic()
+            try:
+                text = await asyncio.wait_for(backend.generate(prompt), timeout)
+            except asyncio.TimeoutError:
+                self._record_failure(backend, stats, breaker, timed_out=True)
+                raise LLMUnavailableError(f"{backend.name} did not answer within {timeout}s")
+            except Exception as e:
+                self._record_failure(backend, stats, breaker)
+                raise LLMUnavailableError(f"{backend.name} call failed: {e}") from e
+
+            breaker.record_success()
+            stats.run_ms.append((time.monotonic() - started) * 1000)
+            stats.prompt_tokens += estimate_tokens(prompt)
+            stats.completion_tokens += estimate_tokens(text)
+            return text
+
+    @asynccontextmanager
+    async def _admit(self, backend: LLMBackend, stats: BackendStats, breaker: CircuitBreaker):
+        if not breaker.allow():
+            stats.rejected += 1
+            raise LLMUnavailableError(f"{backend.name} circuit breaker is open")
+
+        semaphore = self._semaphore_for(backend)
+        queued_at = time.monotonic()
+        stats.queued += 1
+        stats.max_queued = max(stats.max_queued, stats.queued)
+        try:
+            await semaphore.acquire()
+        finally:
+            stats.queued -= 1
+        stats.wait_ms.append((time.monotonic() - queued_at) * 1000)
+        stats.calls += 1
+        stats.in_flight += 1
+        try:
+            yield
+        finally:
+            stats.in_flight -= 1
+            semaphore.release()
+
+    def _record_failure(self, backend: LLMBackend, stats: BackendStats, breaker: CircuitBreaker,
+                        timed_out: bool = False) -> None:
+        if timed_out:
+            stats.timed_out += 1
+        else:
+            stats.failed += 1
+        breaker.record_failure()
+        if breaker.state == "open":
+            logger.warning(f"LLM backend {backend.name} circuit opened after {breaker.failures} failures")
+
+    def _stats_for(self, backend: LLMBackend) -> BackendStats:
+        with self._lock:
+            stats = self._stats.get(backend.name)
+            if stats is None:
+                stats = BackendStats(backend.max_concurrency)
+                self._stats[backend.name] = stats
+            return stats
+
+    def _breaker_for(self, backend: LLMBackend) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(backend.name)
+            if breaker is None:
+                breaker = CircuitBreaker(settings.AI_BREAKER_FAILURES, settings.AI_BREAKER_RESET_SECONDS)
+                self._breakers[backend.name] = breaker
+            return breaker
+
+    def _semaphore_for(self, backend: LLMBackend) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(backend.name)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(backend.max_concurrency)
+            self._semaphores[backend.name] = semaphore
+        return semaphore
+
+
+llm_gateway = LLMGateway()
+
+
+def get_llm_metrics() -> Dict[str, Dict[str, Any]]:
+    """Per-backend metrics of this worker's LLM gateway."""
+    return llm_gateway.metrics()
@@ -3,7 +3,9 @@ Mastery service for managing adaptive assignments and student learning progress.
 """
 
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from app.models.assignment import (
     Assignment, 
     AssignmentQuestion, 
@@ -15,10 +17,16 @@ from app.models.assignment import (
     QuestionDifficulty
 )
 from app.schemas.mastery import AssignmentCreate, SubmissionCreate
-from app.ai.assignment_generator import generate_adaptive_assignment
+from app.ai.assignment_generator import generate_adaptive_assignment, generate_adaptive_assignments_for_class
+from app.ai.mastery_scorer import update_mastery_batch
+from app.ai import engagement_counters
+from app.services.engagement_service import EngagementService
 from uuid import UUID
 from datetime import datetime
 
+# Per-answer time used for grading until the client reports real timings
+DEFAULT_RESPONSE_SECONDS = 30
+
 class MasteryService:
     @staticmethod
     def create_adaptive_assignment(db: Session, student_id: UUID, class_id: UUID) -> Assignment:
@@ -41,11 +49,40 @@ class MasteryService:
         
         return db_assignment
 
+    @staticmethod
+    def create_adaptive_assignments_for_class(db: Session, class_id: UUID, teacher_id: UUID) -> dict:
+        """
+        Create a personalized adaptive assignment for every enrolled student
+        in one transaction.
+        """
+        result = generate_adaptive_assignments_for_class(
+            db=db,
+            class_id=str(class_id),
+            teacher_id=str(teacher_id)
+        )
+        
+        # Assignment counts feed the engagement index
+        if result['assignments_created']:
+            EngagementService.schedule_class_update(class_id)
+        
+        return result
+
     @staticmethod
     def get_student_assignments(db: Session, student_id: UUID) -> List[Assignment]:
         # Get assignments assigned to this student via StudentAssignment join
         return db.query(Assignment).join(StudentAssignment).filter(StudentAssignment.student_id == student_id).all()
 
+    @staticmethod
+    async def get_student_assignments_async(db: AsyncSession, student_id: UUID) -> List[Assignment]:
+        # Questions are eager-loaded: lazy loads are not allowed on an async session
+        result = await db.execute(
+            select(Assignment)
+            .join(StudentAssignment)
+            .where(StudentAssignment.student_id == student_id)
+            .options(selectinload(Assignment.questions))
+        )
+        return result.scalars().all()
+
     @staticmethod
     def get_assignment_for_solving(db: Session, student_id: UUID, assignment_id: UUID) -> Assignment:
         """
@@ -74,50 +111,72 @@ class MasteryService:
         if not sa:
             return None
             
-        # 2. Auto-grading
-        correct_count = 0
-        total_questions = len(submission_data.answers)
-        
-        # 3. Save individual responses and grade
+        # 2. Load every answered question of this assignment in one query;
+        # keys that are not question IDs are ignored
+        answers = {}
         for q_id, ans in submission_data.answers.items():
-            question = db.query(AssignmentQuestion).filter(AssignmentQuestion.id == UUID(q_id)).first()
-            is_correct = False
-            if question and question.correct_answer == ans:
-                is_correct = True
+            try:
+                answers[UUID(q_id)] = ans
+            except ValueError:
+                continue
+        questions = {
+            q.id: q for q in db.query(AssignmentQuestion).filter(
+                AssignmentQuestion.assignment_id == sa.assignment_id,
+                AssignmentQuestion.id.in_(list(answers.keys()))
+            ).all()
+        } if answers else {}
+        
+        # 3. Grade in memory, bulk-insert responses, group evidence by concept
+        correct_count = 0
+        total_questions = len(answers)
+        responses = []
+        evidence = {}
+        for q_id, ans in answers.items():
+            question = questions.get(q_id)
+            if not question:
+                continue
+            is_correct = question.correct_answer == ans
+            if is_correct:
                 correct_count += 1
-                
-            db_resp = StudentResponse(
-                student_assignment_id=sa.id,
-                question_id=UUID(q_id),
-                response_text=str(ans),
-                is_correct=is_correct,
-                points_earned=1.0 if is_correct else 0.0,
-                time_spent_seconds=30 # Simplified
-            )
-            db.add(db_resp)
+            
+            responses.append({
+                'student_assignment_id': sa.id,
+                'question_id': q_id,
+                'response_text': str(ans),
+                'is_correct': is_correct,
+                'points_earned': 1.0 if is_correct else 0.0,
+                'time_spent_seconds': DEFAULT_RESPONSE_SECONDS,
+                'answered_at': datetime.utcnow()
+            })
+            if question.concept_id:
+                evidence.setdefault(question.concept_id, []).append(
+                    (is_correct, question.difficulty, DEFAULT_RESPONSE_SECONDS)
+                )
+        
+        if responses:
+            db.bulk_insert_mappings(StudentResponse, responses)
             
         score = (correct_count / total_questions * 100) if total_questions > 0 else 0
         
-        # 4. Update status and mastery (simplified boost)
+        # 4. Update status, then mastery once per concept the questions covered
+        previous_status, previous_submitted_at = sa.status, sa.submitted_at
         sa.status = AssignmentStatus.SUBMITTED
         sa.submitted_at = datetime.utcnow()
+        db.flush()
+        engagement_counters.record_assignment_status_change(db, sa, previous_status, previous_submitted_at)
         
-        # Mocking a mastery boost for the first concept covered if correct count > 0
-        if correct_count > 0:
-            from app.models.assignment import StudentMastery
-            # Simplified: just update any existing mastery record for this student
-            mastery = db.query(StudentMastery).filter(StudentMastery.student_id == student_id).first()
-            if mastery:
-                mastery.mastery_level = min(100, float(mastery.mastery_level) + (correct_count * 2.5))
-                mastery.last_practiced = datetime.utcnow()
-                mastery.attempts += 1
+        mastery_updates = update_mastery_batch(db, student_id, evidence)
         
         db.commit()
         db.refresh(sa)
         
+        # Submission status feeds the engagement index; recompute off the request path
+        if sa.assignment and sa.assignment.class_id:
+            EngagementService.schedule_index_update(student_id, sa.assignment.class_id)
+        
         # Attach transient fields for Pydantic serialization
         sa.score = score
-        sa.mastery_gain = (correct_count * 2.5) if correct_count > 0 else 0.0
+        sa.mastery_gain = round(sum(u['change'] for u in mastery_updates.values()), 2)
         
         return sa
 
@@ -125,6 +184,11 @@ class MasteryService:
     def get_mastery_profile(db: Session, student_id: UUID) -> List[StudentMastery]:
         return db.query(StudentMastery).filter(StudentMastery.student_id == student_id).all()
 
+    @staticmethod
+    async def get_mastery_profile_async(db: AsyncSession, student_id: UUID) -> List[StudentMastery]:
+        result = await db.execute(select(StudentMastery).where(StudentMastery.student_id == student_id))
+        return result.scalars().all()
+
     @staticmethod
     def get_pending_submissions(db: Session, teacher_id: UUID) -> List[StudentAssignment]:
         """Get all standard assignments that need grading for this teacher."""
@@ -142,7 +206,10 @@ class MasteryService:
             return None
 
         # Update assignment status
+        previous_status = sa.status
         sa.status = AssignmentStatus.GRADED
+        db.flush()
+        engagement_counters.record_assignment_status_change(db, sa, previous_status, sa.submitted_at)
         
         # Simplified: We treat the whole assignment score here, 
         # but normally we'd grade individual questions.
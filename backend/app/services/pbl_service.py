@@ -8,7 +8,7 @@ from app.models.project import (
     EvaluatorType, ProjectEvaluation
 )
 from app.models.class_model import Enrollment
-from app.models.notification import Notification, NotificationType
+from app.jobs import enqueue
 from app.schemas.project import ProjectCreate, ProjectSubmissionCreate
 
 class PBLService:
@@ -74,47 +74,22 @@ class PBLService:
                 )
                 db.add(db_criterion)
         
-        # Assign project to students and notify them
-        if project_data.class_id:
-            from uuid import UUID as UUIDType
-            class_uuid = project_data.class_id if isinstance(project_data.class_id, UUIDType) else UUIDType(project_data.class_id)
-            enrollments = db.query(Enrollment).filter(Enrollment.class_id == class_uuid).all()
-            for enrollment in enrollments:
-                # Create ProjectAssignment
-                assignment = ProjectAssignment(
-                    project_id=db_project.id,
-                    student_id=enrollment.student_id
-                )
-                db.add(assignment)
-                
-                # Create Notification
-                notification = Notification(
-                    recipient_id=enrollment.student_id,
-                    title="New Project Assigned",
-                    message=f"You have been assigned a new project: {db_project.title}",
-                    type=NotificationType.ASSIGNMENT,
-                    reference_id=db_project.id
-                )
-                db.add(notification)
-        
-        
-        # Create Google Calendar Event
-        try:
-            from app.services.google_service import google_service
-            if project_data.start_date and project_data.end_date:
-                print(f"[CALENDAR] Creating event for project: {db_project.title}")
-                google_service.create_calendar_event(
-                    summary=f"Project Due: {db_project.title}",
-                    description=db_project.description or "Project Deadline",
-                    start_time=project_data.start_date, # Assuming these are datetime objects
-                    end_time=project_data.end_date 
-                )
-        except Exception as e:
-            print(f"[CALENDAR] Failed to create calendar event: {e}")
-            # Continue without failing the project creation
+        # Assign project to students; notifications and calendar follow in the background
+        if class_uuid:
+            enrollments = db.query(Enrollment.student_id).filter(Enrollment.class_id == class_uuid).all()
+            db.add_all([
+                ProjectAssignment(project_id=db_project.id, student_id=enrollment.student_id)
+                for enrollment in enrollments
+            ])
         
         db.commit()
         db.refresh(db_project)
+        
+        project_id = str(db_project.id)
+        if class_uuid:
+            enqueue("notifications.project_assigned", key=project_id, project_id=project_id)
+        if db_project.start_date and db_project.end_date:
+            enqueue("integrations.project_calendar_event", key=project_id, project_id=project_id)
         return db_project
 
     @staticmethod
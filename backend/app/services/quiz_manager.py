@@ -1,141 +1,628 @@
 import asyncio
-from typing import Dict, List, Optional
-from uuid import UUID, uuid4
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
 from fastapi import WebSocket
+from app.services.quiz_store import QuizStore, get_quiz_store
+from app.database import SessionLocal
+from app.utils.security import create_quiz_resume_token
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Event targets
+ALL = "all"
+HOST = "host"
+STUDENTS = "students"
+
+LOBBY_UPDATE = "lobby_update"
+
+# Queue marker for "send the latest lobby frame" (see QuizConnection.send)
+_LOBBY_SLOT = object()
+
+# Close code for sockets that cannot keep up ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def score_answer(is_correct: bool, elapsed_seconds: float, time_limit_seconds: float) -> int:
+    """Base points for a correct answer plus a bonus for the share of time left."""
+    if not is_correct:
+        return 0
+    remaining = max(0.0, 1 - elapsed_seconds / time_limit_seconds) if time_limit_seconds > 0 else 0.0
+    return settings.QUIZ_BASE_POINTS + round(settings.QUIZ_SPEED_BONUS_POINTS * remaining)
+
+
+def encode_frame(message: dict) -> str:
+    """Serialize a message once; the same text is sent to every socket."""
+    return json.dumps(message, separators=(",", ":"))
+
+
+class QuizConnection:
+    """A WebSocket with a bounded outbound queue drained by its own task.
+
+    Broadcasting only enqueues pre-serialized frames, so one slow socket
+    never delays the others. lobby_update frames are coalesced: at most one
+    is pending, and if another arrives before it is sent, both are replaced
+    by a fresh lobby snapshot built when the writer gets to it. Any other
+    frame that finds the queue full evicts the connection.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        lobby_snapshot: Optional[Callable[[], Awaitable[str]]] = None,
+        on_evict: Optional[Callable[["QuizConnection"], None]] = None,
+        queue_size: int = None
+    ):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or settings.QUIZ_SEND_QUEUE_SIZE)
+        self.coalesced = 0
+        self.evicted = False
+        self._lobby_snapshot = lobby_snapshot
+        self._on_evict = on_evict
+        self._lobby_frame: Optional[str] = None
+        self._lobby_pending = False
+        self._writer = asyncio.create_task(self._drain())
+
+    def send(self, frame: str, coalesce: bool = False) -> bool:
+        """Queue a frame without waiting; False if the connection is gone."""
+        if self.evicted or self._writer.done():
+            return False
+
+        if coalesce:
+            if self._lobby_pending:
+                # Behind on lobby updates: send one snapshot instead of the backlog
+                self._lobby_frame = None
+                self.coalesced += 1
+                return True
+            self._lobby_frame = frame
+            self._lobby_pending = True
+            frame = _LOBBY_SLOT
+
+        if self.queue.full():
+            self.evict()
+            return False
+        self.queue.put_nowait(frame)
+        return True
+
+    async def _drain(self) -> None:
+        try:
+            while True:
+                frame = await self.queue.get()
+                if frame is _LOBBY_SLOT:
+                    frame, self._lobby_frame, self._lobby_pending = self._lobby_frame, None, False
+                    if frame is None:
+                        if self._lobby_snapshot is None:
+                            continue
+                        frame = await self._lobby_snapshot()
+                await self.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass  # Disconnected; the receive loop cleans up
+
+    def evict(self) -> None:
+        """Drop a connection whose queue overflowed."""
+        if self.evicted:
+            return
+        self.evicted = True
+        self._writer.cancel()
+        if self._on_evict:
+            self._on_evict(self)
+        # The receive loop sees the disconnect and runs the normal cleanup
+        asyncio.create_task(self._close(SLOW_CONSUMER_CLOSE_CODE))
+
+    async def _close(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        self._writer.cancel()
+
 
 class QuizSession:
-    def __init__(self, quiz_id: str, host_id: str, title: str):
+    """This worker's view of a quiz: shared state in the store, local sockets here."""
+
+    def __init__(self, quiz_id: str, store: QuizStore, meta: Dict[str, Any]):
         self.quiz_id = quiz_id
-        self.host_id = host_id
-        self.title = title
-        self.is_active = True
-        self.current_question_index = -1
-        self.students: Dict[str, Dict] = {}  # student_id -> {name, score, connection}
-        self.host_connection: Optional[WebSocket] = None
-        self.questions = []  # List of question objects
-
-    async def connect_student(self, student_id: str, name: str, websocket: WebSocket):
+        self.store = store
+        self.host_id = meta.get("host_id")
+        self.title = meta.get("title")
+        self.is_active = meta.get("is_active", True)
+        self.class_id = meta.get("class_id")
+        self.current_question_index = meta.get("current_question_index", -1)
+        self.question_started_at: Optional[float] = meta.get("question_started_at")  # Server epoch seconds
+        self.questions: List[dict] = []
+        self.connections: Dict[str, QuizConnection] = {}  # student_id -> connection on this worker
+        self.host_connection: Optional[QuizConnection] = None
+        self.local_refs = 0  # Sockets on this worker using this view
+        self.evictions = 0
+        self.user_ids: Dict[str, str] = {}  # student_id -> authenticated user id (local sockets)
+        self._leaderboard: Dict[str, tuple] = {}  # Last top-N pushed to the host: id -> (rank, score)
+
+        # Lobby changes made on this worker since the last flush
+        self._joined: Dict[str, Dict[str, Any]] = {}
+        self._left: set = set()
+        self._lobby_flush: Optional[asyncio.Task] = None
+        self._lobby_version = 0
+        self._snapshot: Optional[tuple] = None  # (lobby version, frame)
+
+    def _connection(self, websocket: WebSocket, queue_size: int = None) -> QuizConnection:
+        return QuizConnection(
+            websocket, lobby_snapshot=self.lobby_snapshot, on_evict=self._count_eviction, queue_size=queue_size
+        )
+
+    def _count_eviction(self, connection: QuizConnection) -> None:
+        self.evictions += 1
+
+    @property
+    def started(self) -> bool:
+        return self.current_question_index >= 0
+
+    def _joined_frame(self, student_id: Optional[str], role: str, name: Optional[str] = None,
+                      user_id: Optional[str] = None) -> str:
+        """Tell a client its slot and the token that reattaches it after a drop."""
+        token = create_quiz_resume_token({
+            "quiz_id": self.quiz_id, "sid": student_id, "role": role, "name": name, "user_id": user_id
+        })
+        return encode_frame({"type": "session_joined", "student_id": student_id, "resume_token": token})
+
+    def _set_student_connection(self, student_id: str, connection: QuizConnection, user_id: Optional[str]) -> None:
+        previous = self.connections.get(student_id)
+        if previous:
+            previous.close()
+        self.connections[student_id] = connection
+        if user_id:
+            self.user_ids[student_id] = user_id
+
+    def _set_host_connection(self, connection: QuizConnection) -> None:
+        if self.host_connection:
+            self.host_connection.close()
+        self.host_connection = connection
+
+    async def connect_student(
+        self, student_id: str, name: str, websocket: WebSocket, user_id: Optional[str] = None
+    ) -> QuizConnection:
         await websocket.accept()
-        self.students[student_id] = {
-            "name": name,
-            "score": 0,
-            "connection": websocket,
-            "answers": {}
-        }
-        await self.broadcast_lobby_state()
+        connection = self._connection(websocket)
+        self._set_student_connection(student_id, connection, user_id)
+        await self.store.add_player(self.quiz_id, student_id, name)
+        connection.send(self._joined_frame(student_id, "student", name, user_id))
+        # The newcomer gets the (cached) full lobby; everyone, newcomer
+        # included, sees the join in the next diff
+        connection.send(await self.lobby_snapshot(), coalesce=True)
+        self._lobby_changed(joined={"id": student_id, "name": name, "score": 0})
+        return connection
+
+    async def resume_student(
+        self, student_id: str, name: str, websocket: WebSocket, user_id: Optional[str] = None
+    ) -> QuizConnection:
+        """Reattach a student to their slot; they get the current state, not the lobby."""
+        if not self.started or not await self.store.has_player(self.quiz_id, student_id):
+            # Still in the lobby, or the slot is gone: join again under the same id
+            return await self.connect_student(student_id, name, websocket, user_id)
 
-    async def connect_host(self, websocket: WebSocket):
         await websocket.accept()
-        self.host_connection = websocket
-        await self.broadcast_lobby_state()
+        connection = self._connection(websocket)
+        self._set_student_connection(student_id, connection, user_id)
+        connection.send(encode_frame(await self._resume_state(student_id)))
+        return connection
 
-    def disconnect_student(self, student_id: str):
-        if student_id in self.students:
-            del self.students[student_id]
+    async def connect_host(self, websocket: WebSocket) -> QuizConnection:
+        await websocket.accept()
+        connection = self._connection(websocket, settings.QUIZ_HOST_SEND_QUEUE_SIZE)
+        self._set_host_connection(connection)
+        connection.send(self._joined_frame(None, "host"))
+        connection.send(await self.lobby_snapshot(), coalesce=True)
+        return connection
 
-    async def broadcast_lobby_state(self):
-        """Send current player list to host and all students."""
+    async def resume_host(self, websocket: WebSocket) -> QuizConnection:
+        """Reattach the host; they get the current question and leaderboard."""
+        if not self.started:
+            return await self.connect_host(websocket)
+
+        await websocket.accept()
+        connection = self._connection(websocket, settings.QUIZ_HOST_SEND_QUEUE_SIZE)
+        self._set_host_connection(connection)
+        connection.send(encode_frame(await self._resume_state(None)))
+        return connection
+
+    async def _resume_state(self, student_id: Optional[str]) -> Dict[str, Any]:
+        """Snapshot of where the quiz is, for a reattaching student or host."""
+        questions = await self._load_questions()
+        index = self.current_question_index
+        state = {
+            "type": "resumed",
+            "is_active": self.is_active,
+            "current_index": index,
+            "total_questions": len(questions),
+            "total_players": await self.store.count_players(self.quiz_id)
+        }
+        if 0 <= index < len(questions):
+            question = questions[index]
+            state.update({
+                "question": question if student_id is None else {k: v for k, v in question.items() if k != "correct_answer"},
+                "time_limit": question.get("time_limit") or settings.QUIZ_QUESTION_TIME_LIMIT_SECONDS,
+                "started_at": self.question_started_at
+            })
+
+        if student_id is None:
+            top = await self.store.leaderboard(self.quiz_id, settings.QUIZ_LEADERBOARD_SIZE)
+            state["leaderboard"] = [{**entry, "rank": rank} for rank, entry in enumerate(top, 1)]
+            self._leaderboard = {entry["id"]: (rank, entry["score"]) for rank, entry in enumerate(top, 1)}
+        else:
+            state["student_id"] = student_id
+            state["answered"] = await self.store.has_answered(self.quiz_id, student_id, index)
+            position = await self.store.rank(self.quiz_id, student_id)
+            if position:
+                state["rank"], state["score"] = position
+        return state
+
+    async def disconnect_student(self, student_id: str, connection: Optional[QuizConnection] = None):
+        current = self.connections.get(student_id)
+        if connection is not None and current is not connection:
+            # Superseded by a resumed socket; leave the slot alone
+            connection.close()
+            return
+        self.connections.pop(student_id, None)
+        self.user_ids.pop(student_id, None)
+        if current:
+            current.close()
+        if self.started:
+            # Keep the slot (score and answers) so the student can resume
+            return
+        await self.store.remove_player(self.quiz_id, student_id)
+        self._lobby_changed(left=student_id)
+
+    def disconnect_host(self, connection: Optional[QuizConnection] = None):
+        if connection is not None and self.host_connection is not connection:
+            connection.close()
+            return
+        if self.host_connection:
+            self.host_connection.close()
+            self.host_connection = None
+
+    async def lobby_snapshot(self, fresh: bool = False) -> str:
+        """Full lobby frame, cached until the next lobby update is seen."""
+        if not fresh and self._snapshot and self._snapshot[0] == self._lobby_version:
+            return self._snapshot[1]
+
+        players = await self.store.get_players(self.quiz_id)
         player_list = [
-            {"id": sid, "name": s["name"], "score": s["score"]}
-            for sid, s in self.students.items()
+            {"id": sid, "name": p["name"], "score": p["score"]}
+            for sid, p in players.items()
         ]
-        
-        message = {
-            "type": "lobby_update",
+        frame = encode_frame({
+            "type": LOBBY_UPDATE,
             "players": player_list,
             "count": len(player_list)
-        }
-        
-        await self.broadcast(message)
+        })
+        self._snapshot = (self._lobby_version, frame)
+        return frame
 
-    async def broadcast(self, message: dict):
-        """Send message to everyone in the session."""
-        # Send to host
-        if self.host_connection:
-            try:
-                await self.host_connection.send_json(message)
-            except:
-                pass # Handle disconnection gracefully
-
-        # Send to students
-        for s in self.students.values():
-            try:
-                await s["connection"].send_json(message)
-            except:
-                pass
-
-    async def start_quiz(self, questions: List[dict]):
-        self.questions = questions
+    async def broadcast_lobby_state(self):
+        """Send the full player list to host and all students."""
+        self._lobby_version += 1
+        await self.broadcast_frame(await self.lobby_snapshot(fresh=True), LOBBY_UPDATE)
+
+    def _lobby_changed(self, joined: Optional[Dict[str, Any]] = None, left: Optional[str] = None) -> None:
+        """Record a join/leave; changes are sent as one diff per flush interval."""
+        if joined:
+            self._left.discard(joined["id"])
+            self._joined[joined["id"]] = joined
+        if left:
+            if self._joined.pop(left, None) is None:
+                self._left.add(left)
+        if self._lobby_flush is None or self._lobby_flush.done():
+            self._lobby_flush = asyncio.create_task(self._flush_lobby())
+
+    async def _flush_lobby(self) -> None:
+        while self._joined or self._left:
+            await asyncio.sleep(settings.QUIZ_LOBBY_FLUSH_MS / 1000)
+            joined, left = list(self._joined.values()), list(self._left)
+            self._joined, self._left = {}, set()
+            count = await self.store.count_players(self.quiz_id)
+            await self.broadcast({
+                "type": LOBBY_UPDATE,
+                "joined": joined,
+                "left": left,
+                "count": count
+            })
+
+    async def broadcast(self, message: dict, target: str = ALL):
+        """Send a message to this worker's sockets and publish it to the others."""
+        await self.broadcast_frame(encode_frame(message), message.get("type"), target)
+
+    async def broadcast_frame(self, frame: str, message_type: Optional[str], target: str = ALL):
+        envelope = {"target": target, "type": message_type, "frame": frame}
+        self.deliver(envelope)
+        await self.store.publish(self.quiz_id, envelope)
+
+    def deliver(self, envelope: Dict[str, Any]) -> None:
+        """Queue an event's frame on the local sockets it targets."""
+        target, message_type, frame = envelope["target"], envelope.get("type"), envelope["frame"]
+        self._observe(message_type, frame)
+
+        coalesce = message_type == LOBBY_UPDATE
+        if target in (ALL, HOST) and self.host_connection:
+            self.host_connection.send(frame, coalesce)
+        if target in (ALL, STUDENTS):
+            for connection in list(self.connections.values()):
+                connection.send(frame, coalesce)
+
+    def _observe(self, message_type: Optional[str], frame: str) -> None:
+        """Keep the local view in step with events from any worker."""
+        if message_type == LOBBY_UPDATE:
+            self._lobby_version += 1
+        elif message_type == "new_question":
+            message = json.loads(frame)
+            self.current_question_index = message["current_index"]
+            self.question_started_at = message["started_at"]
+        elif message_type == "quiz_end":
+            self.is_active = False
+
+    async def _load_questions(self) -> List[dict]:
+        if not self.questions:
+            self.questions = await self.store.get_questions(self.quiz_id)
+        return self.questions
+
+    async def start_quiz(self, questions: Optional[List[dict]] = None):
+        if questions:
+            self.questions = questions
+            await self.store.set_questions(self.quiz_id, questions)
         self.current_question_index = 0
+        await self.store.update_meta(self.quiz_id, current_question_index=0)
         await self.send_question()
 
     async def next_question(self):
-        if self.current_question_index < len(self.questions) - 1:
+        questions = await self._load_questions()
+        await self.push_leaderboard()
+        if self.current_question_index < len(questions) - 1:
             self.current_question_index += 1
+            await self.store.update_meta(self.quiz_id, current_question_index=self.current_question_index)
             await self.send_question()
         else:
             await self.end_quiz()
 
     async def send_question(self):
-        question = self.questions[self.current_question_index]
+        questions = await self._load_questions()
+        question = questions[self.current_question_index]
         # Don't send the correct answer to students!
         student_question = {k: v for k, v in question.items() if k != "correct_answer"}
-        
+
+        # Answer times are measured against the server clock, not the client's
+        self.question_started_at = time.time()
+        await self.store.update_meta(self.quiz_id, question_started_at=self.question_started_at)
         await self.broadcast({
             "type": "new_question",
             "question": student_question,
-            "total_questions": len(self.questions),
-            "current_index": self.current_question_index
+            "total_questions": len(questions),
+            "current_index": self.current_question_index,
+            "time_limit": question.get("time_limit") or settings.QUIZ_QUESTION_TIME_LIMIT_SECONDS,
+            "started_at": self.question_started_at
         })
 
-    async def handle_answer(self, student_id: str, answer: str):
-        if student_id not in self.students:
+    async def handle_answer(self, student_id: str, answer: str, received_at: Optional[float] = None):
+        received_at = received_at or time.time()
+        if student_id not in self.connections or self.current_question_index < 0 or self.question_started_at is None:
             return
-            
-        current_q = self.questions[self.current_question_index]
+
+        index = self.current_question_index
+        questions = await self._load_questions()
+        current_q = questions[index]
         is_correct = current_q["correct_answer"] == answer
-        
-        # Update score
-        points = 100 if is_correct else 0
-        self.students[student_id]["score"] += points
-        self.students[student_id]["answers"][self.current_question_index] = answer
+
+        # Correct answers earn base points plus a speed bonus (first answer per question counts)
+        time_limit = current_q.get("time_limit") or settings.QUIZ_QUESTION_TIME_LIMIT_SECONDS
+        elapsed = max(0.0, received_at - self.question_started_at)
+        points = score_answer(is_correct, elapsed, time_limit)
+        record = {
+            "answer": answer,
+            "correct": is_correct,
+            "points": points,
+            "response_ms": int(elapsed * 1000),
+            "user_id": self.user_ids.get(student_id)
+        }
+        recorded = await self.store.record_answer(self.quiz_id, student_id, index, record, points)
+        if not recorded:
+            return
 
         # Notify host of submission (real-time progress)
-        if self.host_connection:
-            await self.host_connection.send_json({
-                "type": "student_answered",
-                "student_id": student_id
-            })
+        await self.broadcast({
+            "type": "student_answered",
+            "student_id": student_id
+        }, target=HOST)
+
+    async def push_leaderboard(self):
+        """Send the host the top-N entries that changed since the last push."""
+        top = await self.store.leaderboard(self.quiz_id, settings.QUIZ_LEADERBOARD_SIZE)
+        current = {entry["id"]: (rank, entry["score"]) for rank, entry in enumerate(top, 1)}
+        changed = [
+            {**entry, "rank": rank} for rank, entry in enumerate(top, 1)
+            if self._leaderboard.get(entry["id"]) != (rank, entry["score"])
+        ]
+        removed = [sid for sid in self._leaderboard if sid not in current]
+        self._leaderboard = current
+
+        await self.broadcast({
+            "type": "leaderboard_update",
+            "question_index": self.current_question_index,
+            "changed": changed,
+            "removed": removed,
+            "total_players": await self.store.count_players(self.quiz_id)
+        }, target=HOST)
+
+    async def send_rank(self, student_id: str):
+        """Reply to one student with their live rank."""
+        connection = self.connections.get(student_id)
+        position = await self.store.rank(self.quiz_id, student_id)
+        if not connection or position is None:
+            return
+        rank, score = position
+        connection.send(encode_frame({
+            "type": "rank",
+            "rank": rank,
+            "score": score,
+            "total_players": await self.store.count_players(self.quiz_id)
+        }))
 
     async def end_quiz(self):
-        # Calculate final leaderboard
-        leaderboard = sorted(
-            [{"name": s["name"], "score": s["score"]} for s in self.students.values()],
-            key=lambda x: x["score"],
-            reverse=True
-        )
-        
+        await self.push_leaderboard()
+
+        # Final leaderboard straight from the sorted scores
+        leaderboard = [
+            {"name": entry["name"], "score": entry["score"], "rank": rank}
+            for rank, entry in enumerate(await self.store.leaderboard(self.quiz_id), 1)
+        ]
+
+        self.is_active = False
+        await self.store.update_meta(self.quiz_id, is_active=False)
         await self.broadcast({
             "type": "quiz_end",
             "leaderboard": leaderboard
         })
+        await self.persist_participation()
+        quiz_manager.schedule_end(self.quiz_id)
+
+    async def persist_participation(self) -> int:
+        """
+        Write one QUIZ_PARTICIPATION event per authenticated student, once per quiz.
+
+        Needs a class_id on the quiz. The insert runs in a worker thread so
+        the event loop keeps serving sockets.
+        """
+        if not self.class_id or not await self.store.claim(self.quiz_id, "persisted"):
+            return 0
+
+        answers_by_user: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        for records in (await self.store.get_answers(self.quiz_id)).values():
+            for index, record in records.items():
+                if record.get("user_id"):
+                    answers_by_user.setdefault(record["user_id"], {})[index] = record
+
+        participations = []
+        for user_id, records in answers_by_user.items():
+            correct = sum(1 for r in records.values() if r["correct"])
+            participations.append({
+                "student_id": user_id,
+                "engagement_value": round(100 * correct / len(records), 2),
+                "event_data": {
+                    "quiz_id": self.quiz_id,
+                    "title": self.title,
+                    "answered": len(records),
+                    "correct": correct,
+                    "points": sum(r["points"] for r in records.values()),
+                    "answers": [
+                        {"question_index": i, "correct": r["correct"], "points": r["points"], "response_ms": r["response_ms"]}
+                        for i, r in sorted(records.items())
+                    ]
+                }
+            })
+        if not participations:
+            return 0
+
+        try:
+            return await asyncio.to_thread(_write_participation, self.class_id, participations)
+        except Exception as e:
+            logger.error(f"Failed to persist quiz {self.quiz_id} participation: {e}")
+            return 0
+
+
+def _write_participation(class_id: str, participations: List[Dict[str, Any]]) -> int:
+    from app.services.engagement_service import EngagementService
+    db = SessionLocal()
+    try:
+        return EngagementService.record_quiz_participation(db, class_id, participations)
+    finally:
+        db.close()
+
 
 class QuizManager:
+    """Registry of this worker's session views, backed by the shared quiz store."""
+
     def __init__(self):
         self.sessions: Dict[str, QuizSession] = {}
+        self._store: Optional[QuizStore] = None
+        self._cleanups: set = set()  # Pending end_session tasks
+
+    @property
+    def store(self) -> QuizStore:
+        if self._store is None:
+            self._store = get_quiz_store()
+            self._store.set_dispatcher(self._dispatch)
+        return self._store
 
-    def create_session(self, host_id: str, title: str) -> str:
-        # Generate a short 6-character code for joining
-        quiz_id = str(uuid4())[:6].upper()
-        self.sessions[quiz_id] = QuizSession(quiz_id, host_id, title)
-        return quiz_id
+    async def create_session(
+        self, host_id: str, title: str, questions: Optional[List[dict]] = None, class_id: Optional[str] = None
+    ) -> str:
+        meta = {
+            "host_id": host_id, "title": title, "class_id": class_id,
+            "is_active": True, "current_question_index": -1
+        }
+        while True:
+            # Generate a short 6-character code for joining
+            quiz_id = str(uuid4())[:6].upper()
+            if await self.store.create_session(quiz_id, meta, questions or []):
+                return quiz_id
+
+    async def get_session(self, quiz_id: str) -> Optional[QuizSession]:
+        session = self.sessions.get(quiz_id)
+        if session:
+            return session
+        meta = await self.store.get_meta(quiz_id)
+        if not meta:
+            return None
+        return QuizSession(quiz_id, self.store, meta)
+
+    async def attach(self, quiz_id: str) -> Optional[QuizSession]:
+        """Register a socket on this worker and start receiving the quiz's events."""
+        session = self.sessions.get(quiz_id)
+        if session is None:
+            meta = await self.store.get_meta(quiz_id)
+            if not meta:
+                return None
+            session = self.sessions.setdefault(quiz_id, QuizSession(quiz_id, self.store, meta))
+        session.local_refs += 1
+        await self.store.subscribe(quiz_id)
+        return session
 
-    def get_session(self, quiz_id: str) -> Optional[QuizSession]:
-        return self.sessions.get(quiz_id)
+    async def release(self, session: QuizSession) -> None:
+        """Drop the local view once its last local socket has gone."""
+        session.local_refs -= 1
+        if session.local_refs <= 0 and self.sessions.get(session.quiz_id) is session:
+            del self.sessions[session.quiz_id]
+            await self.store.unsubscribe(session.quiz_id)
+
+    async def end_session(self, quiz_id: str, delay: float = 0):
+        """Delete a quiz's state from the store, after `delay` seconds."""
+        if delay:
+            await asyncio.sleep(delay)
+        session = self.sessions.pop(quiz_id, None)
+        if session:
+            await self.store.unsubscribe(quiz_id)
+        await self.store.delete_session(quiz_id)
+
+    def schedule_end(self, quiz_id: str) -> None:
+        """
+        Delete an ended quiz once QUIZ_END_GRACE_SECONDS have passed, so
+        late final frames and reconnects still find it. Must be called
+        from the event loop.
+        """
+        task = asyncio.get_running_loop().create_task(
+            self.end_session(quiz_id, settings.QUIZ_END_GRACE_SECONDS)
+        )
+        self._cleanups.add(task)
+        task.add_done_callback(self._cleanups.discard)
 
-    def end_session(self, quiz_id: str):
-        if quiz_id in self.sessions:
-            del self.sessions[quiz_id]
+    def _dispatch(self, quiz_id: str, envelope: Dict[str, Any]) -> None:
+        session = self.sessions.get(quiz_id)
+        if session:
+            session.deliver(envelope)
 
 # Global instance
 quiz_manager = QuizManager()
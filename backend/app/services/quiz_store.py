@@ -0,0 +1,607 @@
+"""
+Live quiz session store.
+
+Quiz state (metadata, questions, players, scores, answers) lives in a
+store shared by every worker, so students and the host can land on any
+uvicorn worker. Events are fanned out over a per-quiz pub/sub channel;
+each worker delivers them to the WebSockets it holds locally.
+
+Backends (QUIZ_STORE_BACKEND):
+- memory: single-process dicts, events stay in-process. Changed sessions
+  are checkpointed to QUIZ_CHECKPOINT_DIR every QUIZ_CHECKPOINT_SECONDS
+  and restored when the worker restarts; a quiz's checkpoint is removed
+  once it has ended.
+- redis: hashes per session plus Redis pub/sub. Keys carry a {quiz_id}
+  hash tag so one session's keys live on one Redis Cluster shard.
+- auto: redis when it answers a ping, otherwise memory
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sortedcontainers import SortedList
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Identifies this worker on the pub/sub channel so it can skip its own events
+WORKER_ID = uuid.uuid4().hex
+
+Dispatcher = Callable[[str, Dict[str, Any]], None]
+
+
+class QuizStore:
+    """Interface shared by the store backends; all methods are async."""
+
+    name = "base"
+
+    def __init__(self):
+        self._dispatch: Optional[Dispatcher] = None
+
+    def set_dispatcher(self, dispatch: Dispatcher) -> None:
+        """Callback receiving (quiz_id, envelope) for events from other workers."""
+        self._dispatch = dispatch
+
+    async def create_session(self, quiz_id: str, meta: Dict[str, Any], questions: List[dict]) -> bool:
+        """Create a session; False if the code is already taken."""
+        raise NotImplementedError
+
+    async def get_meta(self, quiz_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def update_meta(self, quiz_id: str, **fields) -> None:
+        raise NotImplementedError
+
+    async def get_questions(self, quiz_id: str) -> List[dict]:
+        raise NotImplementedError
+
+    async def set_questions(self, quiz_id: str, questions: List[dict]) -> None:
+        raise NotImplementedError
+
+    async def add_player(self, quiz_id: str, student_id: str, name: str) -> None:
+        """Add a player with a zero score (an existing score is kept)."""
+        raise NotImplementedError
+
+    async def remove_player(self, quiz_id: str, student_id: str) -> None:
+        raise NotImplementedError
+
+    async def get_players(self, quiz_id: str) -> Dict[str, Dict[str, Any]]:
+        """student_id -> {'name', 'score'}"""
+        raise NotImplementedError
+
+    async def count_players(self, quiz_id: str) -> int:
+        raise NotImplementedError
+
+    async def record_answer(self, quiz_id: str, student_id: str, question_index: int,
+                            record: Dict[str, Any], points: int) -> bool:
+        """Store the first answer per question and add its points; False on a repeat."""
+        raise NotImplementedError
+
+    async def has_player(self, quiz_id: str, student_id: str) -> bool:
+        raise NotImplementedError
+
+    async def has_answered(self, quiz_id: str, student_id: str, question_index: int) -> bool:
+        raise NotImplementedError
+
+    async def get_answers(self, quiz_id: str) -> Dict[str, Dict[int, Dict[str, Any]]]:
+        """student_id -> question_index -> answer record"""
+        raise NotImplementedError
+
+    async def leaderboard(self, quiz_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Players by descending score: [{'id', 'name', 'score'}]; O(log n + limit)."""
+        raise NotImplementedError
+
+    async def rank(self, quiz_id: str, student_id: str) -> Optional[Tuple[int, int]]:
+        """(1-based rank, score) of a player; O(log n)."""
+        raise NotImplementedError
+
+    async def claim(self, quiz_id: str, flag: str) -> bool:
+        """Set a one-shot flag on the session; True only for the first caller."""
+        raise NotImplementedError
+
+    async def delete_session(self, quiz_id: str) -> None:
+        raise NotImplementedError
+
+    async def publish(self, quiz_id: str, envelope: Dict[str, Any]) -> None:
+        """Send an event to the other workers holding this quiz."""
+        raise NotImplementedError
+
+    async def subscribe(self, quiz_id: str) -> None:
+        raise NotImplementedError
+
+    async def unsubscribe(self, quiz_id: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryQuizStore(QuizStore):
+    """Process-local store; only valid with a single worker."""
+
+    name = "memory"
+
+    def __init__(self, checkpoint_dir: Optional[str] = None):
+        super().__init__()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self.checkpoint_dir = checkpoint_dir
+        self._versions: Dict[str, int] = {}  # Bumped on every change
+        self._saved: Dict[str, int] = {}  # Version last written to disk
+        self._checkpointer: Optional[asyncio.Task] = None
+        if checkpoint_dir:
+            self._restore_checkpoints()
+
+    @staticmethod
+    def _new_session(meta, questions) -> Dict[str, Any]:
+        return {
+            "meta": dict(meta), "questions": list(questions), "players": {},
+            # Leaderboard: scores plus a SortedList of (-score, student_id)
+            "scores": {}, "ranking": SortedList(), "answers": {}
+        }
+
+    async def create_session(self, quiz_id, meta, questions):
+        if quiz_id in self._sessions:
+            return False
+        self._sessions[quiz_id] = self._new_session(meta, questions)
+        self._changed(quiz_id)
+        return True
+
+    async def get_meta(self, quiz_id):
+        session = self._sessions.get(quiz_id)
+        return dict(session["meta"]) if session else None
+
+    async def update_meta(self, quiz_id, **fields):
+        if quiz_id in self._sessions:
+            self._sessions[quiz_id]["meta"].update(fields)
+            self._changed(quiz_id)
+
+    async def get_questions(self, quiz_id):
+        session = self._sessions.get(quiz_id)
+        return session["questions"] if session else []
+
+    async def set_questions(self, quiz_id, questions):
+        if quiz_id in self._sessions:
+            self._sessions[quiz_id]["questions"] = list(questions)
+            self._changed(quiz_id)
+
+    async def add_player(self, quiz_id, student_id, name):
+        session = self._sessions.get(quiz_id)
+        if session:
+            session["players"][student_id] = name
+            if student_id not in session["scores"]:
+                session["scores"][student_id] = 0
+                session["ranking"].add((0, student_id))
+            self._changed(quiz_id)
+
+    async def remove_player(self, quiz_id, student_id):
+        session = self._sessions.get(quiz_id)
+        if session:
+            session["players"].pop(student_id, None)
+            score = session["scores"].pop(student_id, None)
+            if score is not None:
+                session["ranking"].discard((-score, student_id))
+            self._changed(quiz_id)
+
+    async def get_players(self, quiz_id):
+        session = self._sessions.get(quiz_id)
+        if not session:
+            return {}
+        return {
+            sid: {"name": name, "score": session["scores"].get(sid, 0)}
+            for sid, name in session["players"].items()
+        }
+
+    async def count_players(self, quiz_id):
+        session = self._sessions.get(quiz_id)
+        return len(session["players"]) if session else 0
+
+    async def record_answer(self, quiz_id, student_id, question_index, record, points):
+        session = self._sessions.get(quiz_id)
+        if not session:
+            return False
+        answers = session["answers"].setdefault(student_id, {})
+        if question_index in answers:
+            return False
+        answers[question_index] = dict(record)
+        if points and student_id in session["scores"]:
+            score = session["scores"][student_id]
+            session["ranking"].discard((-score, student_id))
+            session["scores"][student_id] = score + points
+            session["ranking"].add((-(score + points), student_id))
+        self._changed(quiz_id)
+        return True
+
+    async def has_player(self, quiz_id, student_id):
+        session = self._sessions.get(quiz_id)
+        return bool(session) and student_id in session["players"]
+
+    async def has_answered(self, quiz_id, student_id, question_index):
+        session = self._sessions.get(quiz_id)
+        return bool(session) and question_index in session["answers"].get(student_id, {})
+
+    async def get_answers(self, quiz_id):
+        session = self._sessions.get(quiz_id)
+        if not session:
+            return {}
+        return {sid: dict(answers) for sid, answers in session["answers"].items()}
+
+    async def leaderboard(self, quiz_id, limit=None):
+        session = self._sessions.get(quiz_id)
+        if not session:
+            return []
+        entries = session["ranking"].islice(0, limit)
+        return [
+            {"id": sid, "name": session["players"].get(sid), "score": -neg_score}
+            for neg_score, sid in entries
+        ]
+
+    async def rank(self, quiz_id, student_id):
+        session = self._sessions.get(quiz_id)
+        if not session or student_id not in session["scores"]:
+            return None
+        score = session["scores"][student_id]
+        return session["ranking"].index((-score, student_id)) + 1, score
+
+    async def claim(self, quiz_id, flag):
+        session = self._sessions.get(quiz_id)
+        if not session or session["meta"].get(flag):
+            return False
+        session["meta"][flag] = True
+        self._changed(quiz_id)
+        return True
+
+    async def delete_session(self, quiz_id):
+        self._sessions.pop(quiz_id, None)
+        self._versions.pop(quiz_id, None)
+        self._saved.pop(quiz_id, None)
+        if self.checkpoint_dir:
+            self._remove_checkpoint(quiz_id)
+
+    # -- Checkpoints -------------------------------------------------------
+
+    def _changed(self, quiz_id: str) -> None:
+        self._versions[quiz_id] = self._versions.get(quiz_id, 0) + 1
+        if self.checkpoint_dir and (self._checkpointer is None or self._checkpointer.done()):
+            try:
+                self._checkpointer = asyncio.get_running_loop().create_task(self._checkpoint_loop())
+            except RuntimeError:
+                pass  # No event loop (scripts); checkpoint() can be called directly
+
+    async def _checkpoint_loop(self) -> None:
+        while self._sessions:
+            await asyncio.sleep(settings.QUIZ_CHECKPOINT_SECONDS)
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                logger.warning(f"Quiz checkpoint failed: {e}")
+
+    async def checkpoint(self) -> int:
+        """
+        Write every session changed since its last checkpoint; returns the
+        count. Ended quizzes are not restored, so their checkpoint is
+        removed instead.
+        """
+        dirty = [q for q, v in self._versions.items() if self._saved.get(q) != v and q in self._sessions]
+        for quiz_id in dirty:
+            version = self._versions[quiz_id]
+            if not self._sessions[quiz_id]["meta"].get("is_active", True):
+                await asyncio.to_thread(self._remove_checkpoint, quiz_id)
+                self._saved[quiz_id] = version
+                continue
+            # Serialize on the loop (consistent copy); compress and write off it
+            payload = self.snapshot(quiz_id)
+            await asyncio.to_thread(self._write_checkpoint, quiz_id, payload)
+            if quiz_id not in self._sessions:
+                # Deleted while the file was being written
+                await asyncio.to_thread(self._remove_checkpoint, quiz_id)
+                continue
+            self._saved[quiz_id] = version
+        return len(dirty)
+
+    def snapshot(self, quiz_id: str) -> str:
+        """
+        Compact JSON snapshot of one session.
+
+        Answers are stored column-wise per student:
+        [question_index, answer, correct, points, response_ms, user_id]
+        """
+        session = self._sessions[quiz_id]
+        return json.dumps({
+            "v": 1,
+            "quiz_id": quiz_id,
+            "saved_at": time.time(),
+            "meta": session["meta"],
+            "questions": session["questions"],
+            "players": session["players"],
+            "scores": session["scores"],
+            "answers": {
+                sid: [
+                    [i, r.get("answer"), r.get("correct"), r.get("points"), r.get("response_ms"), r.get("user_id")]
+                    for i, r in answers.items()
+                ]
+                for sid, answers in session["answers"].items()
+            }
+        }, separators=(",", ":"))
+
+    def restore(self, payload: str) -> str:
+        """Load a snapshot produced by snapshot(); returns the quiz id."""
+        data = json.loads(payload)
+        quiz_id = data["quiz_id"]
+        session = self._new_session(data["meta"], data["questions"])
+        session["players"] = data["players"]
+        session["scores"] = {sid: int(score) for sid, score in data["scores"].items()}
+        session["ranking"] = SortedList((-score, sid) for sid, score in session["scores"].items())
+        session["answers"] = {
+            sid: {
+                row[0]: {"answer": row[1], "correct": row[2], "points": row[3], "response_ms": row[4], "user_id": row[5]}
+                for row in rows
+            }
+            for sid, rows in data["answers"].items()
+        }
+        self._sessions[quiz_id] = session
+        self._versions[quiz_id] = self._saved[quiz_id] = 0
+        return quiz_id
+
+    def _checkpoint_path(self, quiz_id: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{quiz_id}.json.gz")
+
+    def _write_checkpoint(self, quiz_id: str, payload: str) -> None:
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = self._checkpoint_path(quiz_id)
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8", compresslevel=1) as f:
+            f.write(payload)
+        os.replace(path + ".tmp", path)
+
+    def _remove_checkpoint(self, quiz_id: str) -> None:
+        try:
+            os.remove(self._checkpoint_path(quiz_id))
+        except FileNotFoundError:
+            pass
+
+    def _restore_checkpoints(self) -> None:
+        if not os.path.isdir(self.checkpoint_dir):
+            return
+        cutoff = time.time() - settings.QUIZ_SESSION_TTL_SECONDS
+        for name in os.listdir(self.checkpoint_dir):
+            if not name.endswith(".json.gz"):
+                continue
+            path = os.path.join(self.checkpoint_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    continue
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    payload = f.read()
+                if not json.loads(payload)["meta"].get("is_active", True):
+                    os.remove(path)  # Ended before the worker stopped
+                    continue
+                quiz_id = self.restore(payload)
+                logger.info(f"Restored quiz {quiz_id} from checkpoint")
+            except Exception as e:
+                logger.warning(f"Skipping quiz checkpoint {name}: {e}")
+
+    async def publish(self, quiz_id, envelope):
+        # Single process: local delivery already reached every connection
+        return None
+
+    async def subscribe(self, quiz_id):
+        return None
+
+    async def unsubscribe(self, quiz_id):
+        return None
+
+
+class RedisQuizStore(QuizStore):
+    """Shared store on Redis; events travel over quiz:{id}:events.
+
+    Scores live in a sorted set (quiz:{id}:leaderboard), so live top-N and
+    rank lookups are O(log n). State is already outside the worker, so no
+    checkpoints are needed.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis.asyncio as aioredis
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._channels: set = set()
+        self.worker_id = WORKER_ID
+        self.ttl = settings.QUIZ_SESSION_TTL_SECONDS
+
+    PARTS = ("meta", "questions", "players", "leaderboard", "answers")
+
+    @staticmethod
+    def _key(quiz_id: str, part: str) -> str:
+        return f"quiz:{{{quiz_id}}}:{part}"
+
+    def _touch(self, pipe, quiz_id: str, *parts: str) -> None:
+        for part in parts:
+            pipe.expire(self._key(quiz_id, part), self.ttl)
+
+    async def create_session(self, quiz_id, meta, questions):
+        created = await self._redis.hsetnx(self._key(quiz_id, "meta"), "created", "1")
+        if not created:
+            return False
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hset(self._key(quiz_id, "meta"), mapping={k: json.dumps(v) for k, v in meta.items()})
+        pipe.set(self._key(quiz_id, "questions"), json.dumps(questions))
+        self._touch(pipe, quiz_id, "meta", "questions")
+        await pipe.execute()
+        return True
+
+    async def get_meta(self, quiz_id):
+        raw = await self._redis.hgetall(self._key(quiz_id, "meta"))
+        if not raw:
+            return None
+        # "created" and "claim:*" are bookkeeping fields, not metadata
+        return {
+            k: json.loads(v) for k, v in raw.items()
+            if k != "created" and not k.startswith("claim:")
+        }
+
+    async def update_meta(self, quiz_id, **fields):
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hset(self._key(quiz_id, "meta"), mapping={k: json.dumps(v) for k, v in fields.items()})
+        self._touch(pipe, quiz_id, *self.PARTS)
+        await pipe.execute()
+
+    async def get_questions(self, quiz_id):
+        raw = await self._redis.get(self._key(quiz_id, "questions"))
+        return json.loads(raw) if raw else []
+
+    async def set_questions(self, quiz_id, questions):
+        await self._redis.set(self._key(quiz_id, "questions"), json.dumps(questions), ex=self.ttl)
+
+    async def add_player(self, quiz_id, student_id, name):
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hset(self._key(quiz_id, "players"), student_id, name)
+        pipe.zadd(self._key(quiz_id, "leaderboard"), {student_id: 0}, nx=True)
+        self._touch(pipe, quiz_id, "players", "leaderboard")
+        await pipe.execute()
+
+    async def remove_player(self, quiz_id, student_id):
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hdel(self._key(quiz_id, "players"), student_id)
+        pipe.zrem(self._key(quiz_id, "leaderboard"), student_id)
+        await pipe.execute()
+
+    async def get_players(self, quiz_id):
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hgetall(self._key(quiz_id, "players"))
+        pipe.zrange(self._key(quiz_id, "leaderboard"), 0, -1, withscores=True)
+        players, scores = await pipe.execute()
+        scores = dict(scores)
+        return {
+            sid: {"name": name, "score": int(scores.get(sid, 0))}
+            for sid, name in players.items()
+        }
+
+    async def count_players(self, quiz_id):
+        return await self._redis.hlen(self._key(quiz_id, "players"))
+
+    async def record_answer(self, quiz_id, student_id, question_index, record, points):
+        first = await self._redis.hsetnx(
+            self._key(quiz_id, "answers"), f"{student_id}:{question_index}", json.dumps(record)
+        )
+        if not first:
+            return False
+        pipe = self._redis.pipeline(transaction=False)
+        if points:
+            pipe.zadd(self._key(quiz_id, "leaderboard"), {student_id: points}, xx=True, incr=True)
+        self._touch(pipe, quiz_id, "answers")
+        await pipe.execute()
+        return True
+
+    async def has_player(self, quiz_id, student_id):
+        return bool(await self._redis.hexists(self._key(quiz_id, "players"), student_id))
+
+    async def has_answered(self, quiz_id, student_id, question_index):
+        return bool(await self._redis.hexists(self._key(quiz_id, "answers"), f"{student_id}:{question_index}"))
+
+    async def get_answers(self, quiz_id):
+        raw = await self._redis.hgetall(self._key(quiz_id, "answers"))
+        answers: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        for field, value in raw.items():
+            student_id, _, index = field.rpartition(":")
+            answers.setdefault(student_id, {})[int(index)] = json.loads(value)
+        return answers
+
+    async def leaderboard(self, quiz_id, limit=None):
+        end = -1 if limit is None else limit - 1
+        entries = await self._redis.zrevrange(self._key(quiz_id, "leaderboard"), 0, end, withscores=True)
+        if not entries:
+            return []
+        names = await self._redis.hmget(self._key(quiz_id, "players"), [sid for sid, _ in entries])
+        return [
+            {"id": sid, "name": name, "score": int(score)}
+            for (sid, score), name in zip(entries, names)
+        ]
+
+    async def rank(self, quiz_id, student_id):
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.zrevrank(self._key(quiz_id, "leaderboard"), student_id)
+        pipe.zscore(self._key(quiz_id, "leaderboard"), student_id)
+        position, score = await pipe.execute()
+        if position is None:
+            return None
+        return position + 1, int(score)
+
+    async def claim(self, quiz_id, flag):
+        return bool(await self._redis.hsetnx(self._key(quiz_id, "meta"), f"claim:{flag}", "1"))
+
+    async def delete_session(self, quiz_id):
+        await self._redis.delete(*[self._key(quiz_id, part) for part in self.PARTS])
+
+    async def publish(self, quiz_id, envelope):
+        payload = json.dumps({**envelope, "origin": self.worker_id})
+        await self._redis.publish(self._key(quiz_id, "events"), payload)
+
+    async def subscribe(self, quiz_id):
+        channel = self._key(quiz_id, "events")
+        if channel in self._channels:
+            return
+        if self._pubsub is None:
+            self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(channel)
+        self._channels.add(channel)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def unsubscribe(self, quiz_id):
+        channel = self._key(quiz_id, "events")
+        if channel in self._channels:
+            self._channels.discard(channel)
+            await self._pubsub.unsubscribe(channel)
+
+    async def _listen(self) -> None:
+        """Deliver events published by other workers until no channel is left."""
+        while self._channels:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except Exception as e:
+                logger.warning(f"Quiz pub/sub error: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            envelope = json.loads(message["data"])
+            if envelope.pop("origin", None) == self.worker_id or self._dispatch is None:
+                continue
+            # Channel is quiz:{ID}:events
+            quiz_id = message["channel"].split("{", 1)[1].split("}", 1)[0]
+            try:
+                self._dispatch(quiz_id, envelope)
+            except Exception as e:
+                logger.warning(f"Quiz event dispatch failed for {quiz_id}: {e}")
+
+
+_store: Optional[QuizStore] = None
+
+
+def get_quiz_store() -> QuizStore:
+    """Select the store backend once, from QUIZ_STORE_BACKEND."""
+    global _store
+    if _store is None:
+        _store = _create_store(settings.QUIZ_STORE_BACKEND)
+    return _store
+
+
+def _create_store(kind: str) -> QuizStore:
+    checkpoint_dir = settings.QUIZ_CHECKPOINT_DIR or None
+    if kind == "memory":
+        return MemoryQuizStore(checkpoint_dir)
+    if kind == "redis":
+        return RedisQuizStore(settings.REDIS_URL)
+    try:
+        from app.utils.cache import redis_client
+        redis_client.ping()
+        return RedisQuizStore(settings.REDIS_URL)
+    except Exception as e:
+        logger.warning(f"Redis unavailable ({e}); live quizzes limited to this worker")
+        return MemoryQuizStore(checkpoint_dir)
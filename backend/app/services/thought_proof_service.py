@@ -6,13 +6,89 @@ import hashlib
 import json
 import zlib
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, func
 import uuid
 
-from app.models.thought_proof import ThoughtProof, KeystrokeEvent
+from app.database import SessionLocal
+from app.models.thought_proof import ThoughtProof, KeystrokeEvent, KeystrokeChunk
 from app.models.assignment import StudentAssignment
+from app.utils.keystroke_codec import (
+    encode_events, decode_arrays, decode_columns, decode_events, column_events, columns_to_arrays, timestamp_ms
+)
+from app.ai.keystroke_analytics import compute_features, concatenate_arrays
+
+# Chunk rows fetched per round trip when reading a recording back
+CHUNK_FETCH_SIZE = 16
+
+# Most events returned by one replay window
+REPLAY_WINDOW_MAX_EVENTS = 5000
+
+
+def _chain_seed(proof: ThoughtProof) -> str:
+    """Hash chain value before the first batch, bound to the recording."""
+    return hashlib.sha256(f"{proof.id}:{proof.started_at.isoformat()}".encode('utf-8')).hexdigest()
+
+
+def _extend_chain(previous: str, body: bytes) -> str:
+    """Next hash chain value: SHA-256 of the previous value and the batch's canonical body."""
+    return hashlib.sha256(bytes.fromhex(previous) + hashlib.sha256(body).digest()).hexdigest()
+
+
+def _add_totals(totals: Optional[Dict[str, Any]], batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Running event statistics after a batch (sorted by ts_ms)."""
+    totals = dict(totals or {'events': 0, 'by_type': {}, 'first_ts_ms': None, 'last_ts_ms': None})
+    by_type = dict(totals['by_type'])
+    for event in batch:
+        by_type[event['type']] = by_type.get(event['type'], 0) + 1
+    totals['by_type'] = by_type
+    totals['events'] += len(batch)
+    first, last = batch[0]['ts_ms'], batch[-1]['ts_ms']
+    totals['first_ts_ms'] = first if totals['first_ts_ms'] is None else min(totals['first_ts_ms'], first)
+    totals['last_ts_ms'] = last if totals['last_ts_ms'] is None else max(totals['last_ts_ms'], last)
+    return totals
+
+
+def _convert_legacy_events(db: Session, proof: ThoughtProof) -> Optional[KeystrokeChunk]:
+    """
+    Move a recording's per-event rows, written before keystroke_chunks,
+    into its first chunk (chained from the seed), so that batches recorded
+    after the switch extend the same recording. None if it has no rows.
+    """
+    rows = db.query(KeystrokeEvent).filter(
+        KeystrokeEvent.thought_proof_id == proof.id
+    ).order_by(KeystrokeEvent.timestamp).all()
+    if not rows:
+        return None
+    
+    batch = [{
+        'ts_ms': timestamp_ms(row.timestamp),
+        'type': row.event_type,
+        'content': row.content,
+        'position': row.position,
+        'length': row.length,
+        'line': row.line_number,
+        'column': row.column_number
+    } for row in rows]
+    data, body = encode_events(batch)
+    chunk = KeystrokeChunk(
+        thought_proof_id=proof.id,
+        first_event_index=0,
+        event_count=len(batch),
+        first_ts_ms=batch[0]['ts_ms'],
+        last_ts_ms=batch[-1]['ts_ms'],
+        data=data,
+        chain_hash=_extend_chain(_chain_seed(proof), body),
+        totals=_add_totals(None, batch)
+    )
+    db.add(chunk)
+    db.query(KeystrokeEvent).filter(
+        KeystrokeEvent.thought_proof_id == proof.id
+    ).delete(synchronize_session=False)
+    proof.events_count = len(batch)
+    return chunk
 
 
 class ThoughtProofService:
@@ -58,6 +134,12 @@ class ThoughtProofService:
         """
         Record a batch of keystroke events.
         
+        The batch is stored as a single compressed, columnar KeystrokeChunk
+        (see app.utils.keystroke_codec) rather than a row per event. The
+        chunk also carries the replay hash chain and event statistics as of
+        this batch, so finalization never reads the events back. Events
+        recorded one row each before keystroke_chunks become the first chunk.
+        
         Args:
             db: Database session
             thought_proof_id: ID of the thought proof
@@ -66,36 +148,126 @@ class ThoughtProofService:
         Returns:
             Number of events recorded
         """
-        keystroke_events = []
-        
-        for event in events:
-            keystroke_event = KeystrokeEvent(
-                thought_proof_id=thought_proof_id,
-                timestamp=datetime.fromisoformat(event['timestamp'].replace('Z', '+00:00')),
-                event_type=event['type'],
-                content=event.get('content'),
-                position=event.get('position'),
-                length=event.get('length'),
-                line_number=event.get('line'),
-                column_number=event.get('column')
-            )
-            keystroke_events.append(keystroke_event)
+        if not events:
+            return 0
         
-        db.bulk_save_objects(keystroke_events)
+        # Lock the proof so concurrent batches get consecutive event indexes
+        proof = db.query(ThoughtProof).filter(
+            ThoughtProof.id == thought_proof_id
+        ).with_for_update().first()
+        if not proof:
+            raise ValueError("Thought proof not found")
+        if proof.finalized_at:
+            raise ValueError("Thought proof is already finalized")
         
-        # Update event count
-        proof = db.query(ThoughtProof).filter(ThoughtProof.id == thought_proof_id).first()
-        if proof:
-            proof.events_count += len(events)
+        batch = sorted(
+            ({**event, 'ts_ms': timestamp_ms(event['timestamp'])} for event in events),
+            key=lambda event: event['ts_ms']
+        )
+        data, body = encode_events(batch)
+        
+        previous = db.query(KeystrokeChunk.chain_hash, KeystrokeChunk.totals).filter(
+            KeystrokeChunk.thought_proof_id == thought_proof_id
+        ).order_by(KeystrokeChunk.first_event_index.desc()).first()
+        if previous is None:
+            # Recording started before keystroke_chunks
+            previous = _convert_legacy_events(db, proof)
+        
+        db.add(KeystrokeChunk(
+            thought_proof_id=thought_proof_id,
+            first_event_index=proof.events_count,
+            event_count=len(batch),
+            first_ts_ms=batch[0]['ts_ms'],
+            last_ts_ms=batch[-1]['ts_ms'],
+            data=data,
+            chain_hash=_extend_chain(previous.chain_hash if previous else _chain_seed(proof), body),
+            totals=_add_totals(previous.totals if previous else None, batch)
+        ))
+        proof.events_count += len(batch)
         
         db.commit()
         
-        return len(events)
+        return len(batch)
+    
+    @staticmethod
+    def iter_event_columns(db: Session, thought_proof_id: uuid.UUID) -> Iterator[Dict[str, List[Any]]]:
+        """
+        Yield a recording's events in order, one batch of columns at a time
+        (see keystroke_codec.decode_columns), without loading them all.
+        
+        Args:
+            db: Database session
+            thought_proof_id: ID of the thought proof
+        """
+        chunks = db.query(KeystrokeChunk.data).filter(
+            KeystrokeChunk.thought_proof_id == thought_proof_id
+        ).order_by(KeystrokeChunk.first_event_index).yield_per(CHUNK_FETCH_SIZE)
+        
+        found = False
+        for (data,) in chunks:
+            found = True
+            yield decode_columns(data)
+        if found:
+            return
+        
+        # Recorded one row per event, before keystroke_chunks
+        events = db.query(KeystrokeEvent).filter(
+            KeystrokeEvent.thought_proof_id == thought_proof_id
+        ).order_by(KeystrokeEvent.timestamp).all()
+        if events:
+            yield {
+                'ts_ms': [timestamp_ms(e.timestamp) for e in events],
+                'type': [e.event_type for e in events],
+                'content': [e.content for e in events],
+                'position': [e.position for e in events],
+                'length': [e.length for e in events],
+                'line': [e.line_number for e in events],
+                'column': [e.column_number for e in events]
+            }
+    
+    @staticmethod
+    def event_arrays(db: Session, thought_proof_id: uuid.UUID) -> Dict[str, np.ndarray]:
+        """
+        A recording's events as NumPy arrays (see keystroke_codec.decode_arrays),
+        decoded chunk by chunk without building per-event objects.
+        
+        Args:
+            db: Database session
+            thought_proof_id: ID of the thought proof
+        """
+        chunks = db.query(KeystrokeChunk.data).filter(
+            KeystrokeChunk.thought_proof_id == thought_proof_id
+        ).order_by(KeystrokeChunk.first_event_index).yield_per(CHUNK_FETCH_SIZE)
+        parts = [decode_arrays(data) for (data,) in chunks]
+        if not parts:
+            # Recorded one row per event, before keystroke_chunks
+            parts = [columns_to_arrays(columns) for columns in ThoughtProofService.iter_event_columns(db, thought_proof_id)]
+        return concatenate_arrays(parts)
+    
+    @staticmethod
+    def get_keystroke_features(db: Session, thought_proof_id: uuid.UUID) -> Dict[str, Any]:
+        """
+        Writing-process features of a recording (see app.ai.keystroke_analytics).
+        
+        Args:
+            db: Database session
+            thought_proof_id: ID of the thought proof
+            
+        Returns:
+            Feature dictionary
+        """
+        if not db.query(ThoughtProof.id).filter(ThoughtProof.id == thought_proof_id).first():
+            raise ValueError("Thought proof not found")
+        return compute_features(ThoughtProofService.event_arrays(db, thought_proof_id))
     
     @staticmethod
     def generate_replay_data(db: Session, thought_proof_id: uuid.UUID) -> Dict[str, Any]:
         """
-        Generate compressed replay data from keystroke events.
+        Generate compressed replay data from per-event rows.
+        
+        Only proofs recorded before keystroke_chunks need this; chunked
+        recordings are already stored in replay form and only hashed at
+        finalization.
         
         Args:
             db: Database session
@@ -166,34 +338,24 @@ class ThoughtProofService:
             raise ValueError("Thought proof not found")
         
         # Analyze keystroke patterns
-        events = db.query(KeystrokeEvent).filter(
-            KeystrokeEvent.thought_proof_id == thought_proof_id
-        ).order_by(KeystrokeEvent.timestamp).all()
-        
-        # Calculate statistics
-        total_events = len(events)
-        insert_events = sum(1 for e in events if e.event_type == 'insert')
-        delete_events = sum(1 for e in events if e.event_type == 'delete')
-        paste_events = sum(1 for e in events if e.event_type == 'paste')
-        
-        # Calculate time gaps (pauses)
-        pauses = []
-        for i in range(1, len(events)):
-            gap = (events[i].timestamp - events[i-1].timestamp).total_seconds()
-            if gap > 5:  # Pause longer than 5 seconds
-                pauses.append(gap)
+        features = ThoughtProofService.get_keystroke_features(db, thought_proof_id)
         
         # Build context for AI
         analysis_prompt = f"""Analyze this student's writing process and generate a professional narration of their thought process.
 
 Statistics:
-- Total keystrokes: {total_events}
-- Insertions: {insert_events}
-- Deletions: {delete_events}
-- Paste events: {paste_events}
-- Number of pauses (>5s): {len(pauses)}
-- Average pause duration: {sum(pauses)/len(pauses) if pauses else 0:.1f}s
-- Revision ratio: {delete_events/insert_events if insert_events > 0 else 0:.2f}
+- Total keystrokes: {features['total_events']}
+- Insertions: {features['insert_events']}
+- Deletions: {features['delete_events']}
+- Paste events: {features['paste_events']}
+- Share of text pasted rather than typed: {features['paste_ratio']:.0%} (largest paste: {features['largest_paste_chars']} characters)
+- Number of pauses (>5s): {features['pause_count']}
+- Average pause duration: {features['avg_pause_seconds']:.1f}s (longest: {features['longest_pause_seconds']:.1f}s)
+- Active typing time: {features['active_seconds'] / 60:.1f} min at {features['typing_chars_per_minute']:.0f} characters/min
+- Typing bursts: {features['burst_count']} (longest: {features['longest_burst_events']} keystrokes)
+- Median time between keystrokes: {features['iki_median_ms']:.0f}ms
+- Revision ratio: {features['revision_ratio']:.2f}
+- Lines revised: {features['lines_revised']} of {features['lines_edited']} edited
 
 Generate a 2-3 paragraph narration that:
 1. Describes their writing approach (outline first? iterative? linear?)
@@ -282,6 +444,10 @@ Focus on the PROCESS, not the content."""
         """
         Finalize the proof: generate replay, sign, and mark as complete.
         
+        For chunked recordings the replay hash and duration come from the
+        last batch's running state, so this does not depend on the number
+        of events.
+        
         Args:
             db: Database session
             thought_proof_id: ID of the thought proof
@@ -290,21 +456,37 @@ Focus on the PROCESS, not the content."""
         Returns:
             Finalized ThoughtProof
         """
-        # Generate replay data
-        ThoughtProofService.generate_replay_data(db, thought_proof_id)
+        proof = db.query(ThoughtProof).filter(ThoughtProof.id == thought_proof_id).first()
+        if not proof:
+            raise ValueError("Thought proof not found")
+        
+        last_chunk = db.query(KeystrokeChunk.chain_hash, KeystrokeChunk.totals).filter(
+            KeystrokeChunk.thought_proof_id == thought_proof_id
+        ).order_by(KeystrokeChunk.first_event_index.desc()).first()
+        
+        first_ms = last_ms = None
+        if last_chunk:
+            proof.replay_hash = last_chunk.chain_hash
+            first_ms, last_ms = last_chunk.totals['first_ts_ms'], last_chunk.totals['last_ts_ms']
+            db.commit()
+        else:
+            # Recorded one row per event, before keystroke_chunks
+            ThoughtProofService.generate_replay_data(db, thought_proof_id)
+            first, last = db.query(
+                func.min(KeystrokeEvent.timestamp), func.max(KeystrokeEvent.timestamp)
+            ).filter(KeystrokeEvent.thought_proof_id == thought_proof_id).one()
+            if first is not None:
+                first_ms, last_ms = timestamp_ms(first), timestamp_ms(last)
         
         # Sign the proof
         ThoughtProofService.sign_proof(db, thought_proof_id, private_key)
         
         # Mark as finalized
-        proof = db.query(ThoughtProof).filter(ThoughtProof.id == thought_proof_id).first()
         proof.finalized_at = datetime.utcnow()
         
         # Calculate total duration
-        if proof.keystroke_events:
-            first_event = proof.keystroke_events[0]
-            last_event = proof.keystroke_events[-1]
-            proof.total_duration_seconds = int((last_event.timestamp - first_event.timestamp).total_seconds())
+        if first_ms is not None:
+            proof.total_duration_seconds = (last_ms - first_ms) // 1000
         
         db.commit()
         db.refresh(proof)
@@ -324,11 +506,204 @@ Focus on the PROCESS, not the content."""
             Replay data dictionary
         """
         proof = db.query(ThoughtProof).filter(ThoughtProof.id == thought_proof_id).first()
-        if not proof or not proof.events_json:
+        if not proof or not proof.replay_hash:
             raise ValueError("Replay data not available")
         
-        # Decompress
-        compressed = bytes.fromhex(proof.events_json)
-        json_str = zlib.decompress(compressed).decode('utf-8')
+        if proof.events_json:
+            # Decompress
+            compressed = bytes.fromhex(proof.events_json)
+            json_str = zlib.decompress(compressed).decode('utf-8')
+            return json.loads(json_str)
+        
+        events = []
+        chunks = db.query(KeystrokeChunk.data).filter(
+            KeystrokeChunk.thought_proof_id == thought_proof_id
+        ).order_by(KeystrokeChunk.first_event_index).yield_per(CHUNK_FETCH_SIZE)
+        for (data,) in chunks:
+            events.extend(decode_events(data))
+        
+        return {
+            'started_at': proof.started_at.isoformat(),
+            'events': events,
+            'total_events': len(events)
+        }
+    
+    @staticmethod
+    def stream_replay_json(thought_proof_id: uuid.UUID) -> Iterator[str]:
+        """
+        The replay data of get_replay_data as JSON text, produced one stored
+        chunk at a time so memory stays flat for long recordings.
+        
+        Opens its own session, as it runs after the request's has closed.
+        Callers check availability first (get_replay_data's conditions).
+        
+        Args:
+            thought_proof_id: ID of the thought proof
+        """
+        db = SessionLocal()
+        try:
+            proof = db.query(ThoughtProof).filter(ThoughtProof.id == thought_proof_id).first()
+            if proof.events_json:
+                yield json.dumps(ThoughtProofService.get_replay_data(db, thought_proof_id))
+                return
+            
+            yield '{"started_at": %s, "total_events": %d, "events": [' % (
+                json.dumps(proof.started_at.isoformat()), proof.events_count
+            )
+            separator = ""
+            chunks = db.query(KeystrokeChunk.data).filter(
+                KeystrokeChunk.thought_proof_id == thought_proof_id
+            ).order_by(KeystrokeChunk.first_event_index).yield_per(CHUNK_FETCH_SIZE)
+            for (data,) in chunks:
+                events = ", ".join(json.dumps(event) for event in decode_events(data))
+                if events:
+                    yield separator + events
+                    separator = ", "
+            yield "]}"
+        finally:
+            db.close()
+    
+    @staticmethod
+    def get_replay_index(db: Session, thought_proof_id: uuid.UUID) -> Dict[str, Any]:
+        """
+        Chunk index of a finalized recording, for seeking.
+        
+        Each entry gives a stored batch's first event index, event count and
+        time span in milliseconds since the first event, so a player can
+        find the chunk holding any point in time before requesting it.
+        
+        Args:
+            db: Database session
+            thought_proof_id: ID of the thought proof
+            
+        Returns:
+            started_at, replay_hash, total_events, duration_ms and chunks
+        """
+        proof = ThoughtProofService._replayable_proof(db, thought_proof_id)
+        
+        if proof.events_json:
+            columns = ThoughtProofService._legacy_columns(proof)
+            base_ms = columns['ts_ms'][0] if columns['ts_ms'] else 0
+            rows = [(0, len(columns['ts_ms']), base_ms, columns['ts_ms'][-1] if columns['ts_ms'] else 0)]
+        else:
+            rows = db.query(
+                KeystrokeChunk.first_event_index, KeystrokeChunk.event_count,
+                KeystrokeChunk.first_ts_ms, KeystrokeChunk.last_ts_ms
+            ).filter(
+                KeystrokeChunk.thought_proof_id == thought_proof_id
+            ).order_by(KeystrokeChunk.first_event_index).all()
+            base_ms = min((row[2] for row in rows), default=0)
+        
+        chunks = [
+            {'index': index, 'count': count, 'start_ms': first - base_ms, 'end_ms': last - base_ms}
+            for index, count, first, last in rows if count
+        ]
+        return {
+            'started_at': proof.started_at.isoformat(),
+            'replay_hash': proof.replay_hash,
+            'total_events': sum(chunk['count'] for chunk in chunks),
+            'duration_ms': max((chunk['end_ms'] for chunk in chunks), default=0),
+            'chunks': chunks
+        }
+    
+    @staticmethod
+    def get_replay_window(
+        db: Session,
+        thought_proof_id: uuid.UUID,
+        start_index: Optional[int] = None,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        limit: int = REPLAY_WINDOW_MAX_EVENTS
+    ) -> Dict[str, Any]:
+        """
+        Part of a finalized recording, decoding only the chunks it touches.
+        
+        With start_ms/end_ms, returns the events in that time range
+        (milliseconds since the first event, end exclusive); otherwise the
+        events from start_index on. At most `limit` events are returned;
+        next_index continues a truncated window.
         
-        return json.loads(json_str)
+        Args:
+            db: Database session
+            thought_proof_id: ID of the thought proof
+            start_index: First event index (index windows)
+            start_ms: Window start (time windows)
+            end_ms: Window end (time windows)
+            limit: Maximum number of events
+            
+        Returns:
+            start_index, next_index (None at the end of the window) and events
+        """
+        proof = ThoughtProofService._replayable_proof(db, thought_proof_id)
+        limit = max(1, min(limit, REPLAY_WINDOW_MAX_EVENTS))
+        by_time = start_ms is not None or end_ms is not None
+        start_index = max(start_index or 0, 0)
+        
+        if proof.events_json:
+            columns = ThoughtProofService._legacy_columns(proof)
+            base_ms = columns['ts_ms'][0] if columns['ts_ms'] else 0
+            chunks = [(0, columns)]
+        else:
+            query = db.query(KeystrokeChunk.first_event_index, KeystrokeChunk.data).filter(
+                KeystrokeChunk.thought_proof_id == thought_proof_id
+            )
+            base_ms = db.query(func.min(KeystrokeChunk.first_ts_ms)).filter(
+                KeystrokeChunk.thought_proof_id == thought_proof_id
+            ).scalar() or 0
+            if by_time:
+                if start_ms is not None:
+                    query = query.filter(KeystrokeChunk.last_ts_ms >= base_ms + start_ms)
+                if end_ms is not None:
+                    query = query.filter(KeystrokeChunk.first_ts_ms < base_ms + end_ms)
+            query = query.filter(
+                KeystrokeChunk.first_event_index + KeystrokeChunk.event_count > start_index
+            ).order_by(KeystrokeChunk.first_event_index).yield_per(CHUNK_FETCH_SIZE)
+            chunks = ((first, decode_columns(data)) for first, data in query)
+        
+        events, first_index, next_index = [], None, None
+        for first, columns in chunks:
+            selected = []
+            for i, ms in enumerate(columns['ts_ms']):
+                offset = ms - base_ms
+                if first + i < start_index:
+                    continue
+                if start_ms is not None and offset < start_ms:
+                    continue
+                if end_ms is not None and offset >= end_ms:
+                    continue
+                if len(events) + len(selected) == limit:
+                    next_index = first + i
+                    break
+                selected.append(i)
+            if selected and first_index is None:
+                first_index = first + selected[0]
+            events.extend(column_events(columns, selected))
+            if next_index is not None:
+                break
+        
+        return {
+            'start_index': first_index if first_index is not None else start_index,
+            'next_index': next_index,
+            'events': events
+        }
+    
+    @staticmethod
+    def _replayable_proof(db: Session, thought_proof_id: uuid.UUID) -> ThoughtProof:
+        proof = db.query(ThoughtProof).filter(ThoughtProof.id == thought_proof_id).first()
+        if not proof or not proof.replay_hash:
+            raise ValueError("Replay data not available")
+        return proof
+    
+    @staticmethod
+    def _legacy_columns(proof: ThoughtProof) -> Dict[str, List[Any]]:
+        """Columns of a recording stored as compressed JSON, before keystroke_chunks."""
+        events = json.loads(zlib.decompress(bytes.fromhex(proof.events_json)).decode('utf-8'))['events']
+        return {
+            'ts_ms': [timestamp_ms(e['timestamp']) for e in events],
+            'type': [e['type'] for e in events],
+            'content': [e['content'] for e in events],
+            'position': [e['position'] for e in events],
+            'length': [e['length'] for e in events],
+            'line': [e['line'] for e in events],
+            'column': [e['column'] for e in events]
+        }
@@ -0,0 +1,157 @@
+"""
+Tutor context snapshots.
+
+The AI tutor personalizes replies with the student's pending assignments
+and weakest concepts. Both lists come from one UNION ALL query (assignment
+titles and concept names resolved in SQL) and the result is cached per
+student, so the turns of a conversation reuse it instead of re-querying.
+Two tiers, as for the authenticated-user cache:
+- an in-process LRU with TUTOR_CONTEXT_LOCAL_TTL_SECONDS
+- Redis, shared by all workers, with TUTOR_CONTEXT_TTL_SECONDS
+
+A student's snapshot is dropped when a transaction that changed one of
+their StudentAssignment or StudentMastery rows commits. Bulk writers,
+which bypass ORM events, call mark_stale themselves.
+"""
+
+import threading
+from typing import Any, Dict, Iterable, List
+from sqlalchemy import event, func, literal, select, union_all
+from sqlalchemy.orm import Session, object_session
+from app.models.assignment import Assignment, AssignmentStatus, Concept, StudentAssignment, StudentMastery
+from app.models.user import User
+from app.utils.cache import LocalLRU, get_cache, set_cache, delete_cache
+from app.config import get_settings
+
+settings = get_settings()
+
+CONTEXT_ITEMS = 3  # Entries per list in the prompt
+WEAK_MASTERY_LEVEL = 50.0
+LOCAL_MAX_ENTRIES = 10000
+
+_PENDING_STATUSES = (AssignmentStatus.ASSIGNED, AssignmentStatus.IN_PROGRESS)
+
+_local = LocalLRU(LOCAL_MAX_ENTRIES, settings.TUTOR_CONTEXT_LOCAL_TTL_SECONDS)
+_metrics_lock = threading.Lock()
+_metrics = {"local_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _cache_key(student_id) -> str:
+    return f"tutor:context:{student_id}"
+
+
+def _count(name: str) -> None:
+    with _metrics_lock:
+        _metrics[name] += 1
+
+
+def get_tutor_context(db: Session, user: User) -> Dict[str, Any]:
+    """
+    Context dict for the tutor prompt: first_name, pending_assignments
+    (titles, nearest due date first) and recent_low_mastery_topics
+    (concept names, weakest first).
+    """
+    key = _cache_key(user.id)
+    snapshot = _local.get(key)
+    if snapshot is not None:
+        _count("local_hits")
+    else:
+        snapshot = get_cache(key)
+        if snapshot is not None:
+            _count("redis_hits")
+        else:
+            _count("misses")
+            snapshot = build_snapshot(db, user.id)
+            set_cache(key, snapshot, ttl=settings.TUTOR_CONTEXT_TTL_SECONDS)
+        _local.set(key, snapshot)
+
+    return {"first_name": user.first_name, **snapshot}
+
+
+def build_snapshot(db: Session, student_id) -> Dict[str, List[str]]:
+    """Pending assignment titles and weak concept names in one round trip."""
+    pending = select(
+        literal("assignment").label("kind"),
+        Assignment.title.label("label"),
+        func.row_number().over(
+            order_by=(Assignment.due_date.is_(None), Assignment.due_date, StudentAssignment.assigned_at.desc())
+        ).label("position")
+    ).select_from(StudentAssignment).join(
+        Assignment, Assignment.id == StudentAssignment.assignment_id
+    ).where(
+        StudentAssignment.student_id == student_id,
+        StudentAssignment.status.in_(_PENDING_STATUSES)
+    ).subquery()
+
+    weak = select(
+        literal("concept").label("kind"),
+        Concept.name.label("label"),
+        func.row_number().over(order_by=StudentMastery.mastery_level).label("position")
+    ).select_from(StudentMastery).join(
+        Concept, Concept.id == StudentMastery.concept_id
+    ).where(
+        StudentMastery.student_id == student_id,
+        StudentMastery.mastery_level < WEAK_MASTERY_LEVEL
+    ).subquery()
+
+    query = union_all(
+        select(pending).where(pending.c.position <= CONTEXT_ITEMS),
+        select(weak).where(weak.c.position <= CONTEXT_ITEMS)
+    )
+    snapshot = {"pending_assignments": [], "recent_low_mastery_topics": []}
+    for kind, label, _ in sorted(db.execute(query).all(), key=lambda row: (row[0], row[2])):
+        target = "pending_assignments" if kind == "assignment" else "recent_low_mastery_topics"
+        snapshot[target].append(label)
+    return snapshot
+
+
+def invalidate_tutor_context(student_id) -> None:
+    """Drop a student's snapshot from both tiers."""
+    key = _cache_key(student_id)
+    _local.delete(key)
+    delete_cache(key)
+    _count("invalidations")
+
+
+def mark_stale(db: Session, student_ids: Iterable) -> None:
+    """Invalidate these students' snapshots when db's transaction commits."""
+    db.info.setdefault(_PENDING_KEY, set()).update(student_ids)
+
+
+def get_tutor_context_metrics() -> Dict[str, Any]:
+    """Hit/miss counters and the size of this process's local tier."""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    lookups = metrics["local_hits"] + metrics["redis_hits"] + metrics["misses"]
+    metrics["hit_ratio"] = round((metrics["local_hits"] + metrics["redis_hits"]) / lookups, 4) if lookups else 0.0
+    metrics["local_entries"] = len(_local)
+    return metrics
+
+
+# Invalidate once the write is committed, so a concurrent miss cannot
+# re-cache the old rows between flush and commit
+_PENDING_KEY = "tutor_context_invalidations"
+
+
+def _on_student_write(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is None:
+        invalidate_tutor_context(target.student_id)
+    else:
+        session.info.setdefault(_PENDING_KEY, set()).add(target.student_id)
+
+
+for _model in (StudentAssignment, StudentMastery):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _on_student_write)
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_invalidations(session) -> None:
+    for student_id in session.info.pop(_PENDING_KEY, ()):
+        invalidate_tutor_context(student_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,79 @@
+"""
+Cache of AI-generated content.
+
+Quiz questions, focus questions and lesson plans are keyed by a hash of
+the prompt that produced them (plus the backend name), so the same topic,
+count and difficulty is only sent to the model once per
+AI_CACHE_TTL_SECONDS. Two tiers:
+- an in-process LRU bounded by entry count and total serialized size
+- Redis, shared by all workers, through app.utils.cache; called on a
+  worker thread so lookups never block the event loop
+
+Callers pass regenerate=True to skip the lookup; the fresh result then
+replaces the cached one.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Optional
+from app.utils.cache import LocalLRU, get_cache, set_cache
+from app.config import get_settings
+
+settings = get_settings()
+
+_local = LocalLRU(
+    settings.AI_CACHE_MAX_ENTRIES,
+    settings.AI_CACHE_LOCAL_TTL_SECONDS,
+    max_bytes=settings.AI_CACHE_MAX_BYTES
+)
+_metrics_lock = threading.Lock()
+_metrics = {"local_hits": 0, "redis_hits": 0, "misses": 0, "stores": 0}
+
+
+def _cache_key(kind: str, backend: str, prompt: str) -> str:
+    digest = hashlib.sha256(f"{backend}\0{prompt}".encode()).hexdigest()
+    return f"ai:{kind}:{digest}"
+
+
+def _count(name: str) -> None:
+    with _metrics_lock:
+        _metrics[name] += 1
+
+
+async def get_cached_generation(kind: str, backend: str, prompt: str) -> Optional[Any]:
+    """Return the cached result for this prompt, or None on a miss."""
+    key = _cache_key(kind, backend, prompt)
+    value = _local.get(key)
+    if value is not None:
+        _count("local_hits")
+        return value
+
+    value = await asyncio.to_thread(get_cache, key)
+    if value is not None:
+        _count("redis_hits")
+        _local.set(key, value, size=len(json.dumps(value)))
+        return value
+
+    _count("misses")
+    return None
+
+
+async def cache_generation(kind: str, backend: str, prompt: str, value: Any) -> None:
+    """Store a generated result in both tiers."""
+    key = _cache_key(kind, backend, prompt)
+    _local.set(key, value, size=len(json.dumps(value)))
+    await asyncio.to_thread(set_cache, key, value, settings.AI_CACHE_TTL_SECONDS)
+    _count("stores")
+
+
+def get_ai_cache_metrics() -> Dict[str, Any]:
+    """Hit/miss counters and the size of this process's local tier."""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    lookups = metrics["local_hits"] + metrics["redis_hits"] + metrics["misses"]
+    metrics["hit_ratio"] = round((metrics["local_hits"] + metrics["redis_hits"]) / lookups, 4) if lookups else 0.0
+    metrics["local_entries"] = len(_local)
+    metrics["local_bytes"] = _local.bytes
+    return metrics
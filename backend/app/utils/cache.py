@@ -4,6 +4,9 @@ Redis cache utilities for caching frequently accessed data.
 
 import redis
 import json
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional, Any
 from app.config import get_settings
 
@@ -13,10 +16,65 @@ settings = get_settings()
 redis_client = redis.from_url(
     settings.REDIS_URL,
     decode_responses=True,
-    encoding="utf-8"
+    encoding="utf-8",
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS
 )
 
 
+class LocalLRU:
+    """
+    Thread-safe in-process LRU with per-entry expiry.
+
+    Evicts least recently used entries beyond max_entries, and beyond
+    max_bytes when a size is given with each entry.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload, size = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: Any, size: int = 0) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[key] = (time.monotonic() + self.ttl, payload, size)
+            self.bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes and self.bytes > self.max_bytes)
+            ):
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[2]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
 def get_cache(key: str) -> Optional[Any]:
     """
     Get a value from cache.
@@ -0,0 +1,303 @@
+"""
+Compact binary encoding of Thought Proof keystroke batches.
+
+A batch of events is stored as one chunk, column by column:
+
+    b"KSC1" + zlib(body)
+
+    body = varint count
+           varint pool size, then each pool string as varint length + UTF-8
+           type column       varint code per event (see EVENT_TYPE_CODES;
+                             POOL_TYPE_BASE + i names pool[i] for other types)
+           timestamp column  zigzag varint milliseconds since the epoch for the
+                             first event, then zigzag deltas from the previous one
+           position, length, line and column columns
+                             varint per event, 0 for null, zigzag(value) + 1 otherwise
+           content column    varint per event, 0 for null, i + 1 for pool[i]
+
+Repeated strings (single characters, mostly) are stored once in the pool.
+The uncompressed body is canonical for a given list of events, so it can
+be hashed.
+
+decode_arrays reads a chunk straight into NumPy arrays for analytics,
+decoding all varint columns in one vectorized pass.
+"""
+
+import zlib
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+MAGIC = b"KSC1"
+
+EVENT_TYPE_CODES = {'insert': 1, 'delete': 2, 'paste': 3, 'cursor_move': 4}
+EVENT_TYPE_NAMES = {code: name for name, code in EVENT_TYPE_CODES.items()}
+POOL_TYPE_BASE = 16
+
+INT_FIELDS = ('position', 'length', 'line', 'column')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MS = timedelta(milliseconds=1)
+
+
+class KeystrokeCodecError(ValueError):
+    """A chunk is truncated, corrupt or not in this format."""
+
+
+def timestamp_ms(value: Any) -> int:
+    """Milliseconds since the epoch for an ISO string or datetime (naive means UTC)."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _MS
+
+
+def format_timestamp(ms: int) -> str:
+    """ISO 8601 UTC string for milliseconds since the epoch."""
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat(timespec='milliseconds')
+
+
+def encode_body(events: List[Dict[str, Any]]) -> bytes:
+    """
+    Canonical columnar encoding of a batch, before compression.
+
+    Events use the recording API's keys: timestamp, type, content,
+    position, length, line and column. Timestamps may be ISO strings,
+    datetimes or "ts_ms" integers.
+    """
+    pool: Dict[str, int] = {}
+
+    def intern(text: str) -> int:
+        index = pool.get(text)
+        if index is None:
+            index = pool[text] = len(pool)
+        return index
+
+    types = []
+    for event in events:
+        code = EVENT_TYPE_CODES.get(event['type'])
+        types.append(code if code is not None else POOL_TYPE_BASE + intern(event['type']))
+
+    contents = [0 if event.get('content') is None else intern(event['content']) + 1 for event in events]
+
+    out = bytearray()
+    _put(out, len(events))
+    _put(out, len(pool))
+    for text in pool:
+        raw = text.encode('utf-8')
+        _put(out, len(raw))
+        out += raw
+
+    for code in types:
+        _put(out, code)
+
+    previous = 0
+    for event in events:
+        ms = event['ts_ms'] if 'ts_ms' in event else timestamp_ms(event['timestamp'])
+        _put(out, _zigzag(ms - previous))
+        previous = ms
+
+    for field in INT_FIELDS:
+        for event in events:
+            value = event.get(field)
+            _put(out, 0 if value is None else _zigzag(value) + 1)
+
+    for index in contents:
+        _put(out, index)
+
+    return bytes(out)
+
+
+def encode_events(events: List[Dict[str, Any]]) -> Tuple[bytes, bytes]:
+    """(chunk blob to store, canonical body) for a batch of events."""
+    body = encode_body(events)
+    return MAGIC + zlib.compress(body), body
+
+
+def decode_body(blob: bytes) -> bytes:
+    """The canonical body inside a stored chunk."""
+    if blob[:len(MAGIC)] != MAGIC:
+        raise KeystrokeCodecError("Not a keystroke chunk")
+    try:
+        return zlib.decompress(blob[len(MAGIC):])
+    except zlib.error as e:
+        raise KeystrokeCodecError(f"Corrupt keystroke chunk: {e}") from e
+
+
+def decode_columns(blob: bytes) -> Dict[str, List[Any]]:
+    """
+    Columns of a stored chunk: ts_ms, type, content, position, length,
+    line and column, each a list with one entry per event.
+    """
+    body = decode_body(blob)
+    reader = _Reader(body)
+    count = reader.next()
+    pool = []
+    for _ in range(reader.next()):
+        pool.append(reader.text())
+
+    types = []
+    for _ in range(count):
+        code = reader.next()
+        types.append(EVENT_TYPE_NAMES.get(code) if code < POOL_TYPE_BASE else _pooled(pool, code - POOL_TYPE_BASE))
+
+    ts_ms, current = [], 0
+    for _ in range(count):
+        current += _unzigzag(reader.next())
+        ts_ms.append(current)
+
+    columns = {'ts_ms': ts_ms, 'type': types}
+    for field in INT_FIELDS:
+        columns[field] = [None if v == 0 else _unzigzag(v - 1) for v in reader.many(count)]
+    columns['content'] = [None if v == 0 else _pooled(pool, v - 1) for v in reader.many(count)]
+
+    if not reader.done():
+        raise KeystrokeCodecError("Trailing bytes in keystroke chunk")
+    return columns
+
+
+def decode_events(blob: bytes) -> Iterator[Dict[str, Any]]:
+    """Events of a stored chunk in the recording API's format."""
+    return column_events(decode_columns(blob))
+
+
+def column_events(columns: Dict[str, List[Any]], indexes: Iterable[int] = None) -> Iterator[Dict[str, Any]]:
+    """Events at `indexes` (all by default) of decoded columns, in the recording API's format."""
+    if indexes is None:
+        indexes = range(len(columns['ts_ms']))
+    for i in indexes:
+        yield {
+            'timestamp': format_timestamp(columns['ts_ms'][i]),
+            'type': columns['type'][i],
+            'content': columns['content'][i],
+            'position': columns['position'][i],
+            'length': columns['length'][i],
+            'line': columns['line'][i],
+            'column': columns['column'][i]
+        }
+
+
+def decode_arrays(blob: bytes) -> Dict[str, np.ndarray]:
+    """
+    A stored chunk as NumPy arrays: ts_ms, type (codes as in
+    EVENT_TYPE_CODES, 0 for other types), position, length, line, column (-1 for null) and
+    content_len (characters of content, 0 for null).
+    """
+    body = decode_body(blob)
+    reader = _Reader(body)
+    count = reader.next()
+    pool_lengths = [0]
+    for _ in range(reader.next()):
+        pool_lengths.append(len(reader.text()))
+
+    values = _varint_array(np.frombuffer(body, dtype=np.uint8, offset=reader.offset))
+    if len(values) != 7 * count:
+        raise KeystrokeCodecError("Corrupt keystroke chunk")
+    columns = values.reshape(7, count)
+    pool_size = len(pool_lengths) - 1
+    if count and (columns[0].max() >= POOL_TYPE_BASE + pool_size or columns[6].max() > pool_size):
+        raise KeystrokeCodecError("Keystroke chunk refers past its string pool")
+
+    arrays = {
+        'ts_ms': np.cumsum(_unzigzag_array(columns[1])),
+        'type': np.where(columns[0] < POOL_TYPE_BASE, columns[0], 0).astype(np.int64)
+    }
+    for row, field in enumerate(INT_FIELDS, start=2):
+        raw = columns[row]
+        arrays[field] = np.where(raw == 0, -1, _unzigzag_array(raw - (raw > 0)))
+    arrays['content_len'] = np.asarray(pool_lengths, dtype=np.int64)[columns[6].astype(np.int64)]
+    return arrays
+
+
+def columns_to_arrays(columns: Dict[str, List[Any]]) -> Dict[str, np.ndarray]:
+    """decode_arrays' output for already decoded columns (e.g. legacy per-event rows)."""
+    arrays = {
+        'ts_ms': np.asarray(columns['ts_ms'], dtype=np.int64),
+        'type': np.asarray([EVENT_TYPE_CODES.get(t, 0) for t in columns['type']], dtype=np.int64)
+    }
+    for field in INT_FIELDS:
+        arrays[field] = np.asarray([-1 if v is None else v for v in columns[field]], dtype=np.int64)
+    arrays['content_len'] = np.asarray([len(c) if c else 0 for c in columns['content']], dtype=np.int64)
+    return arrays
+
+
+def _varint_array(data: np.ndarray) -> np.ndarray:
+    """Every varint in a byte array, decoded at once."""
+    if not len(data):
+        return np.zeros(0, dtype=np.uint64)
+    if data[-1] & 0x80:
+        raise KeystrokeCodecError("Truncated keystroke chunk")
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Bit offset of each byte within its varint
+    shifts = (np.arange(len(data)) - np.repeat(starts, ends - starts + 1)) * 7
+    parts = (data & 0x7F).astype(np.uint64) << shifts.astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def _unzigzag_array(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64)
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def _pooled(pool: List[str], index: int) -> str:
+    if index >= len(pool):
+        raise KeystrokeCodecError("Keystroke chunk refers past its string pool")
+    return pool[index]
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _put(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def next(self) -> int:
+        data, offset = self.data, self.offset
+        result = shift = 0
+        try:
+            while True:
+                byte = data[offset]
+                offset += 1
+                result |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+        except IndexError:
+            raise KeystrokeCodecError("Truncated keystroke chunk")
+        self.offset = offset
+        return result
+
+    def many(self, count: int) -> List[int]:
+        return [self.next() for _ in range(count)]
+
+    def take(self, size: int) -> bytes:
+        if self.offset + size > len(self.data):
+            raise KeystrokeCodecError("Truncated keystroke chunk")
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return chunk
+
+    def text(self) -> str:
+        try:
+            return self.take(self.next()).decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise KeystrokeCodecError(f"Corrupt keystroke chunk: {e}") from e
+
+    def done(self) -> bool:
+        return self.offset == len(self.data)
@@ -89,6 +89,30 @@ def create_refresh_token(data: Dict[str, Any], expires_delta: Optional[timedelta
     return encoded_jwt
 
 
+def create_quiz_resume_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
+    """
+    Create a token that lets a live quiz participant reattach to their slot.
+    
+    Args:
+        data: Quiz id, slot id, role and display name
+        expires_delta: Optional expiration time delta
+        
+    Returns:
+        Encoded JWT resume token
+    """
+    to_encode = data.copy()
+    
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(seconds=settings.QUIZ_SESSION_TTL_SECONDS)
+    
+    to_encode.update({"exp": expire, "type": "quiz_resume"})
+    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    
+    return encoded_jwt
+
+
 def decode_token(token: str) -> Optional[Dict[str, Any]]:
     """
     Decode and verify a JWT token.
@@ -0,0 +1,154 @@
+"""
+Authenticated-user cache.
+
+get_current_user runs on every authenticated request. Instead of loading
+the user row each time, the fields authorization and the auth endpoints
+need (role, is_active, institution and the public profile) are cached per
+user id in two tiers:
+- an in-process LRU with a short TTL (no network hop)
+- Redis, shared by all workers, through app.utils.cache; called on a
+  worker thread so a slow Redis never blocks the event loop
+
+Entries are dropped when a transaction that updated or deleted the user
+commits. Other workers' in-process tiers catch up within
+USER_CACHE_LOCAL_TTL_SECONDS.
+"""
+
+import asyncio
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+from uuid import UUID
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session, make_transient_to_detached
+from app.models.user import User, UserRole
+from app.utils.cache import LocalLRU, get_cache, set_cache, delete_cache
+from app.config import get_settings
+
+settings = get_settings()
+
+# Columns held in the cache; password hash and focus counters are not
+PRINCIPAL_FIELDS = (
+    "id", "email", "urn", "first_name", "last_name", "role", "institution_id",
+    "is_active", "profile_image", "created_at", "updated_at"
+)
+
+
+def _cache_key(user_id) -> str:
+    return f"user:principal:{user_id}"
+
+
+_local = LocalLRU(settings.USER_CACHE_MAX_ENTRIES, settings.USER_CACHE_LOCAL_TTL_SECONDS)
+_metrics_lock = threading.Lock()
+_metrics = {"local_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _count(name: str) -> None:
+    with _metrics_lock:
+        _metrics[name] += 1
+
+
+async def get_cached_user(user_id) -> Optional[User]:
+    """
+    Return a detached User built from the cache, or None on a miss.
+
+    Only PRINCIPAL_FIELDS are loaded on the returned instance; routes that
+    modify the user must load the row from their own session.
+    """
+    key = _cache_key(user_id)
+    payload = _local.get(key)
+    if payload is not None:
+        _count("local_hits")
+        return _from_payload(payload)
+
+    payload = await asyncio.to_thread(get_cache, key)
+    if payload is not None:
+        _count("redis_hits")
+        _local.set(key, payload)
+        return _from_payload(payload)
+
+    _count("misses")
+    return None
+
+
+async def cache_user(user: User) -> None:
+    """Store a freshly loaded user in both tiers."""
+    key = _cache_key(user.id)
+    payload = _to_payload(user)
+    _local.set(key, payload)
+    await asyncio.to_thread(set_cache, key, payload, settings.USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(user_id) -> None:
+    """Drop a user from both tiers."""
+    key = _cache_key(user_id)
+    _local.delete(key)
+    delete_cache(key)
+    _count("invalidations")
+
+
+def get_user_cache_metrics() -> Dict[str, Any]:
+    """Hit/miss counters and the size of this process's local tier."""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    lookups = metrics["local_hits"] + metrics["redis_hits"] + metrics["misses"]
+    metrics["hit_ratio"] = round((metrics["local_hits"] + metrics["redis_hits"]) / lookups, 4) if lookups else 0.0
+    metrics["local_entries"] = len(_local)
+    return metrics
+
+
+def _to_payload(user: User) -> Dict[str, Any]:
+    payload = {}
+    for field in PRINCIPAL_FIELDS:
+        value = getattr(user, field)
+        if isinstance(value, UUID):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, UserRole):
+            value = value.value
+        payload[field] = value
+    return payload
+
+
+def _from_payload(payload: Dict[str, Any]) -> User:
+    values = dict(payload)
+    values["id"] = UUID(values["id"])
+    values["role"] = UserRole(values["role"])
+    if values.get("institution_id"):
+        values["institution_id"] = UUID(values["institution_id"])
+    for field in ("created_at", "updated_at"):
+        if values.get(field):
+            values[field] = datetime.fromisoformat(values[field])
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    return user
+
+
+# Invalidate once the write is committed, so a concurrent miss cannot
+# re-cache the old row between flush and commit
+_PENDING_KEY = "user_cache_invalidations"
+
+
+def _on_user_write(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is None:
+        invalidate_user(target.id)
+    else:
+        session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+
+for _event in ("after_update", "after_delete"):
+    event.listen(User, _event, _on_user_write)
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_invalidations(session) -> None:
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,59 @@
+"""
+Bulk question bank import.
+
+Accepts a JSON array, JSON Lines or CSV file. Each record needs
+question_text and difficulty (easy/medium/hard); concept_id, category,
+question_type, correct_answer, points and options are optional. In CSV,
+options is a JSON object string. Run from the backend directory:
+
+    python -m scripts.import_question_bank questions.csv
+"""
+
+import argparse
+import csv
+import json
+import time
+from app.database import SessionLocal
+from app.ai.question_bank import import_questions
+
+
+def read_questions(path: str):
+    """Yield question dicts from a .json, .jsonl or .csv file."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                row = {k: v for k, v in row.items() if v not in (None, "")}
+                if "options" in row:
+                    row["options"] = json.loads(row["options"])
+                if "points" in row:
+                    row["points"] = int(row["points"])
+                yield row
+    elif path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import questions into the question bank.")
+    parser.add_argument("path", help="JSON, JSON Lines or CSV file")
+    args = parser.parse_args()
+
+    print(f"Importing questions from {args.path}...")
+    started = time.monotonic()
+    db = SessionLocal()
+    try:
+        summary = import_questions(db, read_questions(args.path))
+    finally:
+        db.close()
+
+    print(f"Inserted {summary['inserted']} questions, skipped {summary['skipped']} duplicates "
+          f"in {time.monotonic() - started:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Offline mastery recomputation.
+
+Replays every stored response through the vectorized mastery kernel and
+rewrites StudentMastery in bulk. Run from the backend directory:
+
+    python -m scripts.recompute_mastery [--student UUID ...] [--decay-rate 0.03] [--dry-run]
+"""
+
+import argparse
+import time
+from uuid import UUID
+from app.database import SessionLocal
+from app.ai.mastery_replay import recompute_mastery
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute student mastery from response history.")
+    parser.add_argument("--student", action="append", type=UUID, help="Limit to a student (repeatable)")
+    parser.add_argument("--decay-rate", type=float, default=None, help="Override MASTERY_DECAY_RATE")
+    parser.add_argument("--grace-days", type=int, default=None, help="Override MASTERY_DECAY_GRACE_PERIOD_DAYS")
+    parser.add_argument("--dry-run", action="store_true", help="Compute without writing")
+    args = parser.parse_args()
+
+    print("Recomputing mastery from response history...")
+    started = time.monotonic()
+    db = SessionLocal()
+    try:
+        summary = recompute_mastery(
+            db,
+            student_ids=args.student,
+            decay_rate=args.decay_rate,
+            grace_period_days=args.grace_days,
+            dry_run=args.dry_run
+        )
+    finally:
+        db.close()
+
+    action = "Would write" if args.dry_run else "Wrote"
+    print(f"Replayed {summary['responses']} responses in {time.monotonic() - started:.2f}s.")
+    print(f"{action} {summary['updated']} updated and {summary['created']} new mastery rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Tests for the Thought Proof keystroke chunk format (app.utils.keystroke_codec)
+and the replay hash chain built over its canonical bodies.
+"""
+
+import hashlib
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.utils.keystroke_codec import (
+    MAGIC, KeystrokeCodecError, column_events, columns_to_arrays, decode_arrays, decode_body,
+    decode_columns, decode_events, encode_body, encode_events, format_timestamp, timestamp_ms
+)
+
+START_MS = timestamp_ms("2025-10-01T10:00:00Z")
+
+
+def _event(offset_ms, type_="insert", content="a", position=0, length=1, line=0, column=0):
+    return {
+        'timestamp': format_timestamp(START_MS + offset_ms),
+        'type': type_,
+        'content': content,
+        'position': position,
+        'length': length,
+        'line': line,
+        'column': column
+    }
+
+
+# Covers negative values and deltas, nulls, empty and non-ASCII content,
+# unknown event types and values beyond one varint byte
+EDGE_EVENTS = [
+    _event(0),
+    _event(120, content="é"),
+    _event(80, content="日本語", position=-5, line=-1, column=-300),  # Earlier than the previous event
+    _event(200, type_="delete", content=None, length=None),
+    _event(250, type_="paste", content="def f():\n    return 42\n" * 20, position=2 ** 40),
+    _event(260, type_="selection", content="", position=None, line=None, column=None),
+    _event(261, type_="cursor_move", content=None, length=0),
+    _event(10 ** 9, type_="emoji 🙂", content="🙂", position=127, length=128, line=16383, column=16384),
+    _event(-10 ** 6, content="a"),  # Before the first event
+]
+
+
+def _normalized(event):
+    """An event as it comes back from the codec (millisecond UTC timestamps)."""
+    return {**event, 'timestamp': format_timestamp(timestamp_ms(event['timestamp']))}
+
+
+def _assert_arrays_equal(left, right):
+    assert left.keys() == right.keys()
+    for key in left:
+        np.testing.assert_array_equal(left[key], right[key], err_msg=key)
+
+
+class TestTimestamps:
+    def test_naive_datetime_is_utc(self):
+        assert timestamp_ms(datetime(2025, 10, 1, 10)) == START_MS
+
+    def test_iso_strings_with_offset_and_z(self):
+        assert timestamp_ms("2025-10-01T12:00:00+02:00") == START_MS
+        assert timestamp_ms("2025-10-01T10:00:00.250Z") == START_MS + 250
+
+    def test_format_round_trip(self):
+        aware = datetime(2025, 10, 1, 10, tzinfo=timezone.utc) + timedelta(milliseconds=1234)
+        assert timestamp_ms(format_timestamp(timestamp_ms(aware))) == START_MS + 1234
+
+
+class TestRoundTrip:
+    def test_events_round_trip(self):
+        blob, _ = encode_events(EDGE_EVENTS)
+        assert list(decode_events(blob)) == [_normalized(e) for e in EDGE_EVENTS]
+
+    def test_columns(self):
+        blob, _ = encode_events(EDGE_EVENTS)
+        columns = decode_columns(blob)
+
+        assert columns['ts_ms'] == [timestamp_ms(e['timestamp']) for e in EDGE_EVENTS]
+        assert columns['type'] == [e['type'] for e in EDGE_EVENTS]
+        for field in ('content', 'position', 'length', 'line', 'column'):
+            assert columns[field] == [e[field] for e in EDGE_EVENTS], field
+
+    def test_empty_content_differs_from_null(self):
+        blob, _ = encode_events([_event(0, content=""), _event(1, content=None)])
+        assert decode_columns(blob)['content'] == ["", None]
+
+    def test_ts_ms_events(self):
+        events = [{**e, 'ts_ms': timestamp_ms(e['timestamp'])} for e in EDGE_EVENTS]
+        for event in events:
+            del event['timestamp']
+        assert encode_body(events) == encode_body(EDGE_EVENTS)
+
+    def test_empty_batch(self):
+        blob, _ = encode_events([])
+        assert list(decode_events(blob)) == []
+        assert all(len(array) == 0 for array in decode_arrays(blob).values())
+
+    def test_body_is_canonical(self):
+        blob, body = encode_events(EDGE_EVENTS)
+        assert decode_body(blob) == body
+        assert encode_body([dict(e) for e in EDGE_EVENTS]) == body
+
+    def test_large_batch(self):
+        events = [
+            _event(i * 37, type_=("insert", "delete", "paste")[i % 3], content="xyz"[i % 3] * (i % 4 or None or 1),
+                   position=i, line=i // 80, column=i % 80)
+            for i in range(5000)
+        ]
+        blob, body = encode_events(events)
+        assert list(decode_events(blob)) == [_normalized(e) for e in events]
+        assert len(blob) < len(body)
+
+
+class TestArrays:
+    def test_matches_decoded_columns(self):
+        blob, _ = encode_events(EDGE_EVENTS)
+        _assert_arrays_equal(decode_arrays(blob), columns_to_arrays(decode_columns(blob)))
+
+    def test_values(self):
+        blob, _ = encode_events(EDGE_EVENTS)
+        arrays = decode_arrays(blob)
+
+        np.testing.assert_array_equal(arrays['type'], [1, 1, 1, 2, 3, 0, 4, 0, 1])
+        np.testing.assert_array_equal(arrays['position'][[2, 4, 5]], [-5, 2 ** 40, -1])
+        np.testing.assert_array_equal(arrays['length'][[3, 7]], [-1, 128])
+        np.testing.assert_array_equal(arrays['line'][[2, 5, 7]], [-1, -1, 16383])
+        np.testing.assert_array_equal(arrays['column'][[2, 7]], [-300, 16384])
+        # Characters, not UTF-8 bytes
+        np.testing.assert_array_equal(arrays['content_len'][[1, 2, 3, 5, 7]], [1, 3, 0, 0, 1])
+        assert arrays['ts_ms'][-1] == START_MS - 10 ** 6
+
+
+class TestCorruption:
+    @pytest.fixture
+    def body(self):
+        return encode_events(EDGE_EVENTS)[1]
+
+    @pytest.mark.parametrize("decode", [decode_columns, decode_arrays])
+    def test_not_a_chunk(self, decode):
+        with pytest.raises(KeystrokeCodecError):
+            decode(b"{\"events\": []}")
+
+    @pytest.mark.parametrize("decode", [decode_columns, decode_arrays])
+    def test_truncated_blob(self, decode, body):
+        blob = MAGIC + zlib.compress(body)
+        with pytest.raises(KeystrokeCodecError):
+            decode(blob[:-6])
+
+    @pytest.mark.parametrize("decode", [decode_columns, decode_arrays])
+    @pytest.mark.parametrize("cut", [1, 2, 10])
+    def test_truncated_body(self, decode, body, cut):
+        with pytest.raises(KeystrokeCodecError):
+            decode(MAGIC + zlib.compress(body[:-cut]))
+
+    @pytest.mark.parametrize("decode", [decode_columns, decode_arrays])
+    def test_trailing_bytes(self, decode, body):
+        with pytest.raises(KeystrokeCodecError):
+            decode(MAGIC + zlib.compress(body + b"\x00"))
+
+    @pytest.mark.parametrize("decode", [decode_columns, decode_arrays])
+    def test_content_index_outside_pool(self, decode):
+        body = bytearray(encode_body([_event(0, content="a")]))
+        body[-1] = 9  # Pool has one string
+        with pytest.raises(KeystrokeCodecError):
+            decode(MAGIC + zlib.compress(bytes(body)))
+
+    @pytest.mark.parametrize("decode", [decode_columns, decode_arrays])
+    def test_invalid_utf8_in_pool(self, decode):
+        body = bytearray(encode_body([_event(0, content="é")]))
+        index = body.index("é".encode("utf-8"))
+        body[index] = 0xFF
+        with pytest.raises(KeystrokeCodecError):
+            decode(MAGIC + zlib.compress(bytes(body)))
+
+
+class TestReplayChain:
+    """The replay hash is a chain over the canonical body of each stored batch."""
+
+    @staticmethod
+    def _record(db, batches, legacy_events=()):
+        from app.models.thought_proof import KeystrokeEvent, ThoughtProof
+        from app.services.thought_proof_service import ThoughtProofService
+
+        proof = ThoughtProof(student_assignment_id=uuid.uuid4(), started_at=datetime(2025, 10, 1, 9, 59))
+        db.add(proof)
+        db.flush()
+        # Rows written one per event before keystroke_chunks
+        for event in legacy_events:
+            db.add(KeystrokeEvent(
+                thought_proof_id=proof.id,
+                timestamp=datetime.fromisoformat(event['timestamp'].replace('Z', '+00:00')),
+                event_type=event['type'],
+                content=event['content'],
+                position=event['position'],
+                length=event['length'],
+                line_number=event['line'],
+                column_number=event['column']
+            ))
+        proof.events_count = len(legacy_events)
+        db.commit()
+        for batch in batches:
+            ThoughtProofService.record_keystroke_batch(db, proof.id, batch)
+        return ThoughtProofService.finalize_proof(db, proof.id, "test-key")
+
+    @staticmethod
+    def _chain(proof, bodies):
+        value = hashlib.sha256(f"{proof.id}:{proof.started_at.isoformat()}".encode("utf-8")).hexdigest()
+        for body in bodies:
+            value = hashlib.sha256(bytes.fromhex(value) + hashlib.sha256(body).digest()).hexdigest()
+        return value
+
+    @staticmethod
+    def _chunks(db, proof):
+        from app.models.thought_proof import KeystrokeChunk
+
+        return db.query(KeystrokeChunk).filter(
+            KeystrokeChunk.thought_proof_id == proof.id
+        ).order_by(KeystrokeChunk.first_event_index).all()
+
+    def test_replay_hash_matches_stored_chunks(self, db):
+        batches = [EDGE_EVENTS[:4], EDGE_EVENTS[4:], [_event(2 * 10 ** 9 + i) for i in range(50)]]
+        proof = self._record(db, batches)
+
+        chunks = self._chunks(db, proof)
+        assert [c.event_count for c in chunks] == [len(b) for b in batches]
+        assert proof.replay_hash == self._chain(proof, [decode_body(c.data) for c in chunks])
+        assert proof.replay_hash == chunks[-1].chain_hash
+
+    def test_replay_hash_matches_original_events(self, db):
+        # Batches are stored sorted by time; the chain covers that order
+        batches = [EDGE_EVENTS[:5], EDGE_EVENTS[5:]]
+        proof = self._record(db, batches)
+
+        bodies = [encode_body(sorted(b, key=lambda e: timestamp_ms(e['timestamp']))) for b in batches]
+        assert proof.replay_hash == self._chain(proof, bodies)
+
+    def test_tampered_chunk_breaks_chain(self, db):
+        proof = self._record(db, [EDGE_EVENTS[:4], EDGE_EVENTS[4:]])
+
+        chunks = self._chunks(db, proof)
+        events = list(decode_events(chunks[0].data))
+        events[0]['content'] = "b"
+        bodies = [encode_body(events), decode_body(chunks[1].data)]
+        assert self._chain(proof, bodies) != proof.replay_hash
+
+    def test_legacy_rows_become_first_chunk(self, db):
+        from app.models.thought_proof import KeystrokeEvent
+        from app.services.thought_proof_service import ThoughtProofService
+
+        legacy = [_event(-500 + 10 * i, content="legacy é"[i % 8], position=i) for i in range(40)]
+        batches = [EDGE_EVENTS[:5], EDGE_EVENTS[5:]]
+        proof = self._record(db, batches, legacy_events=legacy)
+
+        chunks = self._chunks(db, proof)
+        assert [(c.first_event_index, c.event_count) for c in chunks] == [(0, 40), (40, 5), (45, 4)]
+        assert db.query(KeystrokeEvent).filter(KeystrokeEvent.thought_proof_id == proof.id).count() == 0
+        assert proof.events_count == 49
+
+        events = [
+            event
+            for columns in ThoughtProofService.iter_event_columns(db, proof.id)
+            for event in column_events(columns)
+        ]
+        assert events[:40] == [_normalized(e) for e in legacy]
+        assert len(ThoughtProofService.event_arrays(db, proof.id)['ts_ms']) == 49
+
+        bodies = [encode_body(legacy)] + [
+            encode_body(sorted(b, key=lambda e: timestamp_ms(e['timestamp']))) for b in batches
+        ]
+        assert proof.replay_hash == self._chain(proof, bodies)
+        assert chunks[-1].totals['events'] == 49
+        assert proof.total_duration_seconds == (10 ** 9 + 10 ** 6) // 1000
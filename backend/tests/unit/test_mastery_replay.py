@@ -0,0 +1,72 @@
+"""
+Tests that the vectorized replay (app.ai.mastery_replay) matches the live,
+one-answer-at-a-time update_mastery_score.
+"""
+
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from app.ai import mastery_scorer
+from app.ai.mastery_replay import DIFFICULTY_CODES, replay_mastery
+from app.models.assignment import StudentMastery
+
+DAY = 86400
+
+
+class _Clock(datetime):
+    """Stands in for datetime in mastery_scorer so each answer happens at its timestamp."""
+
+    current = None
+
+    @classmethod
+    def utcnow(cls):
+        return cls.current
+
+
+def _random_history(rng, rows=600, students=4, concepts=5):
+    """Response rows sorted by time, with gaps long enough to trigger decay."""
+    timestamp = 1_700_000_000 + np.sort(rng.integers(0, 120 * DAY, rows))
+    return {
+        'student': rng.integers(0, students, rows),
+        'concept': rng.integers(0, concepts, rows),
+        'correct': rng.random(rows) < 0.6,
+        'difficulty': rng.integers(0, len(DIFFICULTY_CODES) + 1, rows),  # Last code is unknown
+        'time_spent': rng.integers(0, 400, rows),
+        'timestamp': timestamp
+    }
+
+
+def test_replay_matches_update_mastery_score(db, monkeypatch):
+    rng = np.random.default_rng(7)
+    history = _random_history(rng)
+    monkeypatch.setattr(mastery_scorer, "datetime", _Clock)
+
+    student_ids = [uuid.uuid4() for _ in range(history['student'].max() + 1)]
+    concept_ids = [uuid.uuid4() for _ in range(history['concept'].max() + 1)]
+    for s, c, correct, d, spent, ts in zip(*history.values()):
+        _Clock.current = datetime.utcfromtimestamp(int(ts))
+        difficulty = DIFFICULTY_CODES[d] if d < len(DIFFICULTY_CODES) else None
+        mastery_scorer.update_mastery_score(
+            db, student_ids[s], concept_ids[c], bool(correct), difficulty, int(spent)
+        )
+
+    replayed = replay_mastery(**history)
+
+    expected = {
+        (row.student_id, row.concept_id): row
+        for row in db.query(StudentMastery).all()
+    }
+    assert len(expected) == len(replayed['mastery'])
+    live = [expected[(student_ids[s], concept_ids[c])] for s, c in zip(replayed['student'], replayed['concept'])]
+    assert np.allclose(replayed['mastery'], [float(row.mastery_level) for row in live])
+    assert list(replayed['attempts']) == [row.attempts for row in live]
+    assert list(replayed['last_practiced']) == [
+        (row.last_practiced - datetime(1970, 1, 1)).total_seconds() for row in live
+    ]
+
+
+def test_empty_history():
+    replayed = replay_mastery([], [], [], [], [], [])
+    assert all(len(values) == 0 for values in replayed.values())